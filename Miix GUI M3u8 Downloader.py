@@ -1,110 +1,591 @@
 import sys
 import os
-import subprocess
+import time
+
+# 启动计时从这里开始（包括导入 PyQt5 的时间）
+STARTUP_STARTED = time.perf_counter()
+
+if __name__ == '__main__' and '--headless' in sys.argv:
+    # 命令行模式不导入 PyQt5，服务器上可以快速启动
+    from miix.headless import main
+    sys.exit(main([arg for arg in sys.argv[1:] if arg != '--headless']))
+
 import threading
-import json
+import io
+import logging
+import logging.handlers
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, 
-    QPushButton, QFileDialog, QCheckBox, QTextEdit, QGroupBox, QGridLayout, QSpinBox,
+    QPushButton, QFileDialog, QCheckBox, QGroupBox, QGridLayout, QSpinBox,
     QProgressBar, QMessageBox, QComboBox, QTabWidget, QScrollArea, QSizePolicy,
-    QFrame, QSplitter, QToolButton
+    QFrame, QSplitter, QToolButton, QTableWidget, QTableWidgetItem, QHeaderView,
+    QAbstractItemView, QInputDialog, QPlainTextEdit, QDialog, QProgressDialog
 )
-from PyQt5.QtCore import Qt, pyqtSignal, QThread, pyqtSlot
-from PyQt5.QtGui import QFont, QIcon, QPalette, QColor
+from PyQt5.QtCore import Qt, pyqtSignal, QThread, QObject, QTimer, QPointF, pyqtSlot
+from PyQt5.QtGui import QFont, QIcon, QPalette, QColor, QPainter, QPen, QPolygonF
 
-class DownloadThread(QThread):
-    """专门的下载线程类"""
-    update_progress = pyqtSignal(int)
-    update_log = pyqtSignal(str)
-    download_complete = pyqtSignal(int)  # 添加退出代码参数
-    command_ready = pyqtSignal(str)  # 发送构建的命令
+from miix.progress import (
+    is_progress_line, track_description, bottleneck_track, format_size, format_duration
+)
+from miix.metrics import MetricsStore, ThroughputHistory
+from miix.command import build_command_from_settings, resolve_work_dir
+from miix.diskwatch import DiskWatchdog
+from miix.jobs import DownloadJob, JobScheduler
+from miix.options import ADVANCED_GROUPS, BASIC_GROUPS, OPTION_MAP, OPTIONS, diff_settings, group_options
+from miix.profiles import PROFILE_EXCLUDED_KEYS, ProfileStore
+from miix.resume import JobJournal, restore_jobs
+from miix.settings import SettingsStore, load_settings_file, save_settings_file
+from miix.supervisor import Supervisor
+# 指标导出、控制接口、批量导入和进程统计只在启用或使用时才导入
+
+class LogSink(QObject):
+    """日志缓冲：下载线程只写入缓冲区，界面线程定时批量刷新
+    
+    同一任务同一轨道的进度行只保留最新一条，不写入日志正文。
+    """
+    lines_ready = pyqtSignal(list)  # [(任务ID, 文本), ...]
+    progress_ready = pyqtSignal(dict)  # {任务ID: {轨道: 最新进度行}}
     
-    def __init__(self, cmd, work_dir, parent=None):
+    def __init__(self, interval=100, parent=None):
         super().__init__(parent)
-        self.cmd = cmd
-        self.work_dir = work_dir
-        self.process = None
-        self.is_running = True
+        self.lock = threading.Lock()
+        self.pending_lines = []
+        self.pending_progress = {}
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.flush)
+        self.timer.start()
+    
+    def push(self, job_id, line, coalesce=True):
+        """可在任意线程调用"""
+        with self.lock:
+            if coalesce and is_progress_line(line):
+                self.pending_progress.setdefault(job_id, {})[track_description(line)] = line
+            else:
+                self.pending_lines.append((job_id, line))
+    
+    def flush(self):
+        """在界面线程调用，一次性发出缓冲区中的内容"""
+        with self.lock:
+            lines, self.pending_lines = self.pending_lines, []
+            progress, self.pending_progress = self.pending_progress, {}
+        if lines:
+            self.lines_ready.emit(lines)
+        if progress:
+            self.progress_ready.emit(progress)
+
+LOG_DIR = os.path.join(os.path.expanduser("~"), "m3u8_downloader_logs")
+
+class LogSpill:
+    """完整日志按大小轮转写入磁盘，界面只保留最近的若干行"""
+    
+    def __init__(self, path=None, max_bytes=10 * 1024 * 1024, backup_count=5):
+        self.path = path or os.path.join(LOG_DIR, "gui.log")
+        self.handler = None
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.handler = logging.handlers.RotatingFileHandler(
+                self.path, maxBytes=max_bytes, backupCount=backup_count,
+                encoding='utf-8', delay=True
+            )
+            self.handler.setFormatter(logging.Formatter("%(message)s"))
+        except Exception:
+            self.handler = None  # 无法写入磁盘时只保留界面日志
+    
+    def write(self, lines):
+        """一批日志作为一条记录写入，减少文件操作次数"""
+        if self.handler is None or not lines:
+            return
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        text = "\n".join(f"{stamp} {line}" for line in lines)
+        try:
+            self.handler.emit(logging.makeLogRecord({"msg": text, "levelno": logging.INFO}))
+        except Exception:
+            pass
+    
+    def files(self):
+        """按时间从旧到新列出日志文件"""
+        if self.handler is None:
+            return []
+        paths = [f"{self.path}.{index}" for index in range(self.handler.backupCount, 0, -1)]
+        paths.append(self.path)
+        return [path for path in paths if os.path.exists(path)]
+    
+    def flush(self):
+        if self.handler is not None:
+            self.handler.flush()
+
+class LogSearchThread(QThread):
+    """在磁盘上的完整日志中搜索（不区分大小写）"""
+    results_ready = pyqtSignal(list, bool)  # 匹配的行, 是否因数量过多被截断
+    
+    MAX_RESULTS = 2000
+    
+    def __init__(self, files, keyword, parent=None):
+        super().__init__(parent)
+        self.files = files
+        self.keyword = keyword.lower()
         
     def run(self):
+        results = []
+        truncated = False
+        for path in self.files:
+            try:
+                with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                    for line in f:
+                        if self.keyword in line.lower():
+                            results.append(line.rstrip("\n"))
+                            if len(results) >= self.MAX_RESULTS:
+                                truncated = True
+                                break
+            except OSError:
+                continue
+            if truncated:
+                break
+        self.results_ready.emit(results, truncated)
+
+class SchedulerSignals(QObject):
+    """把调度器的事件转成Qt信号（调度器只在界面线程中使用）"""
+    job_added = pyqtSignal(int)
+    job_removed = pyqtSignal(int)
+    job_updated = pyqtSignal(int)
+    job_started = pyqtSignal(int)
+    job_log = pyqtSignal(int, str)
+    job_progress = pyqtSignal(int, int)
+    job_progress_record = pyqtSignal(int, object)
+    job_finished = pyqtSignal(int, int)  # 任务ID, 退出代码
+    command_ready = pyqtSignal(int, str)
+    # 控制接口从HTTP线程提交的操作，在界面线程中执行
+    call_requested = pyqtSignal(object, object)  # 函数, Future
+    # 监督器每隔一小段时间交回的一批子进程事件
+    batch_ready = pyqtSignal(list)
+    
+    def relay(self, event, *args):
+        getattr(self, event).emit(*args)
+
+# 批量导入时每批发送给界面的行数
+IMPORT_BATCH_SIZE = 200
+
+class BatchImportThread(QThread):
+    """后台解析地址列表，按批次发送，避免大文件卡住界面"""
+    rows_ready = pyqtSignal(list)
+    import_finished = pyqtSignal(int)  # 解析出的行数
+    import_error = pyqtSignal(str)
+    
+    def __init__(self, filename=None, text=None, parent=None):
+        super().__init__(parent)
+        self.filename = filename
+        self.text = text
+        self.is_running = True
+    
+    def run(self):
+        from miix.batch import detect_import_format, iter_import_rows
+        count = 0
         try:
-            self.update_log.emit(f"执行命令：{' '.join(self.cmd)}")
-            self.command_ready.emit(' '.join(self.cmd))
-            
-            self.process = subprocess.Popen(
-                self.cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
-                cwd=self.work_dir,
-                encoding='utf-8',
-                errors='replace'
-            )
-            
-            for line in iter(self.process.stdout.readline, ''):
-                if not self.is_running:
-                    break
-                if line.strip():
-                    self.update_log.emit(line.strip())
-                    
-                    # 改进的进度解析逻辑
-                    if "%" in line:
-                        try:
-                            parts = line.split()
-                            for part in parts:
-                                if "%" in part and part.replace('%', '').replace('.', '').isdigit():
-                                    progress = float(part.replace('%', ''))
-                                    self.update_progress.emit(int(progress))
-                                    break
-                        except Exception as e:
-                            pass
-            
-            if self.is_running:
-                exit_code = self.process.wait()
-                self.download_complete.emit(exit_code)
+            if self.filename:
+                stream = open(self.filename, 'r', encoding='utf-8-sig', errors='replace', newline='')
+                sample = stream.read(4096)
+                stream.seek(0)
             else:
-                # 用户中断，强制终止进程
-                if self.process:
-                    try:
-                        self.process.terminate()
-                        self.process.wait(timeout=3)
-                    except:
-                        pass
-                    finally:
-                        self.download_complete.emit(-1)
-                        
+                stream = io.StringIO(self.text)
+                sample = self.text[:4096]
+            with stream:
+                batch = []
+                for row in iter_import_rows(stream, detect_import_format(self.filename, sample)):
+                    if not self.is_running:
+                        break
+                    batch.append(row)
+                    count += 1
+                    if len(batch) >= IMPORT_BATCH_SIZE:
+                        self.rows_ready.emit(batch)
+                        batch = []
+                if batch:
+                    self.rows_ready.emit(batch)
         except Exception as e:
-            self.update_log.emit(f"下载线程错误：{str(e)}")
-            self.download_complete.emit(-2)
-            
+            self.import_error.emit(f"导入失败（第 {count + 1} 条附近）：{str(e)}")
+        self.import_finished.emit(count)
+    
     def stop(self):
         self.is_running = False
-        if self.process:
+
+class ManifestThread(QThread):
+    """后台读取并解析清单（使用当前的请求头和代理设置）"""
+    manifest_ready = pyqtSignal(object)  # Manifest
+    manifest_error = pyqtSignal(str)
+    
+    def __init__(self, settings, parent=None):
+        super().__init__(parent)
+        self.settings = settings
+    
+    def run(self):
+        from miix.manifest import load_manifest
+        try:
+            self.manifest_ready.emit(load_manifest(self.settings))
+        except Exception as e:
+            self.manifest_error.emit(str(e))
+
+class EstimateThread(QThread):
+    """后台预估任务大小和耗时，并检查磁盘空间"""
+    estimate_ready = pyqtSignal(object, list)  # JobEstimate, 空间不足的说明
+    estimate_error = pyqtSignal(str)
+    
+    def __init__(self, settings, history, parent=None):
+        super().__init__(parent)
+        self.settings = settings
+        self.history = history
+    
+    def run(self):
+        from miix.estimate import check_disk_space, estimate_job
+        try:
+            estimate = estimate_job(self.settings, self.history)
+            self.estimate_ready.emit(estimate, check_disk_space(self.settings, estimate.total_bytes))
+        except Exception as e:
+            self.estimate_error.emit(str(e))
+
+TRACK_TYPE_NAMES = {
+    "video": "视频",
+    "audio": "音频",
+    "subtitle": "字幕",
+}
+
+class TrackProgressPanel(QWidget):
+    """当前任务每个轨道一行进度条，最慢的轨道会被标出"""
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = {}
+        self.layout = QGridLayout(self)
+        self.layout.setContentsMargins(0, 0, 0, 0)
+        self.layout.setSpacing(4)
+        self.layout.setColumnStretch(1, 1)
+    
+    def clear(self):
+        for label, bar, speed_label in self.rows.values():
+            for widget in (label, bar, speed_label):
+                self.layout.removeWidget(widget)
+                widget.deleteLater()
+        self.rows = {}
+    
+    def update_tracks(self, records):
+        records = list(records)
+        if len(records) < 2:
+            # 只有一个轨道时总进度条已经足够
+            self.clear()
+            return
+        slowest = bottleneck_track(records)
+        for record in records:
+            if record.track not in self.rows:
+                self.add_row(record.track)
+            label, bar, speed_label = self.rows[record.track]
+            name = TRACK_TYPE_NAMES.get(record.track_type, "")
+            label.setText(f"{'⏳ ' if record.track == slowest else ''}{name} {record.track}".strip())
+            label.setToolTip(record.track)
+            bar.setValue(int(record.percent))
+            if record.total_bytes:
+                bar.setFormat(f"%p%  {format_size(record.downloaded_bytes)}/{format_size(record.total_bytes)}")
+            elif record.segments_total:
+                bar.setFormat(f"%p%  {record.segments_done}/{record.segments_total}")
+            else:
+                bar.setFormat("%p%")
+            speed = "-" if record.speed is None else f"{format_size(record.speed)}/s"
+            speed_label.setText(f"{speed}  {format_duration(record.eta)}")
+    
+    def add_row(self, track):
+        row = len(self.rows)
+        label = QLabel()
+        label.setMinimumWidth(220)
+        label.setMaximumWidth(320)
+        bar = QProgressBar()
+        bar.setMaximumHeight(18)
+        speed_label = QLabel()
+        speed_label.setMinimumWidth(150)
+        self.layout.addWidget(label, row, 0)
+        self.layout.addWidget(bar, row, 1)
+        self.layout.addWidget(speed_label, row, 2)
+        self.rows[track] = (label, bar, speed_label)
+
+class TrackPickerDialog(QDialog):
+    """列出清单中的轨道，勾选后生成 --select-*/--drop-* 表达式，并估算比最佳画质节省的流量"""
+    COLUMNS = ("类型", "分辨率", "码率", "编码", "语言", "名称", "分片", "加密", "预计大小")
+    
+    def __init__(self, manifest, parent=None):
+        super().__init__(parent)
+        from miix.manifest import AUDIO, SUBTITLE, VIDEO
+        from miix.tracks import best_track
+        self.manifest = manifest
+        self.expressions = {}
+        if manifest.live:
+            length = "直播"
+        else:
+            length = format_duration(manifest.duration) if manifest.duration else "时长未知"
+        encryption = f"，加密：{manifest.encryption}" if manifest.encryption else ""
+        self.setWindowTitle(f"选择轨道（{manifest.kind.upper()}，{length}{encryption}）")
+        self.resize(900, 480)
+        layout = QVBoxLayout(self)
+        
+        self.table = QTableWidget(len(manifest.tracks), len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        # 默认勾选不指定时会下载的轨道（--auto-select：最佳视频和音频、全部字幕），没有改动的类型不写表达式
+        self.defaults = {kind: {id(track) for track in [best_track(manifest.tracks_of(kind))] if track is not None}
+                         for kind in (VIDEO, AUDIO)}
+        self.defaults[SUBTITLE] = {id(track) for track in manifest.tracks_of(SUBTITLE)}
+        defaults = set().union(*self.defaults.values())
+        for row, track in enumerate(manifest.tracks):
+            kind_item = QTableWidgetItem(TRACK_TYPE_NAMES.get(track.kind, track.kind))
+            kind_item.setFlags(kind_item.flags() | Qt.ItemIsUserCheckable)
+            kind_item.setCheckState(Qt.Checked if id(track) in defaults else Qt.Unchecked)
+            self.table.setItem(row, 0, kind_item)
+            size = track.estimated_bytes(manifest.duration)
+            values = (track.resolution, f"{track.bandwidth / 1000:.0f} kbps" if track.bandwidth else "",
+                      track.codecs, track.lang, track.name, str(track.segment_count) if track.segment_count else "",
+                      track.encryption, format_size(size) if size else "")
+            for column, value in enumerate(values, 1):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+        self.table.itemChanged.connect(self.update_summary)
+        layout.addWidget(self.table)
+        
+        auto_layout = QHBoxLayout()
+        auto_layout.addWidget(QLabel("最低分辨率："))
+        self.height_spin = QSpinBox()
+        self.height_spin.setRange(0, 4320)
+        self.height_spin.setValue(720)
+        self.height_spin.setSuffix("p")
+        auto_layout.addWidget(self.height_spin)
+        auto_button = QPushButton("选择满足要求的最便宜视频")
+        auto_button.clicked.connect(self.select_cheapest)
+        auto_layout.addWidget(auto_button)
+        auto_layout.addStretch()
+        layout.addLayout(auto_layout)
+        
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+        
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        apply_button = QPushButton("写入轨道选择")
+        apply_button.clicked.connect(self.apply)
+        button_layout.addWidget(apply_button)
+        cancel_button = QPushButton("取消")
+        cancel_button.clicked.connect(self.reject)
+        button_layout.addWidget(cancel_button)
+        layout.addLayout(button_layout)
+        self.update_summary()
+    
+    def checked_tracks(self):
+        return [track for row, track in enumerate(self.manifest.tracks)
+                if self.table.item(row, 0).checkState() == Qt.Checked]
+    
+    def select_cheapest(self):
+        from miix.manifest import VIDEO
+        from miix.tracks import cheapest_track
+        choice = cheapest_track(self.manifest.tracks_of(VIDEO), self.height_spin.value())
+        self.table.blockSignals(True)
+        for row, track in enumerate(self.manifest.tracks):
+            if track.kind == VIDEO:
+                self.table.item(row, 0).setCheckState(Qt.Checked if track is choice else Qt.Unchecked)
+        self.table.blockSignals(False)
+        self.update_summary()
+    
+    def update_summary(self, *args):
+        from miix.manifest import AUDIO, VIDEO
+        from miix.tracks import best_track
+        duration = self.manifest.duration
+        if not duration:
+            self.summary_label.setText("直播或时长未知，无法估算大小")
+            return
+        selected = sum(track.estimated_bytes(duration) for track in self.checked_tracks())
+        best = sum(track.estimated_bytes(duration) for track in
+                   (best_track(self.manifest.tracks_of(kind)) for kind in (VIDEO, AUDIO)) if track is not None)
+        text = f"已选预计 {format_size(selected)}，最佳画质约 {format_size(best)}"
+        if best > selected:
+            text += f"，节省 {format_size(best - selected)}（{(best - selected) * 100 / best:.0f}%）"
+        self.summary_label.setText(text)
+    
+    def apply(self):
+        from miix.manifest import AUDIO, SUBTITLE, VIDEO
+        from miix.tracks import DROP_KEYS, SELECT_KEYS, selection_expression
+        checked = {id(track) for track in self.checked_tracks()}
+        expressions = {}
+        for kind in (VIDEO, AUDIO, SUBTITLE):
+            candidates = self.manifest.tracks_of(kind)
+            if not candidates:
+                continue
+            selected = [track for track in candidates if id(track) in checked]
+            if {id(track) for track in selected} == self.defaults[kind]:
+                continue
+            if not selected:
+                expressions[SELECT_KEYS[kind]] = ""
+                expressions[DROP_KEYS[kind]] = "for=all"
+                continue
             try:
-                self.process.terminate()
-            except:
-                pass
+                if len(selected) == len(candidates) and len(selected) > 1:
+                    expressions[SELECT_KEYS[kind]] = "for=all"
+                else:
+                    expressions[SELECT_KEYS[kind]] = selection_expression(selected, candidates)
+            except ValueError as e:
+                QMessageBox.warning(self, "无法生成表达式", f"{TRACK_TYPE_NAMES[kind]}：{str(e)}")
+                return
+            expressions[DROP_KEYS[kind]] = ""
+        self.expressions = expressions
+        self.accept()
+
+class Sparkline(QWidget):
+    """速度等历史数据的迷你折线图，caption(峰值) 返回左上角的说明文字"""
+    
+    def __init__(self, caption=None, color="#ff8fa6", parent=None):
+        super().__init__(parent)
+        self.caption = caption or (lambda peak: f"峰值 {format_size(peak)}/s")
+        self.color = color
+        self.values = []
+        self.setMinimumHeight(60)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+    
+    def set_values(self, values):
+        self.values = list(values)
+        self.update()
+    
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.fillRect(self.rect(), QColor("#f8f8f8"))
+        if len(self.values) < 2:
+            return
+        rect = self.rect().adjusted(2, 4, -2, -2)
+        peak = max(self.values) or 1
+        step = rect.width() / (len(self.values) - 1)
+        points = QPolygonF([
+            QPointF(rect.left() + index * step, rect.bottom() - value / peak * rect.height())
+            for index, value in enumerate(self.values)
+        ])
+        painter.setPen(QPen(QColor(self.color), 1.5))
+        painter.drawPolyline(points)
+        painter.setPen(QColor("#999999"))
+        painter.drawText(rect.adjusted(4, 0, 0, 0), Qt.AlignTop | Qt.AlignLeft, self.caption(peak))
+
+# 退出时等待所有下载进程结束的最长秒数
+STOP_WAIT_TIMEOUT = 15
+
+# 任务表的列
+JOB_COLUMNS = ["ID", "标题/地址", "状态", "进度", "速度", "剩余时间", "线程/限速", "CPU/内存", "退出代码"]
+(COL_ID, COL_TITLE, COL_STATUS, COL_PROGRESS, COL_SPEED, COL_ETA,
+ COL_ALLOCATION, COL_RESOURCES, COL_EXIT_CODE) = range(len(JOB_COLUMNS))
+
+class StartupTimer:
+    """启动耗时统计，命令行加 --startup-timing 时在窗口首次绘制后（事件循环开始时）向 stderr 输出各阶段耗时"""
+    
+    def __init__(self, started, enabled=False):
+        self.enabled = enabled
+        self.started = started
+        self.last = started
+        self.phases = []
+    
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+    
+    def finish(self):
+        """事件循环开始后调用：窗口已经绘制出来"""
+        self.mark("首次绘制")
+        if not self.enabled:
+            return
+        for name, seconds in self.phases:
+            print(f"{name:<16}{seconds * 1000:8.1f} ms", file=sys.stderr)
+        print(f"{'合计':<16}{(self.last - self.started) * 1000:8.1f} ms", file=sys.stderr, flush=True)
+
+startup_timer = StartupTimer(STARTUP_STARTED, '--startup-timing' in sys.argv)
 
 class M3U8Downloader(QMainWindow):
     # 自定义信号
     update_progress = pyqtSignal(int)
     update_log = pyqtSignal(str)
-    download_complete = pyqtSignal(int)
+    download_complete = pyqtSignal(int, int)  # 任务ID, 退出代码
     
     def __init__(self):
         super().__init__()
+        # 日志批量刷新
+        self.log_sink = LogSink(parent=self)
+        self.log_spill = LogSpill()
+        self.log_search_thread = None
+        self.manifest_thread = None
+        self.estimate_thread = None
+        # 下载队列
+        self.scheduler_signals = SchedulerSignals(self)
+        self.supervisor = Supervisor(self.scheduler_signals.batch_ready.emit)
+        self.scheduler = JobScheduler(self.create_download_thread, self.on_scheduler_event)
+        # 记录未完成的任务，重新启动后可以恢复
+        self.scheduler.journal = JobJournal()
+        self.scheduler.throughput = ThroughputHistory()
+        self.scheduler.disk_watchdog = DiskWatchdog(self.scheduler)
+        self.scheduler.proxy_provider = self.supervisor.proxy_url
+        self.scheduler_timer = QTimer(self)
+        self.scheduler_timer.setInterval(500)
+        self.scheduler_timer.timeout.connect(self.scheduler.tick)
+        self.scheduler_timer.start()
+        # 进度条当前显示的任务
+        self.current_job_id = None
+        self.job_items = {}
+        self.latest_progress_lines = {}
+        # 速度等指标，每秒采样一次
+        self.metrics = MetricsStore()
+        self.metrics_exporter = None
+        self.control_server = None
+        # 按声明表生成的设置控件；高级设置页延迟创建，控件创建前的设置值保存在 pending_settings
+        self.option_widgets = {}
+        self.pending_settings = {}
+        self.advanced_built = False
+        # 上次设置：延迟合并写入，不阻塞界面
+        self.settings_store = SettingsStore()
+        self.settings_store.on_error = lambda e: self.update_log.emit(f"保存上次设置时出错：{str(e)}")
+        # 命名配置，队列中的任务可以按名称引用
+        self.profile_store = ProfileStore()
+        self.scheduler.profile_resolver = self.profile_store.resolve
+        self.current_profile = None
+        self.completed_jobs = 0
+        self.failure_counts = {}
+        # 批量导入
+        self.import_thread = None
+        self.import_template = None
+        self.import_seen = set()
+        self.import_added = 0
+        startup_timer.mark("初始化队列和日志")
         self.init_ui()
+        startup_timer.mark("构建界面")
         # 绑定信号
         self.update_progress.connect(self.on_update_progress)
         self.update_log.connect(self.on_update_log)
         self.download_complete.connect(self.on_download_complete)
-        # 下载线程
-        self.download_thread = None
+        self.log_sink.lines_ready.connect(self.on_log_lines)
+        self.log_sink.progress_ready.connect(self.on_progress_lines)
+        self.scheduler_signals.job_added.connect(self.on_job_added)
+        self.scheduler_signals.job_removed.connect(self.on_job_removed)
+        self.scheduler_signals.job_updated.connect(self.on_job_updated)
+        self.scheduler_signals.job_log.connect(self.on_job_log)
+        self.scheduler_signals.job_progress.connect(self.on_job_progress)
+        self.scheduler_signals.job_progress_record.connect(self.on_job_progress_record)
+        self.scheduler_signals.job_started.connect(self.metrics.reset_job)
+        self.metrics_timer = QTimer(self)
+        self.metrics_timer.setInterval(1000)
+        self.metrics_timer.timeout.connect(self.sample_metrics)
+        self.metrics_timer.start()
+        self.scheduler_signals.job_finished.connect(self.download_complete)
+        self.scheduler_signals.command_ready.connect(lambda job_id, cmd: self.command_edit.setText(cmd))
+        self.scheduler_signals.call_requested.connect(self.run_api_call)
+        self.scheduler_signals.batch_ready.connect(self.on_supervisor_batch)
         # 窗口置顶状态
         self.is_always_on_top = False
+        # 退出时等待下载进程结束：(截止时间, 停止前的状态, 正在等待的任务, 进度对话框, 轮询定时器)
+        self.closing = None
+        self.close_ready = False
         # 加载上次设置
         self.load_last_settings()
+        startup_timer.mark("加载上次设置")
+        # 窗口显示后再询问是否恢复上次未完成的任务
+        QTimer.singleShot(0, self.offer_resume_jobs)
     
     def init_ui(self):
         # 设置窗口标题和图标
@@ -130,6 +611,112 @@ class M3U8Downloader(QMainWindow):
         
         self.setMinimumSize(1000, 750)
         
+        # 设置全局样式（在创建子控件之前设置，避免每个控件重复应用样式）
+        self.setStyleSheet("""
+            QMainWindow {
+                background-color: #f5f5f5;
+            }
+            QGroupBox {
+                font-weight: bold;
+                border: 2px solid #cccccc;
+                border-radius: 8px;
+                margin-top: 12px;
+                padding-top: 10px;
+                background-color: white;
+                font-size: 10pt;
+            }
+            QGroupBox::title {
+                subcontrol-origin: margin;
+                left: 10px;
+                padding: 0 5px 0 5px;
+            }
+            QLabel {
+                color: #333333;
+                font-size: 10pt;
+            }
+            QLineEdit, QSpinBox, QComboBox {
+                border: 1px solid #cccccc;
+                border-radius: 4px;
+                padding: 5px 8px;
+                background-color: white;
+                selection-background-color: #ffb8c6;
+                font-size: 10pt;
+            }
+            QLineEdit:focus, QSpinBox:focus, QComboBox:focus {
+                border: 2px solid #999999;
+            }
+            QCheckBox {
+                spacing: 5px;
+                color: #333333;
+                font-size: 10pt;
+            }
+            QCheckBox::indicator {
+                width: 18px;
+                height: 18px;
+            }
+            QCheckBox::indicator:unchecked {
+                border: 1px solid #cccccc;
+                border-radius: 3px;
+                background-color: white;
+            }
+            QCheckBox::indicator:checked {
+                background-color: #ffb8c6;
+                border: 1px solid #ffa0b2;
+                border-radius: 3px;
+            }
+            QTabWidget::pane {
+                border: 1px solid #cccccc;
+                border-radius: 5px;
+                background-color: white;
+            }
+            QTabBar::tab {
+                background-color: #f0f0f0;
+                padding: 8px 16px;
+                margin-right: 2px;
+                border-top-left-radius: 5px;
+                border-top-right-radius: 5px;
+                color: #666666;
+                font-size: 10pt;
+            }
+            QTabBar::tab:selected {
+                background-color: white;
+                border-bottom: 2px solid #ffb8c6;
+                color: #333333;
+                font-weight: bold;
+            }
+            QTabBar::tab:hover {
+                background-color: #e8e8e8;
+            }
+            QPushButton {
+                font-weight: bold;
+                border-radius: 5px;
+                padding: 6px 12px;
+                font-size: 10pt;
+            }
+            QScrollArea {
+                border: none;
+                background-color: white;
+            }
+            QScrollBar:vertical {
+                border: none;
+                background-color: #f0f0f0;
+                width: 12px;
+                border-radius: 6px;
+            }
+            QScrollBar::handle:vertical {
+                background-color: #cccccc;
+                border-radius: 6px;
+                min-height: 20px;
+            }
+            QScrollBar::handle:vertical:hover {
+                background-color: #aaaaaa;
+            }
+            QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {
+                border: none;
+                background: none;
+            }
+        """)
+        
         # 创建中心部件
         central_widget = QWidget()
         self.setCentralWidget(central_widget)
@@ -192,6 +779,42 @@ class M3U8Downloader(QMainWindow):
         
         top_button_layout.addStretch()
         
+        # 命名配置
+        top_button_layout.addWidget(QLabel("配置："))
+        self.profile_combo = QComboBox()
+        self.profile_combo.setMinimumHeight(35)
+        self.profile_combo.setMinimumWidth(160)
+        self.profile_combo.setToolTip("切换已保存的命名配置，只修改与当前不同的设置项")
+        self.profile_combo.activated.connect(self.switch_profile)
+        top_button_layout.addWidget(self.profile_combo)
+        self.refresh_profile_combo()
+        
+        profile_button_style = """
+            QPushButton {
+                background-color: #f0f0f0;
+                color: #333333;
+                border-radius: 6px;
+                padding: 8px 12px;
+                border: 1px solid #cccccc;
+                font-size: 10pt;
+            }
+            QPushButton:hover {
+                background-color: #e8e8e8;
+                border: 1px solid #aaaaaa;
+            }
+        """
+        save_profile_btn = QPushButton("另存为配置")
+        save_profile_btn.setMinimumHeight(35)
+        save_profile_btn.clicked.connect(self.save_profile_as)
+        save_profile_btn.setStyleSheet(profile_button_style)
+        top_button_layout.addWidget(save_profile_btn)
+        
+        delete_profile_btn = QPushButton("删除配置")
+        delete_profile_btn.setMinimumHeight(35)
+        delete_profile_btn.clicked.connect(self.delete_profile)
+        delete_profile_btn.setStyleSheet(profile_button_style)
+        top_button_layout.addWidget(delete_profile_btn)
+        
         # 保存设置按钮
         save_btn = QPushButton("💾 保存设置")
         save_btn.setMinimumHeight(35)
@@ -254,263 +877,19 @@ class M3U8Downloader(QMainWindow):
         basic_layout = QVBoxLayout(basic_tab)
         basic_layout.setSpacing(10)
         
-        # 路径设置组
-        path_group = QGroupBox("路径设置")
-        path_layout = QGridLayout()
-        path_layout.setSpacing(8)
-        
-        # 第一行：执行程序
-        path_layout.addWidget(QLabel("执行程序："), 0, 0)
-        self.executable_edit = QLineEdit()
-        self.executable_edit.setText("N_m3u8DL-RE.exe")
-        self.executable_edit.setMinimumHeight(32)
-        path_layout.addWidget(self.executable_edit, 0, 1)
-        
-        browse_btn = QPushButton("选择")
-        browse_btn.clicked.connect(self.browse_executable)
-        browse_btn.setMinimumWidth(70)
-        browse_btn.setMaximumWidth(70)
-        browse_btn.setStyleSheet("""
-            QPushButton {
-                font-size: 9pt;
-                padding: 4px 6px;
-                border-radius: 4px;
-            }
-        """)
-        path_layout.addWidget(browse_btn, 0, 2)
-        
-        # 第二行：工作目录
-        path_layout.addWidget(QLabel("工作目录："), 1, 0)
-        self.work_dir_edit = QLineEdit()
-        self.work_dir_edit.setMinimumHeight(32)
-        path_layout.addWidget(self.work_dir_edit, 1, 1)
-        
-        dir_btn = QPushButton("选择")
-        dir_btn.clicked.connect(self.browse_work_dir)
-        dir_btn.setMinimumWidth(70)
-        dir_btn.setMaximumWidth(70)
-        dir_btn.setStyleSheet("""
-            QPushButton {
-                font-size: 9pt;
-                padding: 4px 6px;
-                border-radius: 4px;
-            }
-        """)
-        path_layout.addWidget(dir_btn, 1, 2)
-        
-        # 第三行：FFmpeg路径
-        path_layout.addWidget(QLabel("FFmpeg路径："), 2, 0)
-        self.ffmpeg_path_edit = QLineEdit()
-        self.ffmpeg_path_edit.setPlaceholderText("选择FFmpeg可执行文件路径")
-        self.ffmpeg_path_edit.setMinimumHeight(32)
-        path_layout.addWidget(self.ffmpeg_path_edit, 2, 1)
-        
-        ffmpeg_browse_btn = QPushButton("选择")
-        ffmpeg_browse_btn.clicked.connect(self.browse_ffmpeg_path)
-        ffmpeg_browse_btn.setMinimumWidth(70)
-        ffmpeg_browse_btn.setMaximumWidth(70)
-        ffmpeg_browse_btn.setStyleSheet("""
-            QPushButton {
-                font-size: 9pt;
-                padding: 4px 6px;
-                border-radius: 4px;
-            }
-        """)
-        path_layout.addWidget(ffmpeg_browse_btn, 2, 2)
-        
-        path_group.setLayout(path_layout)
-        basic_layout.addWidget(path_group)
-        
-        # 下载设置组
-        url_group = QGroupBox("下载设置")
-        url_layout = QGridLayout()
-        url_layout.setSpacing(8)
-        
-        url_layout.addWidget(QLabel("M3U8地址："), 0, 0)
-        self.m3u8_url_edit = QLineEdit()
-        self.m3u8_url_edit.setPlaceholderText("输入M3U8地址，支持HTTP/HTTPS协议")
-        self.m3u8_url_edit.setMinimumHeight(32)
-        url_layout.addWidget(self.m3u8_url_edit, 0, 1, 1, 3)
-        
-        url_layout.addWidget(QLabel("视频标题："), 1, 0)
-        self.title_edit = QLineEdit()
-        self.title_edit.setPlaceholderText("输入视频标题，将作为文件名")
-        self.title_edit.setMinimumHeight(32)
-        url_layout.addWidget(self.title_edit, 1, 1)
-        
-        url_layout.addWidget(QLabel("请求头："), 1, 2)
-        self.headers_edit = QLineEdit()
-        self.headers_edit.setPlaceholderText("格式: Header1:Value1")
-        self.headers_edit.setMinimumHeight(32)
-        url_layout.addWidget(self.headers_edit, 1, 3)
-        
-        url_layout.addWidget(QLabel("BASEURL："), 2, 0)
-        self.baseurl_edit = QLineEdit()
-        self.baseurl_edit.setPlaceholderText("设置基础URL，用于相对路径解析")
-        self.baseurl_edit.setMinimumHeight(32)
-        url_layout.addWidget(self.baseurl_edit, 2, 1)
-        
-        url_layout.addWidget(QLabel("混流文件："), 2, 2)
-        self.mux_file_edit = QLineEdit()
-        self.mux_file_edit.setPlaceholderText("选择要混流的本地文件")
-        self.mux_file_edit.setMinimumHeight(32)
-        url_layout.addWidget(self.mux_file_edit, 2, 3)
-        
-        mux_btn = QPushButton("选择")
-        mux_btn.clicked.connect(self.browse_mux_file)
-        mux_btn.setMinimumWidth(70)
-        mux_btn.setMaximumWidth(70)
-        mux_btn.setStyleSheet("""
-            QPushButton {
-                font-size: 9pt;
-                padding: 4px 6px;
-                border-radius: 4px;
-            }
-        """)
-        url_layout.addWidget(mux_btn, 2, 4)
-        
-        url_group.setLayout(url_layout)
-        basic_layout.addWidget(url_group)
+        # 设置分组按声明表生成
+        for group in BASIC_GROUPS[:2]:
+            basic_layout.addWidget(self.build_option_group(group))
         
         # 范围选择和性能设置
         top_row_layout = QHBoxLayout()
         top_row_layout.setSpacing(10)
-        
-        # 范围选择
-        range_group = QGroupBox("范围选择")
-        range_layout = QHBoxLayout()
-        range_layout.setSpacing(8)
-        
-        range_layout.addWidget(QLabel("开始时间："))
-        self.start_time_edit = QLineEdit("00:00:00")
-        self.start_time_edit.setMinimumHeight(32)
-        self.start_time_edit.setMaximumWidth(90)
-        range_layout.addWidget(self.start_time_edit)
-        
-        range_layout.addWidget(QLabel("结束时间："))
-        self.end_time_edit = QLineEdit("00:00:00")
-        self.end_time_edit.setMinimumHeight(32)
-        self.end_time_edit.setMaximumWidth(90)
-        range_layout.addWidget(self.end_time_edit)
-        
-        range_group.setLayout(range_layout)
-        top_row_layout.addWidget(range_group, 1)
-        
-        # 性能设置
-        performance_group = QGroupBox("性能设置")
-        performance_layout = QHBoxLayout()
-        performance_layout.setSpacing(10)
-        
-        # 下载线程数
-        threads_layout = QHBoxLayout()
-        threads_layout.addWidget(QLabel("线程数："))
-        self.max_threads = QSpinBox()
-        self.max_threads.setRange(1, 100)
-        self.max_threads.setValue(32)
-        self.max_threads.setMinimumHeight(32)
-        self.max_threads.setMaximumWidth(70)
-        threads_layout.addWidget(self.max_threads)
-        performance_layout.addLayout(threads_layout)
-        
-        # 重试次数
-        retry_layout = QHBoxLayout()
-        retry_layout.addWidget(QLabel("重试："))
-        self.retry_count = QSpinBox()
-        self.retry_count.setRange(1, 100)
-        self.retry_count.setValue(15)
-        self.retry_count.setMinimumHeight(32)
-        self.retry_count.setMaximumWidth(70)
-        retry_layout.addWidget(self.retry_count)
-        performance_layout.addLayout(retry_layout)
-        
-        # HTTP超时
-        timeout_layout = QHBoxLayout()
-        timeout_layout.addWidget(QLabel("超时："))
-        self.timeout = QSpinBox()
-        self.timeout.setRange(1, 300)
-        self.timeout.setValue(100)
-        self.timeout.setMinimumHeight(32)
-        self.timeout.setMaximumWidth(70)
-        timeout_layout.addWidget(self.timeout)
-        performance_layout.addLayout(timeout_layout)
-        
-        # 限速
-        speed_layout = QHBoxLayout()
-        speed_layout.addWidget(QLabel("限速："))
-        self.limit_speed = QSpinBox()
-        self.limit_speed.setRange(0, 10000)
-        self.limit_speed.setValue(0)
-        self.limit_speed.setMinimumHeight(32)
-        self.limit_speed.setMaximumWidth(90)
-        speed_layout.addWidget(self.limit_speed)
-        speed_layout.addWidget(QLabel("kb/s"))
-        performance_layout.addLayout(speed_layout)
-        
-        performance_group.setLayout(performance_layout)
-        top_row_layout.addWidget(performance_group, 2)
-        
+        top_row_layout.addWidget(self.build_option_group("范围选择"), 1)
+        top_row_layout.addWidget(self.build_option_group("性能设置"), 2)
         basic_layout.addLayout(top_row_layout)
         
-        # 基础选项
-        options_group = QGroupBox("基础选项")
-        options_layout = QGridLayout()
-        options_layout.setSpacing(8)
-        options_layout.setHorizontalSpacing(15)
-        
-        # 第一行
-        self.del_after_merge = QCheckBox("合并后删除分片")
-        self.del_after_merge.setChecked(True)
-        options_layout.addWidget(self.del_after_merge, 0, 0)
-        
-        self.only_parse_m3u8 = QCheckBox("仅解析m3u8")
-        options_layout.addWidget(self.only_parse_m3u8, 0, 1)
-        
-        self.mux_while_download = QCheckBox("混流MP4边下边看")
-        options_layout.addWidget(self.mux_while_download, 0, 2)
-        
-        self.binary_merge = QCheckBox("使用二进制合并")
-        options_layout.addWidget(self.binary_merge, 0, 3)
-        
-        # 第二行
-        self.auto_select = QCheckBox("自动选择最佳轨道")
-        self.auto_select.setChecked(True)
-        options_layout.addWidget(self.auto_select, 1, 0)
-        
-        self.check_segments_count = QCheckBox("检测分片数量")
-        self.check_segments_count.setChecked(True)
-        options_layout.addWidget(self.check_segments_count, 1, 1)
-        
-        self.concurrent_download = QCheckBox("并发下载音视频")
-        self.concurrent_download.setChecked(True)
-        options_layout.addWidget(self.concurrent_download, 1, 2)
-        
-        self.merge_to_mp4 = QCheckBox("合并为mp4")
-        self.merge_to_mp4.setChecked(True)
-        self.merge_to_mp4.setToolTip("如果勾选，将在命令中添加 -M format=mp4 参数")
-        options_layout.addWidget(self.merge_to_mp4, 1, 3)
-        
-        options_group.setLayout(options_layout)
-        basic_layout.addWidget(options_group)
-        
-        # 自定义参数和解密密钥
-        custom_args_group = QGroupBox("高级参数")
-        custom_args_layout = QGridLayout()
-        custom_args_layout.setSpacing(8)
-        
-        custom_args_layout.addWidget(QLabel("自定义参数："), 0, 0)
-        self.args_edit = QLineEdit()
-        self.args_edit.setPlaceholderText("输入其他自定义命令行参数，用空格分隔")
-        self.args_edit.setMinimumHeight(32)
-        custom_args_layout.addWidget(self.args_edit, 0, 1)
-        
-        custom_args_layout.addWidget(QLabel("解密密钥："), 0, 2)
-        self.key_edit = QLineEdit()
-        self.key_edit.setPlaceholderText("格式: KID1:KEY1 或直接输入KEY")
-        self.key_edit.setMinimumHeight(32)
-        custom_args_layout.addWidget(self.key_edit, 0, 3)
-        
-        custom_args_group.setLayout(custom_args_layout)
-        basic_layout.addWidget(custom_args_group)
+        for group in BASIC_GROUPS[4:]:
+            basic_layout.addWidget(self.build_option_group(group))
         
         # 添加弹性空间
         basic_layout.addStretch()
@@ -518,379 +897,140 @@ class M3U8Downloader(QMainWindow):
         # 将基础标签页添加到标签页容器
         self.tab_widget.addTab(basic_tab, "基础设置")
         
-        # 高级设置标签页
-        advanced_tab = QWidget()
-        advanced_scroll = QScrollArea()
-        advanced_scroll.setWidgetResizable(True)
-        advanced_scroll.setWidget(advanced_tab)
+        # 高级设置标签页：控件较多，第一次切换到该页时才创建
+        self.advanced_scroll = QScrollArea()
+        self.advanced_scroll.setWidgetResizable(True)
+        self.advanced_tab_index = self.tab_widget.addTab(self.advanced_scroll, "高级设置")
+        
+        # 任务队列标签页
+        queue_tab = QWidget()
+        queue_layout = QVBoxLayout(queue_tab)
+        queue_layout.setSpacing(10)
+        
+        queue_toolbar = QHBoxLayout()
+        queue_toolbar.setSpacing(8)
+        
+        add_job_btn = QPushButton("➕ 加入队列")
+        add_job_btn.clicked.connect(self.enqueue_current)
+        queue_toolbar.addWidget(add_job_btn)
+        
+        estimate_btn = QPushButton("📏 预估")
+        estimate_btn.setToolTip("读取当前地址的清单，预估大小、耗时和磁盘空间，不加入队列")
+        estimate_btn.clicked.connect(lambda: self.start_estimate(self.get_current_settings()))
+        queue_toolbar.addWidget(estimate_btn)
+        
+        import_file_btn = QPushButton("📥 批量导入")
+        import_file_btn.setToolTip("从文本/CSV/JSON文件导入地址列表，使用当前设置作为模板")
+        import_file_btn.clicked.connect(self.import_url_file)
+        queue_toolbar.addWidget(import_file_btn)
+        
+        import_paste_btn = QPushButton("📋 粘贴导入")
+        import_paste_btn.clicked.connect(self.import_url_text)
+        queue_toolbar.addWidget(import_paste_btn)
+        
+        start_job_btn = QPushButton("▶️ 开始")
+        start_job_btn.clicked.connect(lambda: self.apply_to_selected_jobs(self.scheduler.start_job))
+        queue_toolbar.addWidget(start_job_btn)
+        
+        pause_job_btn = QPushButton("⏸️ 暂停")
+        pause_job_btn.setToolTip("挂起下载进程，已下载的分片保留；点击开始继续")
+        pause_job_btn.clicked.connect(lambda: self.apply_to_selected_jobs(self.scheduler.pause_job))
+        queue_toolbar.addWidget(pause_job_btn)
+        
+        stop_job_btn = QPushButton("⏹️ 停止")
+        stop_job_btn.clicked.connect(lambda: self.apply_to_selected_jobs(self.scheduler.stop_job))
+        queue_toolbar.addWidget(stop_job_btn)
+        
+        retry_job_btn = QPushButton("🔁 重试")
+        retry_job_btn.clicked.connect(lambda: self.apply_to_selected_jobs(self.scheduler.retry_job))
+        queue_toolbar.addWidget(retry_job_btn)
+        
+        remove_job_btn = QPushButton("🗑️ 移除")
+        remove_job_btn.clicked.connect(lambda: self.apply_to_selected_jobs(self.scheduler.remove_job))
+        queue_toolbar.addWidget(remove_job_btn)
+        
+        queue_toolbar.addStretch()
+        
+        queue_toolbar.addWidget(QLabel("同时下载数："))
+        self.max_concurrent_jobs = self.create_option_widget("max_concurrent_jobs")
+        self.max_concurrent_jobs.valueChanged.connect(self.scheduler.set_max_concurrent)
+        queue_toolbar.addWidget(self.max_concurrent_jobs)
+        
+        queue_toolbar.addWidget(QLabel("自动重试："))
+        self.auto_retry_count = self.create_option_widget("auto_retry_count")
+        self.auto_retry_count.valueChanged.connect(self.scheduler.set_auto_retry)
+        self.scheduler.set_auto_retry(self.auto_retry_count.value())
+        queue_toolbar.addWidget(self.auto_retry_count)
+        
+        queue_layout.addLayout(queue_toolbar)
+        
+        # 全局预算：所有正在运行的任务共享
+        budget_layout = QHBoxLayout()
+        budget_layout.setSpacing(8)
+        
+        budget_layout.addWidget(QLabel("总线程数："))
+        self.global_thread_budget = self.create_option_widget("global_thread_budget")
+        self.global_thread_budget.setSpecialValueText("不限")
+        self.global_thread_budget.valueChanged.connect(self.update_budget)
+        budget_layout.addWidget(self.global_thread_budget)
+        
+        budget_layout.addWidget(QLabel("总带宽："))
+        self.global_speed_budget = self.create_option_widget("global_speed_budget")
+        self.global_speed_budget.setSpecialValueText("不限")
+        self.global_speed_budget.valueChanged.connect(self.update_budget)
+        budget_layout.addWidget(self.global_speed_budget)
+        budget_layout.addWidget(QLabel("kb/s"))
+        
+        self.rebalance_restart = self.create_option_widget("rebalance_restart")
+        self.rebalance_restart.stateChanged.connect(
+            lambda state: self.scheduler.set_rebalance_restart(state == Qt.Checked))
+        budget_layout.addWidget(self.rebalance_restart)
+        
+        budget_layout.addStretch()
+        queue_layout.addLayout(budget_layout)
+        
+        self.job_table = QTableWidget(0, len(JOB_COLUMNS))
+        self.job_table.setHorizontalHeaderLabels(JOB_COLUMNS)
+        self.job_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.job_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.job_table.verticalHeader().setVisible(False)
+        self.job_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.job_table.horizontalHeader().setSectionResizeMode(COL_TITLE, QHeaderView.Stretch)
+        self.job_table.itemSelectionChanged.connect(self.on_job_selection_changed)
+        queue_layout.addWidget(self.job_table)
+        
+        # 速度监控
+        metrics_group = QGroupBox("📈 速度监控")
+        metrics_layout = QVBoxLayout()
+        metrics_layout.setSpacing(6)
+        
+        self.metrics_label = QLabel("当前任务：-")
+        metrics_layout.addWidget(self.metrics_label)
+        
+        sparkline_layout = QHBoxLayout()
+        self.speed_sparkline = Sparkline()
+        sparkline_layout.addWidget(self.speed_sparkline, 2)
+        # 子进程树（N_m3u8DL-RE、ffmpeg 等）的 CPU 占用
+        self.cpu_sparkline = Sparkline(lambda peak: f"CPU 峰值 {peak:.0f}%", "#7fa8e0")
+        sparkline_layout.addWidget(self.cpu_sparkline, 1)
+        metrics_layout.addLayout(sparkline_layout)
+        
+        self.origin_table = QTableWidget(0, 6)
+        self.origin_table.setHorizontalHeaderLabels(["源站", "任务数", "最小速度", "平均速度", "P95速度", "重试"])
+        self.origin_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.origin_table.verticalHeader().setVisible(False)
+        self.origin_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        self.origin_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.origin_table.setMaximumHeight(120)
+        metrics_layout.addWidget(self.origin_table)
+        
+        metrics_group.setLayout(metrics_layout)
+        queue_layout.addWidget(metrics_group)
+        
+        self.tab_widget.addTab(queue_tab, "任务队列")
+        self.tab_widget.currentChanged.connect(self.on_tab_changed)
         
-        advanced_layout = QVBoxLayout(advanced_tab)
-        advanced_layout.setSpacing(12)
-        
-        # 输出设置
-        output_group = QGroupBox("输出设置")
-        output_layout = QGridLayout()
-        output_layout.setSpacing(8)
-        
-        # 临时目录
-        output_layout.addWidget(QLabel("临时目录："), 0, 0)
-        self.tmp_dir_edit = QLineEdit()
-        self.tmp_dir_edit.setPlaceholderText("设置临时文件存储目录")
-        self.tmp_dir_edit.setMinimumHeight(32)
-        output_layout.addWidget(self.tmp_dir_edit, 0, 1, 1, 2)
-        
-        tmp_dir_btn = QPushButton("选择")
-        tmp_dir_btn.clicked.connect(lambda: self.browse_directory(self.tmp_dir_edit))
-        tmp_dir_btn.setMinimumWidth(70)
-        tmp_dir_btn.setMaximumWidth(70)
-        tmp_dir_btn.setStyleSheet("""
-            QPushButton {
-                font-size: 9pt;
-                padding: 4px 6px;
-                border-radius: 4px;
-            }
-        """)
-        output_layout.addWidget(tmp_dir_btn, 0, 3)
-        
-        # 文件命名模板
-        output_layout.addWidget(QLabel("文件命名模板："), 1, 0)
-        self.save_pattern_edit = QLineEdit()
-        self.save_pattern_edit.setPlaceholderText("如: <SaveName>_<Resolution>_<Bandwidth>")
-        self.save_pattern_edit.setMinimumHeight(32)
-        output_layout.addWidget(self.save_pattern_edit, 1, 1, 1, 3)
-        
-        # 日志文件路径
-        output_layout.addWidget(QLabel("日志文件路径："), 2, 0)
-        self.log_file_path_edit = QLineEdit()
-        self.log_file_path_edit.setPlaceholderText("如: C:\\Logs\\log.txt")
-        self.log_file_path_edit.setMinimumHeight(32)
-        output_layout.addWidget(self.log_file_path_edit, 2, 1, 1, 2)
-        
-        log_file_btn = QPushButton("选择")
-        log_file_btn.clicked.connect(lambda: self.browse_file(self.log_file_path_edit, "日志文件 (*.txt)"))
-        log_file_btn.setMinimumWidth(70)
-        log_file_btn.setMaximumWidth(70)
-        log_file_btn.setStyleSheet("""
-            QPushButton {
-                font-size: 9pt;
-                padding: 4px 6px;
-                border-radius: 4px;
-            }
-        """)
-        output_layout.addWidget(log_file_btn, 2, 3)
-        
-        # 密钥文本文件
-        output_layout.addWidget(QLabel("密钥文本文件："), 3, 0)
-        self.key_text_file_edit = QLineEdit()
-        self.key_text_file_edit.setPlaceholderText("设置密钥文件")
-        self.key_text_file_edit.setMinimumHeight(32)
-        output_layout.addWidget(self.key_text_file_edit, 3, 1, 1, 2)
-        
-        key_file_btn = QPushButton("选择")
-        key_file_btn.clicked.connect(lambda: self.browse_file(self.key_text_file_edit, "文本文件 (*.txt)"))
-        key_file_btn.setMinimumWidth(70)
-        key_file_btn.setMaximumWidth(70)
-        key_file_btn.setStyleSheet("""
-            QPushButton {
-                font-size: 9pt;
-                padding: 4px 6px;
-                border-radius: 4px;
-            }
-        """)
-        output_layout.addWidget(key_file_btn, 3, 3)
-        
-        output_group.setLayout(output_layout)
-        advanced_layout.addWidget(output_group)
-        
-        # 直播设置
-        live_group = QGroupBox("直播设置")
-        live_layout = QGridLayout()
-        live_layout.setSpacing(8)
-        
-        live_layout.addWidget(QLabel("录制时长限制："), 0, 0)
-        self.live_record_limit_edit = QLineEdit("HH:mm:ss")
-        self.live_record_limit_edit.setPlaceholderText("如: 01:00:00")
-        self.live_record_limit_edit.setMinimumHeight(32)
-        live_layout.addWidget(self.live_record_limit_edit, 0, 1)
-        
-        live_layout.addWidget(QLabel("刷新间隔(秒)："), 0, 2)
-        self.live_wait_time_spin = QSpinBox()
-        self.live_wait_time_spin.setRange(1, 3600)
-        self.live_wait_time_spin.setValue(3)
-        self.live_wait_time_spin.setMinimumHeight(32)
-        self.live_wait_time_spin.setMaximumWidth(80)
-        live_layout.addWidget(self.live_wait_time_spin, 0, 3)
-        
-        live_layout.addWidget(QLabel("首次分片数量："), 1, 0)
-        live_take_count_layout = QHBoxLayout()
-        self.live_take_count_enabled = QCheckBox()
-        self.live_take_count_enabled.setChecked(True)
-        live_take_count_layout.addWidget(self.live_take_count_enabled)
-        
-        self.live_take_count_spin = QSpinBox()
-        self.live_take_count_spin.setRange(1, 100)
-        self.live_take_count_spin.setValue(16)
-        self.live_take_count_spin.setMinimumHeight(32)
-        self.live_take_count_spin.setMaximumWidth(70)
-        self.live_take_count_spin.setEnabled(True)
-        live_take_count_layout.addWidget(self.live_take_count_spin)
-        self.live_take_count_enabled.stateChanged.connect(self.toggle_live_take_count)
-        live_layout.addLayout(live_take_count_layout, 1, 1)
-        
-        self.live_perform_as_vod = QCheckBox("按点播方式下载直播流")
-        live_layout.addWidget(self.live_perform_as_vod, 1, 2)
-        
-        self.live_keep_segments = QCheckBox("实时合并时保留分片")
-        self.live_keep_segments.setChecked(True)
-        live_layout.addWidget(self.live_keep_segments, 1, 3)
-        
-        live_layout.addWidget(QLabel("任务开始时间："), 2, 0)
-        self.task_start_at_edit = QLineEdit("yyyyMMddHHmmss")
-        self.task_start_at_edit.setPlaceholderText("如: 20231225120000")
-        self.task_start_at_edit.setMinimumHeight(32)
-        live_layout.addWidget(self.task_start_at_edit, 2, 1, 1, 2)
-        
-        live_group.setLayout(live_layout)
-        advanced_layout.addWidget(live_group)
-        
-        # 轨道选择设置
-        track_group = QGroupBox("轨道选择设置")
-        track_layout = QGridLayout()
-        track_layout.setSpacing(8)
-        
-        track_layout.addWidget(QLabel("选择视频轨道："), 0, 0)
-        self.select_video_edit = QLineEdit()
-        self.select_video_edit.setPlaceholderText("正则表达式选择视频流")
-        self.select_video_edit.setMinimumHeight(32)
-        track_layout.addWidget(self.select_video_edit, 0, 1, 1, 2)
-        
-        track_layout.addWidget(QLabel("选择音频轨道："), 1, 0)
-        self.select_audio_edit = QLineEdit()
-        self.select_audio_edit.setPlaceholderText("正则表达式选择音频流")
-        self.select_audio_edit.setMinimumHeight(32)
-        track_layout.addWidget(self.select_audio_edit, 1, 1, 1, 2)
-        
-        track_layout.addWidget(QLabel("选择字幕轨道："), 2, 0)
-        self.select_subtitle_edit = QLineEdit()
-        self.select_subtitle_edit.setPlaceholderText("正则表达式选择字幕流")
-        self.select_subtitle_edit.setMinimumHeight(32)
-        track_layout.addWidget(self.select_subtitle_edit, 2, 1, 1, 2)
-        
-        track_layout.addWidget(QLabel("丢弃视频轨道："), 3, 0)
-        self.drop_video_edit = QLineEdit()
-        self.drop_video_edit.setPlaceholderText("正则表达式丢弃视频流")
-        self.drop_video_edit.setMinimumHeight(32)
-        track_layout.addWidget(self.drop_video_edit, 3, 1, 1, 2)
-        
-        track_layout.addWidget(QLabel("丢弃音频轨道："), 0, 3)
-        self.drop_audio_edit = QLineEdit()
-        self.drop_audio_edit.setPlaceholderText("正则表达式丢弃音频流")
-        self.drop_audio_edit.setMinimumHeight(32)
-        track_layout.addWidget(self.drop_audio_edit, 0, 4, 1, 2)
-        
-        track_layout.addWidget(QLabel("丢弃字幕轨道："), 1, 3)
-        self.drop_subtitle_edit = QLineEdit()
-        self.drop_subtitle_edit.setPlaceholderText("正则表达式丢弃字幕流")
-        self.drop_subtitle_edit.setMinimumHeight(32)
-        track_layout.addWidget(self.drop_subtitle_edit, 1, 4, 1, 2)
-        
-        track_layout.addWidget(QLabel("广告关键字："), 2, 3)
-        self.ad_keyword_edit = QLineEdit()
-        self.ad_keyword_edit.setPlaceholderText("设置广告分片的URL关键字")
-        self.ad_keyword_edit.setMinimumHeight(32)
-        track_layout.addWidget(self.ad_keyword_edit, 2, 4, 1, 2)
-        
-        track_layout.addWidget(QLabel("URL处理器参数："), 3, 3)
-        self.urlprocessor_args_edit = QLineEdit()
-        self.urlprocessor_args_edit.setPlaceholderText("直接传递给URL Processor")
-        self.urlprocessor_args_edit.setMinimumHeight(32)
-        track_layout.addWidget(self.urlprocessor_args_edit, 3, 4, 1, 2)
-        
-        track_group.setLayout(track_layout)
-        advanced_layout.addWidget(track_group)
-        
-        # 解密/加密设置
-        decrypt_group = QGroupBox("解密/加密设置")
-        decrypt_layout = QGridLayout()
-        decrypt_layout.setSpacing(8)
-        
-        decrypt_layout.addWidget(QLabel("解密引擎："), 0, 0)
-        self.decryption_engine = QComboBox()
-        self.decryption_engine.addItems(["MP4DECRYPT", "FFMPEG", "SHAKA_PACKAGER"])
-        self.decryption_engine.setCurrentText("MP4DECRYPT")
-        self.decryption_engine.setMinimumHeight(32)
-        decrypt_layout.addWidget(self.decryption_engine, 0, 1)
-        
-        decrypt_layout.addWidget(QLabel("解密工具路径："), 0, 2)
-        self.decryption_binary_path = QLineEdit()
-        self.decryption_binary_path.setPlaceholderText("选择解密工具路径")
-        self.decryption_binary_path.setMinimumHeight(32)
-        decrypt_layout.addWidget(self.decryption_binary_path, 0, 3)
-        
-        decrypt_binary_btn = QPushButton("选择")
-        decrypt_binary_btn.clicked.connect(self.browse_decryption_binary)
-        decrypt_binary_btn.setMinimumWidth(70)
-        decrypt_binary_btn.setMaximumWidth(70)
-        decrypt_binary_btn.setStyleSheet("""
-            QPushButton {
-                font-size: 9pt;
-                padding: 4px 6px;
-                border-radius: 4px;
-            }
-        """)
-        decrypt_layout.addWidget(decrypt_binary_btn, 0, 4)
-        
-        self.mp4_real_time_decryption = QCheckBox("MP4实时解密")
-        decrypt_layout.addWidget(self.mp4_real_time_decryption, 1, 0)
-        
-        decrypt_layout.addWidget(QLabel("HLS加密方法："), 1, 1)
-        self.custom_hls_method = QComboBox()
-        self.custom_hls_method.addItems(["AES_128", "AES_128_ECB", "CENC", "CHACHA20", "NONE", "SAMPLE_AES", "SAMPLE_AES_CTR", "UNKNOWN"])
-        self.custom_hls_method.setCurrentText("AES_128")
-        self.custom_hls_method.setMinimumHeight(32)
-        decrypt_layout.addWidget(self.custom_hls_method, 1, 2)
-        
-        decrypt_layout.addWidget(QLabel("HLS密钥："), 2, 0)
-        self.custom_hls_key_edit = QLineEdit()
-        self.custom_hls_key_edit.setPlaceholderText("文件、HEX或Base64")
-        self.custom_hls_key_edit.setMinimumHeight(32)
-        decrypt_layout.addWidget(self.custom_hls_key_edit, 2, 1, 1, 2)
-        
-        decrypt_layout.addWidget(QLabel("HLS IV："), 2, 3)
-        self.custom_hls_iv_edit = QLineEdit()
-        self.custom_hls_iv_edit.setPlaceholderText("文件、HEX或Base64")
-        self.custom_hls_iv_edit.setMinimumHeight(32)
-        decrypt_layout.addWidget(self.custom_hls_iv_edit, 2, 4)
-        
-        decrypt_group.setLayout(decrypt_layout)
-        advanced_layout.addWidget(decrypt_group)
-        
-        # 字幕设置
-        subtitle_group = QGroupBox("字幕设置")
-        subtitle_layout = QGridLayout()
-        subtitle_layout.setSpacing(8)
-        
-        subtitle_layout.addWidget(QLabel("仅下载字幕："), 0, 0)
-        self.sub_only = QCheckBox()
-        self.sub_only.setChecked(False)
-        subtitle_layout.addWidget(self.sub_only, 0, 1)
-        
-        subtitle_layout.addWidget(QLabel("字幕格式："), 0, 2)
-        self.sub_format = QComboBox()
-        self.sub_format.addItems(["SRT", "VTT"])
-        self.sub_format.setCurrentText("SRT")
-        self.sub_format.setMinimumHeight(32)
-        subtitle_layout.addWidget(self.sub_format, 0, 3)
-        
-        subtitle_layout.addWidget(QLabel("自动修复字幕："), 0, 4)
-        self.auto_subtitle_fix = QCheckBox()
-        self.auto_subtitle_fix.setChecked(True)
-        subtitle_layout.addWidget(self.auto_subtitle_fix, 0, 5)
-        
-        subtitle_layout.addWidget(QLabel("音频修正VTT："), 1, 0)
-        self.live_fix_vtt_by_audio = QCheckBox()
-        self.live_fix_vtt_by_audio.setChecked(False)
-        subtitle_layout.addWidget(self.live_fix_vtt_by_audio, 1, 1)
-        
-        subtitle_group.setLayout(subtitle_layout)
-        advanced_layout.addWidget(subtitle_group)
-        
-        # 代理设置
-        proxy_group = QGroupBox("代理设置")
-        proxy_layout = QGridLayout()
-        proxy_layout.setSpacing(8)
-        
-        proxy_layout.addWidget(QLabel("自定义代理："), 0, 0)
-        self.custom_proxy = QLineEdit()
-        self.custom_proxy.setPlaceholderText("如 http://127.0.0.1:8888")
-        self.custom_proxy.setMinimumHeight(32)
-        proxy_layout.addWidget(self.custom_proxy, 0, 1, 1, 2)
-        
-        proxy_layout.addWidget(QLabel("不使用系统代理："), 1, 0)
-        self.no_system_proxy = QCheckBox()
-        self.no_system_proxy.setChecked(True)
-        proxy_layout.addWidget(self.no_system_proxy, 1, 1)
-        
-        proxy_group.setLayout(proxy_layout)
-        advanced_layout.addWidget(proxy_group)
-        
-        # 高级选项
-        advanced_options_group = QGroupBox("高级选项")
-        advanced_options_layout = QGridLayout()
-        advanced_options_layout.setSpacing(8)
-        
-        # 第一行
-        advanced_options_layout.addWidget(QLabel("日志级别："), 0, 0)
-        self.log_level = QComboBox()
-        self.log_level.addItems(["DEBUG", "INFO", "WARN", "ERROR", "OFF"])
-        self.log_level.setCurrentText("INFO")
-        self.log_level.setMinimumHeight(32)
-        advanced_options_layout.addWidget(self.log_level, 0, 1)
-        
-        advanced_options_layout.addWidget(QLabel("UI语言："), 0, 2)
-        self.ui_language = QComboBox()
-        self.ui_language.addItems(["en-US", "zh-CN", "zh-TW"])
-        self.ui_language.setCurrentText("zh-CN")
-        self.ui_language.setMinimumHeight(32)
-        advanced_options_layout.addWidget(self.ui_language, 0, 3)
-        
-        # 第二行
-        advanced_options_layout.addWidget(QLabel("强制ANSI控制台："), 1, 0)
-        self.force_ansi_console = QCheckBox()
-        advanced_options_layout.addWidget(self.force_ansi_console, 1, 1)
-        
-        advanced_options_layout.addWidget(QLabel("去除ANSI颜色："), 1, 2)
-        self.no_ansi_color = QCheckBox()
-        advanced_options_layout.addWidget(self.no_ansi_color, 1, 3)
-        
-        # 第三行
-        advanced_options_layout.addWidget(QLabel("使用ffmpeg concat分离器："), 2, 0)
-        self.use_ffmpeg_concat_demuxer = QCheckBox()
-        advanced_options_layout.addWidget(self.use_ffmpeg_concat_demuxer, 2, 1)
-        
-        advanced_options_layout.addWidget(QLabel("写入元数据json："), 2, 2)
-        self.write_meta_json = QCheckBox()
-        self.write_meta_json.setChecked(True)
-        advanced_options_layout.addWidget(self.write_meta_json, 2, 3)
-        
-        # 第四行
-        advanced_options_layout.addWidget(QLabel("追加URL参数："), 3, 0)
-        self.append_url_params = QCheckBox()
-        advanced_options_layout.addWidget(self.append_url_params, 3, 1)
-        
-        advanced_options_layout.addWidget(QLabel("允许HLS多EXT-MAP："), 3, 2)
-        self.allow_hls_multi_ext_map = QCheckBox()
-        advanced_options_layout.addWidget(self.allow_hls_multi_ext_map, 3, 3)
-        
-        # 第五行
-        advanced_options_layout.addWidget(QLabel("下载完成后不合并："), 4, 0)
-        self.no_merge = QCheckBox()
-        advanced_options_layout.addWidget(self.no_merge, 4, 1)
-        
-        advanced_options_layout.addWidget(QLabel("合并时不写入日期："), 4, 2)
-        self.no_date_in_name = QCheckBox()
-        self.no_date_in_name.setChecked(True)
-        advanced_options_layout.addWidget(self.no_date_in_name, 4, 3)
-        
-        # 第六行
-        advanced_options_layout.addWidget(QLabel("关闭日志文件输出："), 5, 0)
-        self.no_log = QCheckBox()
-        advanced_options_layout.addWidget(self.no_log, 5, 1)
-        
-        advanced_options_layout.addWidget(QLabel("禁用更新检查："), 5, 2)
-        self.disable_update_check = QCheckBox()
-        self.disable_update_check.setChecked(False)
-        advanced_options_layout.addWidget(self.disable_update_check, 5, 3)
-        
-        advanced_options_group.setLayout(advanced_options_layout)
-        advanced_layout.addWidget(advanced_options_group)
-        
-        advanced_layout.addStretch()
-        
-        # 将高级标签页添加到标签页容器
-        self.tab_widget.addTab(advanced_scroll, "高级设置")
-        
-        main_layout.addWidget(self.tab_widget, 1)
+        main_layout.addWidget(self.tab_widget, 1)
         
         # 进度条和命令显示区域
         bottom_controls_layout = QVBoxLayout()
@@ -917,6 +1057,10 @@ class M3U8Downloader(QMainWindow):
         progress_layout.addWidget(self.progress_bar, 1)
         bottom_controls_layout.addLayout(progress_layout)
         
+        # 各轨道进度
+        self.track_panel = TrackProgressPanel()
+        bottom_controls_layout.addWidget(self.track_panel)
+        
         # 命令显示和操作按钮
         command_layout = QVBoxLayout()
         
@@ -1028,12 +1172,32 @@ class M3U8Downloader(QMainWindow):
         log_group = QGroupBox("📝 运行日志")
         log_layout = QVBoxLayout()
         
-        self.log_edit = QTextEdit()
+        log_toolbar = QHBoxLayout()
+        log_toolbar.setSpacing(8)
+        self.log_search_edit = QLineEdit()
+        self.log_search_edit.setPlaceholderText("在完整日志（含已滚出界面的内容）中搜索")
+        self.log_search_edit.returnPressed.connect(self.search_log)
+        log_toolbar.addWidget(self.log_search_edit, 1)
+        
+        log_search_btn = QPushButton("🔍 搜索")
+        log_search_btn.clicked.connect(self.search_log)
+        log_toolbar.addWidget(log_search_btn)
+        
+        log_toolbar.addWidget(QLabel("显示行数："))
+        self.log_max_lines = self.create_option_widget("log_max_lines")
+        self.log_max_lines.setSingleStep(1000)
+        self.log_max_lines.valueChanged.connect(lambda value: self.log_edit.setMaximumBlockCount(value))
+        log_toolbar.addWidget(self.log_max_lines)
+        log_layout.addLayout(log_toolbar)
+        
+        # 固定行数的环形缓冲，超出的旧行自动丢弃
+        self.log_edit = QPlainTextEdit()
         self.log_edit.setReadOnly(True)
+        self.log_edit.setMaximumBlockCount(self.log_max_lines.value())
         self.log_edit.setMinimumHeight(120)
         self.log_edit.setMaximumHeight(180)
         self.log_edit.setStyleSheet("""
-            QTextEdit {
+            QPlainTextEdit {
                 background-color: #f8f8f8;
                 font-family: 'Consolas', 'Courier New', monospace;
                 font-size: 9pt;
@@ -1044,6 +1208,17 @@ class M3U8Downloader(QMainWindow):
         """)
         log_layout.addWidget(self.log_edit)
         
+        # 当前任务的最新进度行（不写入日志正文）
+        self.log_status_label = QLabel()
+        self.log_status_label.setStyleSheet("""
+            QLabel {
+                font-family: 'Consolas', 'Courier New', monospace;
+                font-size: 9pt;
+                color: #666666;
+            }
+        """)
+        log_layout.addWidget(self.log_status_label)
+        
         log_group.setLayout(log_layout)
         main_layout.addWidget(log_group)
         
@@ -1057,120 +1232,220 @@ class M3U8Downloader(QMainWindow):
         link_layout.addStretch()
         main_layout.addLayout(link_layout)
         
-        # 设置全局样式
-        self.setStyleSheet("""
-            QMainWindow {
-                background-color: #f5f5f5;
-            }
-            QGroupBox {
-                font-weight: bold;
-                border: 2px solid #cccccc;
-                border-radius: 8px;
-                margin-top: 12px;
-                padding-top: 10px;
-                background-color: white;
-                font-size: 10pt;
-            }
-            QGroupBox::title {
-                subcontrol-origin: margin;
-                left: 10px;
-                padding: 0 5px 0 5px;
-            }
-            QLabel {
-                color: #333333;
-                font-size: 10pt;
-            }
-            QLineEdit, QSpinBox, QComboBox {
-                border: 1px solid #cccccc;
-                border-radius: 4px;
-                padding: 5px 8px;
-                background-color: white;
-                selection-background-color: #ffb8c6;
-                font-size: 10pt;
-            }
-            QLineEdit:focus, QSpinBox:focus, QComboBox:focus {
-                border: 2px solid #999999;
-            }
-            QCheckBox {
-                spacing: 5px;
-                color: #333333;
-                font-size: 10pt;
-            }
-            QCheckBox::indicator {
-                width: 18px;
-                height: 18px;
-            }
-            QCheckBox::indicator:unchecked {
-                border: 1px solid #cccccc;
-                border-radius: 3px;
-                background-color: white;
-            }
-            QCheckBox::indicator:checked {
-                background-color: #ffb8c6;
-                border: 1px solid #ffa0b2;
-                border-radius: 3px;
-            }
-            QTabWidget::pane {
-                border: 1px solid #cccccc;
-                border-radius: 5px;
-                background-color: white;
-            }
-            QTabBar::tab {
-                background-color: #f0f0f0;
-                padding: 8px 16px;
-                margin-right: 2px;
-                border-top-left-radius: 5px;
-                border-top-right-radius: 5px;
-                color: #666666;
-                font-size: 10pt;
-            }
-            QTabBar::tab:selected {
-                background-color: white;
-                border-bottom: 2px solid #ffb8c6;
-                color: #333333;
-                font-weight: bold;
-            }
-            QTabBar::tab:hover {
-                background-color: #e8e8e8;
-            }
+        # 设置字体
+        self.setFont(QFont("Microsoft YaHei", 9))
+    
+    def build_advanced_tab(self):
+        """创建高级设置页的控件"""
+        advanced_tab = QWidget()
+        
+        advanced_layout = QVBoxLayout(advanced_tab)
+        advanced_layout.setSpacing(12)
+        
+        for group in ADVANCED_GROUPS:
+            group_box = self.build_option_group(group)
+            if group == "轨道选择设置":
+                track_picker_btn = QPushButton("从清单选择轨道...")
+                track_picker_btn.setToolTip("读取当前地址的清单，勾选轨道后自动填写选择/丢弃表达式")
+                track_picker_btn.clicked.connect(self.open_track_picker)
+                group_box.layout().addWidget(track_picker_btn, 4, 3, 1, 2)
+            advanced_layout.addWidget(group_box)
+        
+        advanced_layout.addStretch()
+        
+        self.option_widgets["live_take_count_enabled"].stateChanged.connect(self.toggle_live_take_count)
+        self.advanced_scroll.setWidget(advanced_tab)
+    
+    def ensure_advanced_tab(self):
+        """第一次显示高级设置页时创建控件，并填入已加载的设置"""
+        if self.advanced_built:
+            return
+        self.build_advanced_tab()
+        self.advanced_built = True
+        for key in list(self.pending_settings):
+            if key in self.option_widgets:
+                self.write_option(OPTION_MAP[key], self.pending_settings.pop(key))
+        self.toggle_live_take_count(self.option_widgets["live_take_count_enabled"].checkState())
+        # 服务已按设置启动，填入数值后再连接勾选框
+        self.option_widgets["metrics_export_enabled"].stateChanged.connect(self.toggle_metrics_export)
+        self.option_widgets["control_api_enabled"].stateChanged.connect(self.toggle_control_api)
+    
+    def create_option_widget(self, key):
+        """按声明表创建设置项的控件并登记"""
+        option = OPTION_MAP[key]
+        if option.widget == "int":
+            widget = QSpinBox()
+            widget.setRange(option.minimum, option.maximum)
+            widget.setValue(option.default)
+        elif option.widget in ("bool", "check"):
+            widget = QCheckBox(option.label if option.widget == "check" else "")
+            widget.setChecked(option.default)
+        elif option.widget == "choice":
+            widget = QComboBox()
+            widget.addItems(option.choices)
+            widget.setCurrentText(option.default)
+        else:
+            widget = QLineEdit(option.default)
+            if option.placeholder:
+                widget.setPlaceholderText(option.placeholder)
+            if option.widget == "password":
+                widget.setEchoMode(QLineEdit.Password)
+        if option.widget not in ("bool", "check"):
+            widget.setMinimumHeight(32)
+        if option.width:
+            widget.setMaximumWidth(option.width)
+        if option.tooltip:
+            widget.setToolTip(option.tooltip)
+        self.option_widgets[key] = widget
+        return widget
+    
+    def create_browse_button(self, option):
+        """文件/目录设置项后面的选择按钮"""
+        line_edit = self.option_widgets[option.key]
+        button = QPushButton("选择")
+        if option.widget == "dir":
+            button.clicked.connect(lambda: self.browse_directory(line_edit))
+        else:
+            button.clicked.connect(lambda: self.browse_file(line_edit, option.file_filter))
+        button.setMinimumWidth(70)
+        button.setMaximumWidth(70)
+        button.setStyleSheet("""
             QPushButton {
-                font-weight: bold;
-                border-radius: 5px;
-                padding: 6px 12px;
-                font-size: 10pt;
-            }
-            QScrollArea {
-                border: none;
-                background-color: white;
-            }
-            QScrollBar:vertical {
-                border: none;
-                background-color: #f0f0f0;
-                width: 12px;
-                border-radius: 6px;
-            }
-            QScrollBar::handle:vertical {
-                background-color: #cccccc;
-                border-radius: 6px;
-                min-height: 20px;
-            }
-            QScrollBar::handle:vertical:hover {
-                background-color: #aaaaaa;
-            }
-            QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {
-                border: none;
-                background: none;
+                font-size: 9pt;
+                padding: 4px 6px;
+                border-radius: 4px;
             }
         """)
-        
-        # 设置字体
-        self.setFont(QFont("Microsoft YaHei", 9))
+        return button
+    
+    def build_option_group(self, group):
+        """按声明表中的位置生成一个设置分组"""
+        group_box = QGroupBox(group)
+        layout = QGridLayout()
+        layout.setSpacing(8)
+        
+        cells = {}
+        for option in group_options(group):
+            cells.setdefault(option.position[:2], []).append(option)
+        for (row, column), options in cells.items():
+            first = options[0]
+            span = first.position[2] if len(first.position) > 2 else 1
+            if first.widget != "check":
+                layout.addWidget(QLabel(f"{first.label}："), row, column)
+                column += 1
+            widgets = [self.create_option_widget(option.key) for option in options]
+            if len(widgets) == 1:
+                layout.addWidget(widgets[0], row, column, 1, span)
+            else:
+                cell_layout = QHBoxLayout()
+                for widget in widgets:
+                    cell_layout.addWidget(widget)
+                layout.addLayout(cell_layout, row, column, 1, span)
+            if first.widget in ("file", "dir"):
+                layout.addWidget(self.create_browse_button(first), row, column + span)
+        
+        group_box.setLayout(layout)
+        return group_box
+    
+    def read_option(self, option):
+        widget = self.option_widgets[option.key]
+        if option.widget == "int":
+            return widget.value()
+        if option.widget in ("bool", "check"):
+            return widget.isChecked()
+        if option.widget == "choice":
+            return widget.currentText()
+        return widget.text()
+    
+    def write_option(self, option, value):
+        widget = self.option_widgets[option.key]
+        if option.widget == "int":
+            widget.setValue(int(value))
+        elif option.widget in ("bool", "check"):
+            widget.setChecked(bool(value))
+        elif option.widget == "choice":
+            widget.setCurrentText(str(value))
+        else:
+            widget.setText(str(value))
+    
+    def option_value(self, key):
+        """设置项的当前值：有控件时读取控件，否则取已加载的值"""
+        option = OPTION_MAP[key]
+        if key in self.option_widgets:
+            return self.read_option(option)
+        return self.pending_settings.get(key, option.default)
+    
+    def set_option_value(self, key, value):
+        if key in self.option_widgets:
+            self.write_option(OPTION_MAP[key], value)
+        else:
+            self.pending_settings[key] = value
+    
+    def on_tab_changed(self, index):
+        if index == self.advanced_tab_index:
+            self.ensure_advanced_tab()
     
     def clear_log(self):
         """清空日志"""
+        self.log_sink.flush()
         self.log_edit.clear()
         self.update_log.emit("日志已清空")
     
+    def search_log(self):
+        """在磁盘日志中搜索，结果在单独窗口中显示"""
+        keyword = self.log_search_edit.text().strip()
+        if not keyword:
+            return
+        if self.log_search_thread and self.log_search_thread.isRunning():
+            return
+        self.log_sink.flush()
+        self.log_spill.flush()
+        self.log_search_thread = LogSearchThread(self.log_spill.files(), keyword)
+        self.log_search_thread.results_ready.connect(
+            lambda results, truncated: self.show_log_search_results(keyword, results, truncated))
+        self.log_search_thread.start()
+    
+    def show_log_search_results(self, keyword, results, truncated):
+        dialog = QDialog(self)
+        title = f"日志搜索：{keyword}（{len(results)} 条"
+        title += "，仅显示前面部分）" if truncated else "）"
+        dialog.setWindowTitle(title)
+        dialog.resize(900, 500)
+        layout = QVBoxLayout(dialog)
+        view = QPlainTextEdit()
+        view.setReadOnly(True)
+        view.setLineWrapMode(QPlainTextEdit.NoWrap)
+        view.setPlainText("\n".join(results) if results else "没有匹配的日志")
+        layout.addWidget(view)
+        dialog.show()
+    
+    def open_track_picker(self):
+        """后台读取清单，完成后打开轨道选择窗口"""
+        if self.manifest_thread and self.manifest_thread.isRunning():
+            return
+        settings = self.get_current_settings()
+        if not settings.get("m3u8_url"):
+            QMessageBox.critical(self, "错误", "请输入M3U8地址！")
+            return
+        self.update_log.emit(f"正在读取清单：{settings['m3u8_url']}")
+        self.manifest_thread = ManifestThread(settings)
+        self.manifest_thread.manifest_ready.connect(self.show_track_picker)
+        self.manifest_thread.manifest_error.connect(
+            lambda message: QMessageBox.critical(self, "解析清单失败", message))
+        self.manifest_thread.start()
+    
+    def show_track_picker(self, manifest):
+        dialog = TrackPickerDialog(manifest, self)
+        if dialog.exec_() != QDialog.Accepted:
+            return
+        if not dialog.expressions:
+            self.update_log.emit("轨道选择与默认相同，未写入表达式")
+            return
+        for key, value in dialog.expressions.items():
+            self.set_option_value(key, value)
+        written = [f"{OPTION_MAP[key].label}：{value}" for key, value in dialog.expressions.items() if value]
+        self.update_log.emit("已写入轨道选择：" + ("；".join(written) or "全部清空"))
+    
     def generate_command(self):
         """生成命令但不执行"""
         try:
@@ -1182,209 +1457,11 @@ class M3U8Downloader(QMainWindow):
     
     def build_command(self):
         """构建命令行参数"""
-        cmd = [self.executable_edit.text()]
-        cmd.append(self.m3u8_url_edit.text())
-        
-        if self.title_edit.text():
-            cmd.extend(["--save-name", self.title_edit.text()])
-        
-        if self.work_dir_edit.text():
-            cmd.extend(["--save-dir", self.work_dir_edit.text()])
-        
-        if self.tmp_dir_edit.text():
-            cmd.extend(["--tmp-dir", self.tmp_dir_edit.text()])
-        
-        if self.save_pattern_edit.text():
-            cmd.extend(["--save-pattern", self.save_pattern_edit.text()])
-        
-        if self.log_file_path_edit.text():
-            cmd.extend(["--log-file-path", self.log_file_path_edit.text()])
-        
-        if self.ffmpeg_path_edit.text():
-            cmd.extend(["--ffmpeg-binary-path", self.ffmpeg_path_edit.text()])
-        
-        if self.headers_edit.text():
-            headers = self.headers_edit.text().strip()
-            if headers:
-                for header in headers.split(';'):
-                    header = header.strip()
-                    if header:
-                        cmd.extend(["-H", header])
-        
-        if self.baseurl_edit.text():
-            cmd.extend(["--base-url", self.baseurl_edit.text()])
-        
-        if self.mux_file_edit.text():
-            cmd.extend(["--mux-import", self.mux_file_edit.text()])
-        
-        if self.start_time_edit.text() != "00:00:00" or self.end_time_edit.text() != "00:00:00":
-            range_str = f"{self.start_time_edit.text()}-{self.end_time_edit.text()}"
-            cmd.extend(["--custom-range", range_str])
-        
-        # 基础选项
-        if self.del_after_merge.isChecked():
-            cmd.append("--del-after-done")
-        
-        if self.no_date_in_name.isChecked():
-            cmd.append("--no-date-info")
-        
-        if self.no_system_proxy.isChecked():
-            cmd.append("--use-system-proxy=false")
-        
-        if self.only_parse_m3u8.isChecked():
-            cmd.append("--skip-download")
-        
-        if self.mux_while_download.isChecked():
-            cmd.extend(["--live-real-time-merge", "--live-pipe-mux"])
-        
-        if self.no_merge.isChecked():
-            cmd.append("--skip-merge")
-        
-        if self.binary_merge.isChecked():
-            cmd.append("--binary-merge")
-        
-        if self.auto_select.isChecked():
-            cmd.append("--auto-select")
-        
-        if self.no_log.isChecked():
-            cmd.append("--no-log")
-        
-        if self.check_segments_count.isChecked():
-            cmd.append("--check-segments-count")
-        
-        if self.concurrent_download.isChecked():
-            cmd.append("--concurrent-download")
-        
-        if self.merge_to_mp4.isChecked():
-            cmd.extend(["-M", "format=mp4"])
-        
-        # 性能设置
-        cmd.extend(["--thread-count", str(self.max_threads.value())])
-        cmd.extend(["--download-retry-count", str(self.retry_count.value())])
-        cmd.extend(["--http-request-timeout", str(self.timeout.value())])
-        
-        if self.limit_speed.value() > 0:
-            cmd.extend(["--max-speed", f"{self.limit_speed.value()}K"])
-        
-        # 字幕设置
-        if self.sub_only.isChecked():
-            cmd.append("--sub-only")
-        
-        cmd.extend(["--sub-format", self.sub_format.currentText()])
-        
-        if not self.auto_subtitle_fix.isChecked():
-            cmd.append("--auto-subtitle-fix=false")
-        
-        if self.live_fix_vtt_by_audio.isChecked():
-            cmd.append("--live-fix-vtt-by-audio")
-        
-        # 代理设置
-        if self.custom_proxy.text():
-            cmd.extend(["--custom-proxy", self.custom_proxy.text()])
-        
-        # 高级设置
-        cmd.extend(["--log-level", self.log_level.currentText()])
-        cmd.extend(["--ui-language", self.ui_language.currentText()])
-        
-        if self.force_ansi_console.isChecked():
-            cmd.append("--force-ansi-console")
-        
-        if self.no_ansi_color.isChecked():
-            cmd.append("--no-ansi-color")
-        
-        if self.use_ffmpeg_concat_demuxer.isChecked():
-            cmd.append("--use-ffmpeg-concat-demuxer")
-        
-        if not self.write_meta_json.isChecked():
-            cmd.append("--write-meta-json=false")
-        
-        if self.append_url_params.isChecked():
-            cmd.append("--append-url-params")
-        
-        if self.allow_hls_multi_ext_map.isChecked():
-            cmd.append("--allow-hls-multi-ext-map")
-        
-        if self.disable_update_check.isChecked():
-            cmd.append("--disable-update-check")
-        
-        # 解密/加密设置
-        if self.key_edit.text():
-            cmd.extend(["--key", self.key_edit.text()])
-        
-        if self.key_text_file_edit.text():
-            cmd.extend(["--key-text-file", self.key_text_file_edit.text()])
-        
-        cmd.extend(["--decryption-engine", self.decryption_engine.currentText()])
-        
-        if self.decryption_binary_path.text():
-            cmd.extend(["--decryption-binary-path", self.decryption_binary_path.text()])
-        
-        if self.mp4_real_time_decryption.isChecked():
-            cmd.append("--mp4-real-time-decryption")
-        
-        if self.custom_hls_method.currentText() != "AES_128":
-            cmd.extend(["--custom-hls-method", self.custom_hls_method.currentText()])
-        
-        if self.custom_hls_key_edit.text():
-            cmd.extend(["--custom-hls-key", self.custom_hls_key_edit.text()])
-        
-        if self.custom_hls_iv_edit.text():
-            cmd.extend(["--custom-hls-iv", self.custom_hls_iv_edit.text()])
-        
-        # 直播设置
-        if self.live_record_limit_edit.text() != "HH:mm:ss":
-            cmd.extend(["--live-record-limit", self.live_record_limit_edit.text()])
-        
-        if self.live_wait_time_spin.value() != 3:
-            cmd.extend(["--live-wait-time", str(self.live_wait_time_spin.value())])
-        
-        if self.live_take_count_enabled.isChecked() and self.live_take_count_spin.value() != 16:
-            cmd.extend(["--live-take-count", str(self.live_take_count_spin.value())])
-        
-        if self.live_perform_as_vod.isChecked():
-            cmd.append("--live-perform-as-vod")
-        
-        if not self.live_keep_segments.isChecked():
-            cmd.append("--live-keep-segments=false")
-        
-        if self.task_start_at_edit.text() != "yyyyMMddHHmmss":
-            cmd.extend(["--task-start-at", self.task_start_at_edit.text()])
-        
-        # 轨道选择设置
-        if self.select_video_edit.text():
-            cmd.extend(["--select-video", self.select_video_edit.text()])
-        
-        if self.select_audio_edit.text():
-            cmd.extend(["--select-audio", self.select_audio_edit.text()])
-        
-        if self.select_subtitle_edit.text():
-            cmd.extend(["--select-subtitle", self.select_subtitle_edit.text()])
-        
-        if self.drop_video_edit.text():
-            cmd.extend(["--drop-video", self.drop_video_edit.text()])
-        
-        if self.drop_audio_edit.text():
-            cmd.extend(["--drop-audio", self.drop_audio_edit.text()])
-        
-        if self.drop_subtitle_edit.text():
-            cmd.extend(["--drop-subtitle", self.drop_subtitle_edit.text()])
-        
-        if self.ad_keyword_edit.text():
-            cmd.extend(["--ad-keyword", self.ad_keyword_edit.text()])
-        
-        if self.urlprocessor_args_edit.text():
-            cmd.extend(["--urlprocessor-args", self.urlprocessor_args_edit.text()])
-        
-        # 自定义参数
-        if self.args_edit.text():
-            custom_args = self.args_edit.text().split()
-            cmd.extend(custom_args)
-        
-        return cmd
+        return build_command_from_settings(self.get_current_settings())
     
     def toggle_live_take_count(self, state):
         """切换首次分片数量启用状态"""
-        self.live_take_count_spin.setEnabled(state == Qt.Checked)
+        self.option_widgets["live_take_count"].setEnabled(state == Qt.Checked)
     
     def browse_directory(self, line_edit):
         """通用目录选择函数"""
@@ -1418,50 +1495,6 @@ class M3U8Downloader(QMainWindow):
         
         self.show()
     
-    def browse_executable(self):
-        filename, _ = QFileDialog.getOpenFileName(
-            self, "选择执行程序", 
-            os.path.dirname(self.executable_edit.text()) or os.getcwd(), 
-            "可执行文件 (*.exe);;所有文件 (*.*)"
-        )
-        if filename:
-            self.executable_edit.setText(filename)
-    
-    def browse_work_dir(self):
-        dirname = QFileDialog.getExistingDirectory(
-            self, "选择工作目录", 
-            self.work_dir_edit.text() or os.getcwd()
-        )
-        if dirname:
-            self.work_dir_edit.setText(dirname)
-    
-    def browse_ffmpeg_path(self):
-        filename, _ = QFileDialog.getOpenFileName(
-            self, "选择FFmpeg可执行文件", 
-            os.path.dirname(self.ffmpeg_path_edit.text()) or os.getcwd(), 
-            "可执行文件 (*.exe);;所有文件 (*.*)"
-        )
-        if filename:
-            self.ffmpeg_path_edit.setText(filename)
-    
-    def browse_mux_file(self):
-        filename, _ = QFileDialog.getOpenFileName(
-            self, "选择混流文件", 
-            os.path.dirname(self.mux_file_edit.text()) or os.getcwd(), 
-            "所有文件 (*.*)"
-        )
-        if filename:
-            self.mux_file_edit.setText(filename)
-    
-    def browse_decryption_binary(self):
-        filename, _ = QFileDialog.getOpenFileName(
-            self, "选择解密工具", 
-            os.path.dirname(self.decryption_binary_path.text()) or os.getcwd(), 
-            "可执行文件 (*.exe);;所有文件 (*.*)"
-        )
-        if filename:
-            self.decryption_binary_path.setText(filename)
-    
     def save_settings(self):
         """保存所有设置到JSON文件"""
         settings = self.get_current_settings()
@@ -1474,90 +1507,89 @@ class M3U8Downloader(QMainWindow):
         
         if filename:
             try:
-                with open(filename, 'w', encoding='utf-8') as f:
-                    json.dump(settings, f, ensure_ascii=False, indent=4)
+                save_settings_file(filename, settings)
                 # 同时保存到默认位置
-                default_path = os.path.join(os.path.expanduser("~"), "m3u8_downloader_last_settings.json")
-                with open(default_path, 'w', encoding='utf-8') as f:
-                    json.dump(settings, f, ensure_ascii=False, indent=4)
+                self.settings_store.save(settings)
                 self.update_log.emit(f"设置已保存到：{filename}")
                 QMessageBox.information(self, "保存成功", "所有设置已成功保存到JSON文件！")
             except Exception as e:
                 self.update_log.emit(f"保存设置时出错：{str(e)}")
                 QMessageBox.critical(self, "保存失败", f"保存设置时出错：{str(e)}")
     
+    def refresh_profile_combo(self):
+        self.profile_combo.blockSignals(True)
+        self.profile_combo.clear()
+        self.profile_combo.addItem("（未使用配置）")
+        try:
+            self.profile_combo.addItems(self.profile_store.names())
+        except Exception as e:
+            self.update_log.emit(f"读取配置列表时出错：{str(e)}")
+        if self.current_profile:
+            self.profile_combo.setCurrentText(self.current_profile)
+        self.profile_combo.blockSignals(False)
+    
+    def switch_profile(self, index):
+        """切换到命名配置，只修改与当前界面不同的设置项"""
+        if index <= 0:
+            self.current_profile = None
+            return
+        name = self.profile_combo.itemText(index)
+        try:
+            settings = self.profile_store.resolve(name)
+        except Exception as e:
+            self.update_log.emit(f"读取配置时出错：{str(e)}")
+            self.refresh_profile_combo()
+            return
+        changed = [key for key in diff_settings(self.get_current_settings(), settings)
+                   if key not in PROFILE_EXCLUDED_KEYS]
+        for key in changed:
+            self.set_option_value(key, settings[key])
+        if self.advanced_built:
+            self.toggle_live_take_count(self.option_widgets["live_take_count_enabled"].checkState())
+        else:
+            self.sync_export_services()
+        self.current_profile = name
+        self.update_log.emit(f"已切换到配置：{name}（修改 {len(changed)} 项）")
+    
+    def save_profile_as(self):
+        """把当前设置保存为命名配置，可继承另一个配置"""
+        name, ok = QInputDialog.getText(self, "另存为配置", "配置名称：", text=self.current_profile or "")
+        name = name.strip()
+        if not ok or not name:
+            return
+        try:
+            bases = ["（不继承）"] + [other for other in self.profile_store.names() if other != name]
+            base, ok = QInputDialog.getItem(self, "另存为配置", "继承自：", bases, 0, False)
+            if not ok:
+                return
+            overrides = self.profile_store.save(name, self.get_current_settings(), None if base == bases[0] else base)
+        except Exception as e:
+            QMessageBox.critical(self, "保存失败", f"保存配置时出错：{str(e)}")
+            return
+        self.current_profile = name
+        self.refresh_profile_combo()
+        self.update_log.emit(f"配置已保存：{name}（{len(overrides)} 项与基础设置不同）")
+    
+    def delete_profile(self):
+        name = self.current_profile
+        if not name:
+            return
+        if QMessageBox.question(self, "删除配置", f"确定删除配置 {name} 吗？") != QMessageBox.Yes:
+            return
+        try:
+            self.profile_store.delete(name)
+        except Exception as e:
+            QMessageBox.critical(self, "删除失败", str(e))
+            return
+        self.current_profile = None
+        self.refresh_profile_combo()
+        self.update_log.emit(f"配置已删除：{name}")
+    
     def get_current_settings(self):
         """获取当前所有设置"""
-        return {
-            "executable": self.executable_edit.text(),
-            "work_dir": self.work_dir_edit.text(),
-            "ffmpeg_path": self.ffmpeg_path_edit.text(),
-            "m3u8_url": self.m3u8_url_edit.text(),
-            "title": self.title_edit.text(),
-            "headers": self.headers_edit.text(),
-            "baseurl": self.baseurl_edit.text(),
-            "mux_file": self.mux_file_edit.text(),
-            "start_time": self.start_time_edit.text(),
-            "end_time": self.end_time_edit.text(),
-            "max_threads": self.max_threads.value(),
-            "retry_count": self.retry_count.value(),
-            "timeout": self.timeout.value(),
-            "limit_speed": self.limit_speed.value(),
-            "del_after_merge": self.del_after_merge.isChecked(),
-            "only_parse_m3u8": self.only_parse_m3u8.isChecked(),
-            "mux_while_download": self.mux_while_download.isChecked(),
-            "binary_merge": self.binary_merge.isChecked(),
-            "auto_select": self.auto_select.isChecked(),
-            "check_segments_count": self.check_segments_count.isChecked(),
-            "concurrent_download": self.concurrent_download.isChecked(),
-            "merge_to_mp4": self.merge_to_mp4.isChecked(),
-            "args": self.args_edit.text(),
-            "key": self.key_edit.text(),
-            "tmp_dir": self.tmp_dir_edit.text(),
-            "save_pattern": self.save_pattern_edit.text(),
-            "log_file_path": self.log_file_path_edit.text(),
-            "key_text_file": self.key_text_file_edit.text(),
-            "live_record_limit": self.live_record_limit_edit.text(),
-            "live_wait_time": self.live_wait_time_spin.value(),
-            "live_take_count_enabled": self.live_take_count_enabled.isChecked(),
-            "live_take_count": self.live_take_count_spin.value(),
-            "live_perform_as_vod": self.live_perform_as_vod.isChecked(),
-            "live_keep_segments": self.live_keep_segments.isChecked(),
-            "task_start_at": self.task_start_at_edit.text(),
-            "select_video": self.select_video_edit.text(),
-            "select_audio": self.select_audio_edit.text(),
-            "select_subtitle": self.select_subtitle_edit.text(),
-            "drop_video": self.drop_video_edit.text(),
-            "drop_audio": self.drop_audio_edit.text(),
-            "drop_subtitle": self.drop_subtitle_edit.text(),
-            "ad_keyword": self.ad_keyword_edit.text(),
-            "urlprocessor_args": self.urlprocessor_args_edit.text(),
-            "decryption_engine": self.decryption_engine.currentText(),
-            "decryption_binary_path": self.decryption_binary_path.text(),
-            "mp4_real_time_decryption": self.mp4_real_time_decryption.isChecked(),
-            "custom_hls_method": self.custom_hls_method.currentText(),
-            "custom_hls_key": self.custom_hls_key_edit.text(),
-            "custom_hls_iv": self.custom_hls_iv_edit.text(),
-            "sub_only": self.sub_only.isChecked(),
-            "sub_format": self.sub_format.currentText(),
-            "auto_subtitle_fix": self.auto_subtitle_fix.isChecked(),
-            "live_fix_vtt_by_audio": self.live_fix_vtt_by_audio.isChecked(),
-            "custom_proxy": self.custom_proxy.text(),
-            "no_system_proxy": self.no_system_proxy.isChecked(),
-            "log_level": self.log_level.currentText(),
-            "ui_language": self.ui_language.currentText(),
-            "force_ansi_console": self.force_ansi_console.isChecked(),
-            "no_ansi_color": self.no_ansi_color.isChecked(),
-            "use_ffmpeg_concat_demuxer": self.use_ffmpeg_concat_demuxer.isChecked(),
-            "write_meta_json": self.write_meta_json.isChecked(),
-            "append_url_params": self.append_url_params.isChecked(),
-            "allow_hls_multi_ext_map": self.allow_hls_multi_ext_map.isChecked(),
-            "no_merge": self.no_merge.isChecked(),
-            "no_date_in_name": self.no_date_in_name.isChecked(),
-            "no_log": self.no_log.isChecked(),
-            "disable_update_check": self.disable_update_check.isChecked(),
-            "always_on_top": self.is_always_on_top
-        }
+        settings = {option.key: self.option_value(option.key) for option in OPTIONS}
+        settings["always_on_top"] = self.is_always_on_top
+        return settings
     
     def load_settings(self):
         """从JSON文件加载设置"""
@@ -1573,8 +1605,7 @@ class M3U8Downloader(QMainWindow):
     def load_settings_from_file(self, filename):
         """从指定文件加载设置"""
         try:
-            with open(filename, 'r', encoding='utf-8') as f:
-                settings = json.load(f)
+            settings = load_settings_file(filename)
             
             self.apply_settings(settings)
             self.update_log.emit(f"设置已从 {filename} 加载")
@@ -1584,197 +1615,602 @@ class M3U8Downloader(QMainWindow):
             QMessageBox.critical(self, "加载失败", f"加载设置时出错：{str(e)}")
     
     def apply_settings(self, settings):
-        """应用设置到界面"""
-        # 路径设置
-        self.executable_edit.setText(settings.get("executable", ""))
-        self.work_dir_edit.setText(settings.get("work_dir", ""))
-        self.ffmpeg_path_edit.setText(settings.get("ffmpeg_path", ""))
-        
-        # 下载设置
-        self.m3u8_url_edit.setText(settings.get("m3u8_url", ""))
-        self.title_edit.setText(settings.get("title", ""))
-        self.headers_edit.setText(settings.get("headers", ""))
-        self.baseurl_edit.setText(settings.get("baseurl", ""))
-        self.mux_file_edit.setText(settings.get("mux_file", ""))
-        
-        # 范围选择
-        self.start_time_edit.setText(settings.get("start_time", "00:00:00"))
-        self.end_time_edit.setText(settings.get("end_time", "00:00:00"))
-        
-        # 性能设置
-        self.max_threads.setValue(settings.get("max_threads", 32))
-        self.retry_count.setValue(settings.get("retry_count", 15))
-        self.timeout.setValue(settings.get("timeout", 100))
-        self.limit_speed.setValue(settings.get("limit_speed", 0))
-        
-        # 基础选项
-        self.del_after_merge.setChecked(settings.get("del_after_merge", True))
-        self.only_parse_m3u8.setChecked(settings.get("only_parse_m3u8", False))
-        self.mux_while_download.setChecked(settings.get("mux_while_download", False))
-        self.binary_merge.setChecked(settings.get("binary_merge", False))
-        self.auto_select.setChecked(settings.get("auto_select", True))
-        self.check_segments_count.setChecked(settings.get("check_segments_count", True))
-        self.concurrent_download.setChecked(settings.get("concurrent_download", True))
-        self.merge_to_mp4.setChecked(settings.get("merge_to_mp4", True))
-        
-        # 高级参数
-        self.args_edit.setText(settings.get("args", ""))
-        self.key_edit.setText(settings.get("key", ""))
-        
-        # 输出设置
-        self.tmp_dir_edit.setText(settings.get("tmp_dir", ""))
-        self.save_pattern_edit.setText(settings.get("save_pattern", ""))
-        self.log_file_path_edit.setText(settings.get("log_file_path", ""))
-        self.key_text_file_edit.setText(settings.get("key_text_file", ""))
-        
-        # 直播设置
-        self.live_record_limit_edit.setText(settings.get("live_record_limit", "HH:mm:ss"))
-        self.live_wait_time_spin.setValue(settings.get("live_wait_time", 3))
-        self.live_take_count_enabled.setChecked(settings.get("live_take_count_enabled", True))
-        self.live_take_count_spin.setValue(settings.get("live_take_count", 16))
-        self.live_perform_as_vod.setChecked(settings.get("live_perform_as_vod", False))
-        self.live_keep_segments.setChecked(settings.get("live_keep_segments", True))
-        self.task_start_at_edit.setText(settings.get("task_start_at", "yyyyMMddHHmmss"))
-        
-        # 轨道选择设置
-        self.select_video_edit.setText(settings.get("select_video", ""))
-        self.select_audio_edit.setText(settings.get("select_audio", ""))
-        self.select_subtitle_edit.setText(settings.get("select_subtitle", ""))
-        self.drop_video_edit.setText(settings.get("drop_video", ""))
-        self.drop_audio_edit.setText(settings.get("drop_audio", ""))
-        self.drop_subtitle_edit.setText(settings.get("drop_subtitle", ""))
-        self.ad_keyword_edit.setText(settings.get("ad_keyword", ""))
-        self.urlprocessor_args_edit.setText(settings.get("urlprocessor_args", ""))
-        
-        # 解密/加密设置
-        self.decryption_engine.setCurrentText(settings.get("decryption_engine", "MP4DECRYPT"))
-        self.decryption_binary_path.setText(settings.get("decryption_binary_path", ""))
-        self.mp4_real_time_decryption.setChecked(settings.get("mp4_real_time_decryption", False))
-        self.custom_hls_method.setCurrentText(settings.get("custom_hls_method", "AES_128"))
-        self.custom_hls_key_edit.setText(settings.get("custom_hls_key", ""))
-        self.custom_hls_iv_edit.setText(settings.get("custom_hls_iv", ""))
-        
-        # 字幕设置
-        self.sub_only.setChecked(settings.get("sub_only", False))
-        self.sub_format.setCurrentText(settings.get("sub_format", "SRT"))
-        self.auto_subtitle_fix.setChecked(settings.get("auto_subtitle_fix", True))
-        self.live_fix_vtt_by_audio.setChecked(settings.get("live_fix_vtt_by_audio", False))
-        
-        # 代理设置
-        self.custom_proxy.setText(settings.get("custom_proxy", ""))
-        self.no_system_proxy.setChecked(settings.get("no_system_proxy", True))
-        
-        # 高级选项
-        self.log_level.setCurrentText(settings.get("log_level", "INFO"))
-        self.ui_language.setCurrentText(settings.get("ui_language", "zh-CN"))
-        self.force_ansi_console.setChecked(settings.get("force_ansi_console", False))
-        self.no_ansi_color.setChecked(settings.get("no_ansi_color", False))
-        self.use_ffmpeg_concat_demuxer.setChecked(settings.get("use_ffmpeg_concat_demuxer", False))
-        self.write_meta_json.setChecked(settings.get("write_meta_json", True))
-        self.append_url_params.setChecked(settings.get("append_url_params", False))
-        self.allow_hls_multi_ext_map.setChecked(settings.get("allow_hls_multi_ext_map", False))
-        self.no_merge.setChecked(settings.get("no_merge", False))
-        self.no_date_in_name.setChecked(settings.get("no_date_in_name", True))
-        self.no_log.setChecked(settings.get("no_log", False))
-        self.disable_update_check.setChecked(settings.get("disable_update_check", False))
+        """应用设置到界面（尚未创建的控件先保存设置值）"""
+        for option in OPTIONS:
+            self.set_option_value(option.key, settings.get(option.key, option.default))
+        
+        if self.advanced_built:
+            self.toggle_live_take_count(self.option_widgets["live_take_count_enabled"].checkState())
+        else:
+            self.sync_export_services()
         
         # 窗口设置
         is_always_on_top = settings.get("always_on_top", False)
         if is_always_on_top:
             self.toggle_pin_window()
-        
-        self.toggle_live_take_count(Qt.Checked if self.live_take_count_enabled.isChecked() else Qt.Unchecked)
+    
+    def sync_export_services(self):
+        """高级设置页尚未创建时，按设置启动或关闭指标接口和控制接口"""
+        enabled = self.option_value("metrics_export_enabled")
+        if enabled != (self.metrics_exporter is not None):
+            self.toggle_metrics_export(Qt.Checked if enabled else Qt.Unchecked)
+        enabled = self.option_value("control_api_enabled")
+        if enabled != (self.control_server is not None):
+            self.toggle_control_api(Qt.Checked if enabled else Qt.Unchecked)
     
     def load_last_settings(self):
         """加载上次的设置"""
         try:
-            default_path = os.path.join(os.path.expanduser("~"), "m3u8_downloader_last_settings.json")
-            if os.path.exists(default_path):
-                with open(default_path, 'r', encoding='utf-8') as f:
-                    settings = json.load(f)
+            if self.settings_store.exists():
+                settings = self.settings_store.load()
                 self.apply_settings(settings)
                 self.update_log.emit("已加载上次的设置")
         except Exception as e:
-            pass  # 静默失败
+            self.update_log.emit(f"加载上次的设置时出错，已使用默认设置：{str(e)}")
     
     def start_download(self):
-        """开始下载"""
+        """开始下载（加入队列，有空闲名额时立即开始）"""
+        if self.enqueue_current():
+            self.log_edit.clear()
+            self.progress_bar.setValue(0)
+    
+    def enqueue_current(self):
+        """把当前设置快照加入下载队列"""
         # 检查必要参数
-        if not os.path.exists(self.executable_edit.text()):
+        if not os.path.exists(self.option_value("executable")):
             QMessageBox.critical(self, "错误", "执行程序不存在！")
-            return
+            return None
         
-        if not self.m3u8_url_edit.text():
+        if not self.option_value("m3u8_url"):
             QMessageBox.critical(self, "错误", "请输入M3U8地址！")
-            return
-        
-        # 禁用GO按钮，启用停止按钮
-        self.go_btn.setEnabled(False)
-        self.stop_btn.setEnabled(True)
-        
-        # 清空日志和进度条
-        self.log_edit.clear()
-        self.progress_bar.setValue(0)
+            return None
         
-        # 构建命令
+        settings = self.get_current_settings()
+        if self.option_value("preflight_check"):
+            # 预估完成后再加入队列
+            self.start_estimate(settings, enqueue=True)
+            return None
+        return self.add_current_job(settings)
+    
+    def add_current_job(self, settings, estimated_bytes=None):
         try:
-            cmd = self.build_command()
-            work_dir = self.work_dir_edit.text() if self.work_dir_edit.text() else os.path.dirname(self.executable_edit.text())
-            
-            # 创建下载线程
-            self.download_thread = DownloadThread(cmd, work_dir)
-            self.download_thread.update_progress.connect(self.on_update_progress)
-            self.download_thread.update_log.connect(self.on_update_log)
-            self.download_thread.download_complete.connect(self.on_download_complete)
-            self.download_thread.command_ready.connect(self.command_edit.setText)
-            
-            self.download_thread.start()
-            
+            if self.current_profile:
+                # 任务引用配置名，只保存与配置不同的设置项
+                profile_settings = self.profile_store.resolve(self.current_profile)
+                overrides = {key: settings[key] for key in diff_settings(profile_settings, settings)}
+                job = self.scheduler.add_profile_job(self.current_profile, overrides, estimated_bytes)
+            else:
+                job = self.scheduler.add_job(settings, build_command_from_settings(settings),
+                                             resolve_work_dir(settings), estimated_bytes=estimated_bytes)
+            self.update_log.emit(f"[#{job.job_id}] 已加入队列：{job.title}")
+            return job
         except Exception as e:
             self.update_log.emit(f"启动下载时出错：{str(e)}")
-            self.go_btn.setEnabled(True)
-            self.stop_btn.setEnabled(False)
+            return None
+    
+    def start_estimate(self, settings, enqueue=False):
+        """后台预估大小和耗时；enqueue 为真时空间足够才加入队列"""
+        if self.estimate_thread and self.estimate_thread.isRunning():
+            QMessageBox.warning(self, "提示", "上一次预估尚未完成！")
+            return
+        if not settings.get("m3u8_url"):
+            QMessageBox.critical(self, "错误", "请输入M3U8地址！")
+            return
+        self.update_log.emit(f"正在预估：{settings['m3u8_url']}")
+        self.estimate_thread = EstimateThread(settings, self.scheduler.throughput)
+        self.estimate_thread.estimate_ready.connect(
+            lambda estimate, problems: self.on_estimate_ready(settings, estimate, problems, enqueue))
+        self.estimate_thread.estimate_error.connect(
+            lambda message: self.on_estimate_error(settings, message, enqueue))
+        self.estimate_thread.start()
+    
+    def on_estimate_ready(self, settings, estimate, problems, enqueue):
+        from miix.estimate import format_estimate
+        for line in format_estimate(estimate):
+            self.update_log.emit(f"预估：{line}")
+        if problems:
+            QMessageBox.critical(self, "磁盘空间不足",
+                                 ("未加入队列：\n" if enqueue else "") + "\n".join(problems))
+            return
+        if enqueue:
+            self.add_current_job(settings, estimate.total_bytes)
+    
+    def on_estimate_error(self, settings, message, enqueue):
+        self.update_log.emit(f"预估失败：{message}")
+        if enqueue:
+            # 无法读取清单时不阻止下载，交给 N_m3u8DL-RE 处理
+            self.add_current_job(settings)
+    
+    def import_url_file(self):
+        filename, _ = QFileDialog.getOpenFileName(
+            self, "批量导入地址列表", 
+            os.getcwd(), 
+            "地址列表 (*.txt *.csv *.json *.jsonl);;所有文件 (*.*)"
+        )
+        if filename:
+            self.start_import(filename=filename)
+    
+    def import_url_text(self):
+        text, ok = QInputDialog.getMultiLineText(
+            self, "粘贴导入",
+            "每行一个地址（可跟空格和标题），也可粘贴CSV或JSON："
+        )
+        if ok and text.strip():
+            self.start_import(text=text)
+    
+    def start_import(self, filename=None, text=None):
+        """以当前设置为模板开始批量导入"""
+        if self.import_thread and self.import_thread.isRunning():
+            QMessageBox.warning(self, "提示", "上一次导入尚未完成！")
+            return
+        if not os.path.exists(self.option_value("executable")):
+            QMessageBox.critical(self, "错误", "执行程序不存在！")
+            return
+        self.import_template = self.get_current_settings()
+        self.import_seen = {job.settings.get("m3u8_url") for job in self.scheduler.jobs.values()}
+        self.import_added = 0
+        self.import_thread = BatchImportThread(filename=filename, text=text)
+        self.import_thread.rows_ready.connect(self.on_import_rows)
+        self.import_thread.import_error.connect(self.update_log.emit)
+        self.import_thread.import_finished.connect(self.on_import_finished)
+        self.update_log.emit(f"开始导入：{filename or '粘贴内容'}")
+        self.import_thread.start()
+    
+    def on_import_rows(self, rows):
+        from miix.batch import merge_import_row
+        self.job_table.setUpdatesEnabled(False)
+        try:
+            for row in rows:
+                url = row["m3u8_url"]
+                if url in self.import_seen:
+                    continue
+                self.import_seen.add(url)
+                row = dict(row)
+                profile = row.pop("profile", None)
+                if profile:
+                    # 导入行指定了配置时引用该配置
+                    try:
+                        self.scheduler.add_profile_job(profile, row)
+                    except Exception as e:
+                        self.update_log.emit(f"导入 {url} 时出错：{str(e)}")
+                        continue
+                else:
+                    settings = merge_import_row(self.import_template, row)
+                    self.scheduler.add_job(settings, build_command_from_settings(settings), resolve_work_dir(settings))
+                self.import_added += 1
+        finally:
+            self.job_table.setUpdatesEnabled(True)
+    
+    def on_import_finished(self, count):
+        skipped = count - self.import_added
+        self.update_log.emit(f"导入完成：共 {count} 条，加入队列 {self.import_added} 条，跳过重复 {skipped} 条")
     
     def stop_download(self):
-        """停止下载"""
-        if self.download_thread:
+        """停止所有下载"""
+        if self.scheduler.has_active_jobs():
             self.update_log.emit("正在停止下载...")
-            self.download_thread.stop()
+            self.scheduler.stop_all()
+    
+    def update_budget(self):
+        self.scheduler.set_budget(self.global_thread_budget.value(), self.global_speed_budget.value())
+    
+    def selected_job_ids(self):
+        rows = sorted({index.row() for index in self.job_table.selectionModel().selectedRows()})
+        return [self.job_table.item(row, COL_ID).data(Qt.UserRole) for row in rows]
+    
+    def apply_to_selected_jobs(self, action):
+        for job_id in self.selected_job_ids():
+            action(job_id)
+    
+    def find_job_row(self, job_id):
+        item = self.job_items.get(job_id)
+        return item.row() if item is not None else -1
+    
+    def create_download_thread(self, job, cmd):
+        """调度器的运行器工厂：子进程交给监督器的事件循环线程管理"""
+        return self.supervisor.runner(job.job_id, cmd, job.work_dir)
+    
+    def on_supervisor_batch(self, batch):
+        for event in batch:
+            if event[0] == "log":
+                # 输出行直接写入日志缓冲区，由缓冲区批量刷新到界面
+                self.log_sink.push(event[1], event[2])
+            else:
+                self.scheduler.dispatch(event)
+    
+    def on_job_added(self, job_id):
+        row = self.job_table.rowCount()
+        self.job_table.insertRow(row)
+        id_item = QTableWidgetItem(str(job_id))
+        id_item.setData(Qt.UserRole, job_id)
+        self.job_table.setItem(row, COL_ID, id_item)
+        self.job_items[job_id] = id_item
+        for column in range(1, len(JOB_COLUMNS)):
+            self.job_table.setItem(row, column, QTableWidgetItem(""))
+        self.on_job_updated(job_id)
+    
+    def on_job_removed(self, job_id):
+        row = self.find_job_row(job_id)
+        if row >= 0:
+            self.job_table.removeRow(row)
+        self.job_items.pop(job_id, None)
+        self.metrics.remove(job_id)
+        if self.current_job_id == job_id:
+            self.current_job_id = None
+            self.refresh_progress_label()
+    
+    def on_job_updated(self, job_id):
+        job = self.scheduler.jobs.get(job_id)
+        row = self.find_job_row(job_id)
+        if not job or row < 0:
+            return
+        self.job_table.item(row, COL_TITLE).setText(job.title)
+        self.job_table.item(row, COL_STATUS).setText(
+            f"{job.status}（{job.failure}）" if job.status in (DownloadJob.FAILED, DownloadJob.RETRY_WAIT) else job.status)
+        self.job_table.item(row, COL_PROGRESS).setText(f"{job.progress}%")
+        self.update_job_speed_cells(row, job)
+        if job.allocation:
+            threads, speed = job.allocation
+            self.job_table.item(row, COL_ALLOCATION).setText(f"{threads} / {f'{speed}K' if speed else '不限'}")
+        self.job_table.item(row, COL_EXIT_CODE).setText("" if job.exit_code is None else str(job.exit_code))
+        if job.resource_summary and not job.is_active():
+            summary = job.resource_summary
+            self.job_table.item(row, COL_RESOURCES).setText(
+                f"平均 {summary['cpu_avg']:.0f}% / 峰值 {format_size(summary['rss_peak'])}")
+        if job.is_active() and self.current_job_id is None:
+            self.current_job_id = job_id
+            self.refresh_progress_label()
+        self.stop_btn.setEnabled(self.scheduler.has_active_jobs())
+    
+    def on_job_selection_changed(self):
+        job_ids = self.selected_job_ids()
+        if job_ids:
+            self.current_job_id = job_ids[0]
+            job = self.scheduler.jobs.get(self.current_job_id)
+            if job:
+                self.progress_bar.setValue(job.progress)
+            self.refresh_progress_label()
+    
+    def on_job_log(self, job_id, text):
+        self.log_sink.push(job_id, text)
+    
+    def format_log_line(self, job_id, text):
+        if job_id is not None and len(self.scheduler.jobs) > 1:
+            return f"[#{job_id}] {text}"
+        return text
+    
+    def on_log_lines(self, lines):
+        lines = [self.format_log_line(job_id, text) for job_id, text in lines]
+        self.log_spill.write(lines)
+        self.log_edit.appendPlainText("\n".join(lines))
+        self.log_edit.verticalScrollBar().setValue(self.log_edit.verticalScrollBar().maximum())
+    
+    def on_progress_lines(self, progress):
+        for job_id, tracks in progress.items():
+            self.latest_progress_lines.setdefault(job_id, {}).update(tracks)
+        self.refresh_progress_label()
+    
+    def refresh_progress_label(self):
+        lines = self.latest_progress_lines.get(self.current_job_id)
+        self.log_status_label.setText("\n".join(lines.values()) if lines else "")
+        job = self.scheduler.jobs.get(self.current_job_id)
+        self.track_panel.clear()
+        if job:
+            self.track_panel.update_tracks(job.tracks.values())
+    
+    def on_job_progress(self, job_id, value):
+        row = self.find_job_row(job_id)
+        if row >= 0:
+            self.job_table.item(row, COL_PROGRESS).setText(f"{value}%")
+        if self.current_job_id == job_id:
+            self.update_progress.emit(value)
+    
+    def on_job_progress_record(self, job_id, record):
+        job = self.scheduler.jobs.get(job_id)
+        row = self.find_job_row(job_id)
+        if job and row >= 0:
+            self.update_job_speed_cells(row, job)
+        if job and job_id == self.current_job_id:
+            self.track_panel.update_tracks(job.tracks.values())
+    
+    def update_job_speed_cells(self, row, job):
+        if job.is_active():
+            speed = job.speed
+            self.job_table.item(row, COL_SPEED).setText("-" if speed is None else f"{format_size(speed)}/s")
+            self.job_table.item(row, COL_ETA).setText(format_duration(job.eta))
+        else:
+            self.job_table.item(row, COL_SPEED).setText("")
+            self.job_table.item(row, COL_ETA).setText("")
+    
+    def sample_metrics(self):
+        """每秒为正在运行的任务采样一次，并刷新速度监控"""
+        now = time.monotonic()
+        for job in self.scheduler.running_jobs():
+            metrics = self.metrics.get(job.job_id, job.settings.get("m3u8_url", ""))
+            metrics.sample(now, job.tracks.values(), job.retries)
+            usage = job.runner.resources.current() if job.runner else None
+            row = self.find_job_row(job.job_id)
+            if usage and row >= 0:
+                self.job_table.item(row, COL_RESOURCES).setText(f"{usage[0]:.0f}% / {format_size(usage[1])}")
+        self.refresh_metrics_panel()
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.update(self.build_metrics_text())
+    
+    def toggle_metrics_export(self, state):
+        """启用或关闭本地指标接口"""
+        if self.metrics_exporter is not None:
+            self.metrics_exporter.stop()
+            self.metrics_exporter = None
+        if state != Qt.Checked:
+            return
+        from miix.exporter import MetricsExporter
+        exporter = MetricsExporter(self.option_value("metrics_export_host").strip() or "127.0.0.1",
+                                   self.option_value("metrics_export_port"))
+        try:
+            exporter.update(self.build_metrics_text())
+            exporter.start()
+        except OSError as e:
+            self.update_log.emit(f"指标接口启动失败：{str(e)}")
+            self.set_option_value("metrics_export_enabled", False)
+            return
+        self.metrics_exporter = exporter
+        self.update_log.emit(f"指标接口已启动：http://{exporter.host}:{exporter.port}/metrics")
+    
+    def toggle_control_api(self, state):
+        """启用或关闭本地控制接口"""
+        if self.control_server is not None:
+            self.control_server.stop()
+            self.control_server = None
+        if state != Qt.Checked:
+            return
+        from miix.api import ControlServer, JobController
+        server = ControlServer(
+            JobController(self.scheduler, self.get_current_settings),
+            self.scheduler_signals.call_requested.emit,
+            self.option_value("control_api_host").strip() or "127.0.0.1",
+            self.option_value("control_api_port"),
+            self.option_value("control_api_token").strip(),
+        )
+        try:
+            server.start()
+        except OSError as e:
+            self.update_log.emit(f"控制接口启动失败：{str(e)}")
+            self.set_option_value("control_api_enabled", False)
+            return
+        self.control_server = server
+        if server.generated_token:
+            # 写回设置，重新启动后沿用同一个令牌
+            self.set_option_value("control_api_token", server.token)
+        self.update_log.emit(f"控制接口已启动：http://{server.host}:{server.port}/jobs")
+    
+    def run_api_call(self, fn, future):
+        from miix.api import run_call
+        run_call(fn, future)
+    
+    def on_scheduler_event(self, event, *args):
+        """调度器事件：转成Qt信号，并推送给控制接口的订阅者"""
+        self.scheduler_signals.relay(event, *args)
+        if self.control_server is not None:
+            self.control_server.controller.on_event(event, *args)
+    
+    def build_metrics_text(self):
+        """由队列状态和采样数据生成 Prometheus 文本"""
+        from miix.exporter import render_metrics
+        running = self.scheduler.running_jobs()
+        speed_samples = []
+        bytes_samples = []
+        retry_samples = []
+        cpu_samples = []
+        rss_samples = []
+        for job in self.scheduler.jobs.values():
+            metrics = self.metrics.jobs.get(job.job_id)
+            if metrics is None:
+                continue
+            labels = {"job": str(job.job_id), "origin": metrics.origin}
+            bytes_samples.append((labels, metrics.bytes_total))
+            retry_samples.append((labels, job.retries))
+            if job.is_active():
+                speed_samples.append((labels, job.speed or 0))
+        for job in running:
+            last = job.runner.resources.last if job.runner else None
+            if last:
+                labels = {"job": str(job.job_id)}
+                cpu_samples.append((labels, last[1].cpu_seconds))
+                rss_samples.append((labels, last[1].rss_bytes))
+        families = [
+            ("miix_jobs_active", "gauge", "Number of running download jobs.", [({}, len(running))]),
+            ("miix_jobs_queued", "gauge", "Number of queued download jobs.", [({}, len(self.scheduler.queue))]),
+            ("miix_jobs_completed_total", "counter", "Jobs that finished with exit code 0.",
+             [({}, self.completed_jobs)]),
+            ("miix_job_failures_total", "counter", "Jobs that finished with a non-zero exit code.",
+             [({"exit_code": str(code)}, count) for code, count in sorted(self.failure_counts.items())]),
+            ("miix_downloaded_bytes_total", "counter", "Bytes downloaded by all jobs.",
+             [({}, self.metrics.bytes_total())]),
+            ("miix_job_downloaded_bytes_total", "counter", "Bytes downloaded per job.", bytes_samples),
+            ("miix_speed_bytes_per_second", "gauge", "Current total download speed.",
+             [({}, sum(value for _, value in speed_samples))]),
+            ("miix_job_speed_bytes_per_second", "gauge", "Current download speed per job.", speed_samples),
+            ("miix_job_retries_total", "counter", "Retries reported by N_m3u8DL-RE per job.", retry_samples),
+            ("miix_job_cpu_seconds_total", "counter", "CPU time of the N_m3u8DL-RE process tree.", cpu_samples),
+            ("miix_job_resident_memory_bytes", "gauge", "Resident memory of the N_m3u8DL-RE process tree.",
+             rss_samples),
+        ]
+        if self.supervisor.proxy_hub is not None:
+            families.extend(self.supervisor.proxy_hub.metric_families())
+        return render_metrics(families)
+    
+    def refresh_metrics_panel(self):
+        metrics = self.metrics.jobs.get(self.current_job_id)
+        if metrics is None:
+            self.metrics_label.setText("当前任务：-")
+            self.speed_sparkline.set_values([])
+            self.cpu_sparkline.set_values([])
+        else:
+            text = f"当前任务：#{self.current_job_id}  重试 {metrics.retries} 次"
+            stats = metrics.speed.summary()
+            if stats:
+                low, average, p95 = stats
+                text += (f"  |  速度 最小 {format_size(low)}/s  平均 {format_size(average)}/s"
+                         f"  P95 {format_size(p95)}/s")
+            rate = metrics.segment_rate.last()
+            if rate is not None:
+                text += f"  |  分片 {rate:.1f}/s"
+            job = self.scheduler.jobs.get(self.current_job_id)
+            resources = job.runner.resources if job and job.runner else None
+            usage = resources.current() if resources else None
+            if usage:
+                cpu, rss, read_rate, write_rate, processes = usage
+                text += (f"  |  CPU {cpu:.0f}%  内存 {format_size(rss)}  读 {format_size(read_rate)}/s"
+                         f"  写 {format_size(write_rate)}/s  {processes} 个进程")
+            self.metrics_label.setText(text)
+            self.speed_sparkline.set_values(metrics.speed.values())
+            self.cpu_sparkline.set_values(resources.cpu_values() if resources else [])
+        disks = self.scheduler.disk_watchdog.summary()
+        status = ["磁盘 " + "；".join(disks)] if disks else []
+        hub = self.supervisor.proxy_hub
+        if hub is not None:
+            status += hub.summary()
+            self.metrics_label.setToolTip("\n".join(hub.origin_lines()))
+        if status:
+            self.metrics_label.setText("  |  ".join([self.metrics_label.text()] + status))
+        
+        summary = self.metrics.origin_summary()
+        self.origin_table.setRowCount(len(summary))
+        for row, (origin, entry) in enumerate(sorted(summary.items())):
+            cells = [
+                origin or "-",
+                str(entry["jobs"]),
+                "-" if entry["min"] is None else f"{format_size(entry['min'])}/s",
+                "-" if entry["avg"] is None else f"{format_size(entry['avg'])}/s",
+                "-" if entry["p95"] is None else f"{format_size(entry['p95'])}/s",
+                str(entry["retries"]),
+            ]
+            for column, text in enumerate(cells):
+                self.origin_table.setItem(row, column, QTableWidgetItem(text))
     
     def on_update_progress(self, value):
         self.progress_bar.setValue(value)
     
     def on_update_log(self, text):
-        self.log_edit.append(text)
-        self.log_edit.verticalScrollBar().setValue(self.log_edit.verticalScrollBar().maximum())
+        # 经过日志缓冲，保证与下载输出的先后顺序一致
+        self.log_sink.push(None, text)
     
-    def on_download_complete(self, exit_code):
+    def on_download_complete(self, job_id, exit_code):
+        # 先取出缓冲区中该任务的剩余输出，再把最后一条进度行作为记录写入日志
+        self.log_sink.flush()
+        for line in self.latest_progress_lines.pop(job_id, {}).values():
+            self.log_sink.push(job_id, line.replace("━", "").strip(), coalesce=False)
+        tag = f"[#{job_id}] "
         if exit_code == 0:
-            self.update_log.emit("✅ 下载完成！")
+            self.completed_jobs += 1
+            self.update_log.emit(f"{tag}✅ 下载完成！")
         elif exit_code == -1:
-            self.update_log.emit("⏹️ 下载已停止")
+            self.update_log.emit(f"{tag}⏹️ 下载已停止")
         else:
-            self.update_log.emit(f"❌ 下载失败，退出代码：{exit_code}")
-        
-        # 恢复按钮状态
-        self.go_btn.setEnabled(True)
-        self.stop_btn.setEnabled(False)
+            self.failure_counts[exit_code] = self.failure_counts.get(exit_code, 0) + 1
+            job = self.scheduler.jobs.get(job_id)
+            reason = f"，原因：{job.failure}" if job and job.failure else ""
+            self.update_log.emit(f"{tag}❌ 下载失败，退出代码：{exit_code}{reason}")
         
         # 重置进度条（保持最终进度）
-        if exit_code != 0:
-            self.progress_bar.setValue(0)
-        
-        # 保存当前设置
+        if self.current_job_id == job_id:
+            if exit_code != 0:
+                self.progress_bar.setValue(0)
+            # 进度条切换到下一个正在运行的任务
+            running = self.scheduler.running_jobs()
+            self.current_job_id = running[0].job_id if running else None
+            self.refresh_progress_label()
+        
+        # 保存当前设置（只记录变化，稍后在后台写入）
+        self.settings_store.save(self.get_current_settings())
+    
+    def offer_resume_jobs(self):
+        """上次退出时有未完成的任务，询问是否恢复"""
+        journal = self.scheduler.journal
         try:
-            settings = self.get_current_settings()
-            default_path = os.path.join(os.path.expanduser("~"), "m3u8_downloader_last_settings.json")
-            with open(default_path, 'w', encoding='utf-8') as f:
-                json.dump(settings, f, ensure_ascii=False, indent=4)
-        except:
+            entries = journal.load()
+        except Exception as e:
+            self.update_log.emit(f"读取未完成的任务时出错：{str(e)}")
+            return
+        if not entries:
+            return
+        answer = QMessageBox.question(
+            self, "恢复任务",
+            f"上次有 {len(entries)} 个任务未完成，是否恢复？\n已下载的分片会被跳过，从断点继续。"
+        )
+        if answer != QMessageBox.Yes:
+            journal.mark_dirty()  # 不恢复时清空记录
+            return
+        try:
+            restored = restore_jobs(self.scheduler, entries)
+        except Exception as e:
+            self.update_log.emit(f"恢复任务时出错：{str(e)}")
+            return
+        for job, count, size in restored:
+            detail = f"已有 {count} 个分片（{size / 1024 / 1024:.1f} MB）" if count else "没有已下载的分片"
+            self.update_log.emit(f"[#{job.job_id}] 已恢复：{job.title}，{detail}")
+    
+    def closeEvent(self, event):
+        """停止所有下载，在进度对话框中等待子进程退出（总共最多 STOP_WAIT_TIMEOUT 秒），再写入未完成的任务并关闭"""
+        if self.close_ready:
+            super().closeEvent(event)
+            return
+        event.ignore()
+        if self.closing is not None:
+            return
+        running = [job for job in self.scheduler.running_jobs() if job.runner is not None]
+        if running and QMessageBox.question(
+                self, "退出",
+                f"还有 {len(running)} 个任务正在下载，确定退出吗？\n已下载的分片会保留，下次启动时可以继续。"
+        ) != QMessageBox.Yes:
+            return
+        try:
+            self.settings_store.flush()
+        except Exception:
             pass
+        # 记下停止前的状态，下载中和排队中的任务下次启动时重新排队，而不是变成已停止
+        statuses = {job.job_id: job.status for job in self.scheduler.jobs.values()}
+        self.scheduler.stop_all()
+        # 不再派发新任务；子进程的退出事件仍由监督线程送回
+        self.scheduler_timer.stop()
+        dialog = None
+        if running:
+            dialog = QProgressDialog("正在等待下载进程退出...", None, 0, len(running), self)
+            dialog.setWindowTitle("退出")
+            dialog.setWindowModality(Qt.WindowModal)
+            dialog.setMinimumDuration(0)
+            dialog.setValue(0)
+        timer = QTimer(self)
+        timer.setInterval(100)
+        timer.timeout.connect(self.poll_closing)
+        self.closing = (time.monotonic() + STOP_WAIT_TIMEOUT, statuses, running, dialog, timer)
+        timer.start()
+        self.poll_closing()
+    
+    def poll_closing(self):
+        """所有进程退出或到达截止时间后收尾并真正关闭窗口"""
+        deadline, statuses, running, dialog, timer = self.closing
+        pending = [job for job in running if job.runner.future is not None and not job.runner.future.done()]
+        if dialog is not None:
+            dialog.setValue(len(running) - len(pending))
+        if pending and time.monotonic() < deadline:
+            return
+        timer.stop()
+        if dialog is not None:
+            dialog.close()
+        for job in pending:
+            self.update_log.emit(f"[#{job.job_id}] 未能在 {STOP_WAIT_TIMEOUT} 秒内退出")
+        for job in self.scheduler.jobs.values():
+            job.status = statuses.get(job.job_id, job.status)
+        self.scheduler.journal.flush_if_due(self.scheduler.jobs.values(), force=True)
+        self.supervisor.shutdown()
+        self.close_ready = True
+        self.close()
 
 if __name__ == '__main__':
+    startup_timer.mark("导入模块")
     app = QApplication(sys.argv)
+    startup_timer.mark("创建应用")
     
     # 设置全局字体
     font = QFont()
@@ -1784,6 +2220,9 @@ if __name__ == '__main__':
     # 创建并显示主窗口
     window = M3U8Downloader()
     window.show()
+    startup_timer.mark("显示窗口")
+    # 事件循环开始后窗口才真正绘制出来
+    QTimer.singleShot(0, startup_timer.finish)
     
     sys.exit(app.exec_())
     
@@ -0,0 +1 @@
+"""N_m3u8DL-RE GUI Miix 的核心逻辑，不依赖 PyQt5"""
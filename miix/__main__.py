@@ -0,0 +1,6 @@
+"""python -m miix 以命令行模式运行"""
+import sys
+
+from .headless import main
+
+sys.exit(main())
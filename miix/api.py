@@ -0,0 +1,366 @@
+"""本地 HTTP/JSON 控制接口
+
+    GET    /jobs               任务列表
+    GET    /jobs/<ID>          单个任务
+    POST   /jobs               加入队列，请求体 {"url": "...", "profile": "配置名", "settings": {设置覆盖}}
+    POST   /jobs/<ID>/cancel   停止任务（DELETE /jobs/<ID> 相同）
+    POST   /jobs/<ID>/pause    暂停任务，POST /jobs/<ID>/resume 继续
+    GET    /events             以 server-sent events 推送任务状态和进度，?job=<ID> 只看一个任务
+
+所有请求都要带 Authorization: Bearer <令牌>，未设置令牌时启动时随机生成；POST 的请求体必须是
+Content-Type: application/json（网页的表单无法跨域发送）。settings 只能覆盖下载参数，不能修改
+执行程序、自定义参数和各种文件/目录路径，避免通过接口运行任意程序或写入任意位置；保存名称和
+命名模板不能含路径分隔符，数值按选项的范围截断。
+
+HTTP 请求在后台线程中处理，不直接访问调度器：操作通过宿主提供的 submit(函数) 交给调度器
+所在的线程执行（界面线程或命令行模式的主线程），再等待结果。调度器的事件由宿主在同一线程
+中交给 JobController.on_event()，转成 JSON 后广播给所有 SSE 客户端。
+"""
+import hmac
+import json
+import queue
+import re
+import secrets
+import threading
+from concurrent.futures import Future
+from dataclasses import asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .batch import merge_import_row
+from .command import build_command_from_settings, resolve_work_dir
+from .options import OPTION_MAP, OPTIONS
+from .resume import UNSAFE_NAME_RE
+
+# 等待调度器线程处理请求的最长时间（秒）
+CALL_TIMEOUT = 10
+# SSE 没有事件时发送注释保持连接
+KEEPALIVE_INTERVAL = 15
+# 每个 SSE 客户端最多积压的事件数，客户端读取太慢时丢弃新事件
+SUBSCRIBER_QUEUE_SIZE = 1000
+# 接口可以覆盖的设置：生成下载参数的选项，不含自定义参数和文件/目录路径
+OVERLAY_KEYS = frozenset(
+    [option.key for option in OPTIONS
+     if (option.flag or callable(option.emit)) and option.widget not in ("file", "dir") and option.key != "args"]
+    + ["m3u8_url", "title", "end_time", "auto_video_height"])
+# 会成为文件/目录名的设置，命名模板中的 <变量> 不算
+NAME_KEYS = ("title", "save_pattern")
+PATTERN_VARIABLE_RE = re.compile(r"<\w+>")
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def run_call(fn, future):
+    """在调度器线程中执行 submit() 提交的函数，把结果交给等待的 HTTP 线程"""
+    if not future.set_running_or_notify_cancel():
+        return
+    try:
+        future.set_result(fn())
+    except Exception as e:
+        future.set_exception(e)
+
+
+def check_overlay(overlay):
+    """校验接口传入的设置覆盖，返回数值截断到选项范围内的副本；不允许的设置抛出 ApiError"""
+    rejected = sorted(key for key in overlay if key not in OVERLAY_KEYS)
+    if rejected:
+        raise ApiError(400, f"不允许通过接口修改这些设置：{', '.join(rejected)}")
+    checked = {}
+    for key, value in overlay.items():
+        option = OPTION_MAP.get(key)
+        if key in NAME_KEYS:
+            if not isinstance(value, str):
+                raise ApiError(400, f"{key} 必须是字符串")
+            if UNSAFE_NAME_RE.search(PATTERN_VARIABLE_RE.sub("", value)) or (value and not value.strip(". ")):
+                raise ApiError(400, f'{key} 不能是 . 或 ..，也不能包含 \\ / : * ? " < > |')
+        elif option is not None and option.widget == "int":
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ApiError(400, f"{key} 必须是数字")
+            value = int(value)
+            if option.maximum > option.minimum:
+                value = min(option.maximum, max(option.minimum, value))
+        checked[key] = value
+    return checked
+
+
+def job_to_dict(job):
+    return {
+        "id": job.job_id,
+        "title": job.title,
+        "url": job.settings.get("m3u8_url", ""),
+        "profile": job.profile,
+        "status": job.status,
+        "progress": job.progress,
+        "exit_code": job.exit_code,
+        "attempts": job.attempts,
+        "retries": job.retries,
+        "auto_retries": job.auto_retries,
+        "failure": job.failure,
+        "speed": job.speed,
+        "eta": job.eta,
+        "resources": job.resource_summary,
+    }
+
+
+def record_to_dict(record):
+    data = asdict(record)
+    data.pop("raw", None)
+    return data
+
+
+class JobController:
+    """在调度器线程中执行的接口操作
+    
+    template() 返回新任务使用的基础设置（界面为当前设置，命令行模式为设置文件）。
+    """
+    
+    def __init__(self, scheduler, template):
+        self.scheduler = scheduler
+        self.template = template
+        self.hub = EventHub()
+    
+    def _get(self, job_id):
+        job = self.scheduler.jobs.get(job_id)
+        if job is None:
+            raise ApiError(404, f"任务不存在：{job_id}")
+        return job
+    
+    def list_jobs(self):
+        return [job_to_dict(job) for job in self.scheduler.jobs.values()]
+    
+    def get_job(self, job_id):
+        return job_to_dict(self._get(job_id))
+    
+    def enqueue(self, body):
+        if not isinstance(body, dict):
+            raise ApiError(400, "请求体必须是 JSON 对象")
+        overlay = body.get("settings") or {}
+        if not isinstance(overlay, dict):
+            raise ApiError(400, "settings 必须是 JSON 对象")
+        overlay = dict(overlay)
+        if body.get("url"):
+            overlay["m3u8_url"] = body["url"]
+        if body.get("title"):
+            overlay["title"] = body["title"]
+        overlay = check_overlay(overlay)
+        if not overlay.get("m3u8_url"):
+            raise ApiError(400, "缺少 url")
+        if body.get("profile"):
+            try:
+                job = self.scheduler.add_profile_job(body["profile"], overlay)
+            except Exception as e:
+                raise ApiError(400, str(e))
+            return job_to_dict(job)
+        settings = merge_import_row(self.template(), overlay)
+        job = self.scheduler.add_job(settings, build_command_from_settings(settings), resolve_work_dir(settings))
+        return job_to_dict(job)
+    
+    def cancel(self, job_id):
+        job = self._get(job_id)
+        self.scheduler.stop_job(job_id)
+        return job_to_dict(job)
+    
+    def pause(self, job_id):
+        job = self._get(job_id)
+        self.scheduler.pause_job(job_id)
+        return job_to_dict(job)
+    
+    def resume(self, job_id):
+        job = self._get(job_id)
+        self.scheduler.resume_job(job_id)
+        return job_to_dict(job)
+    
+    def on_event(self, event, *args):
+        """调度器事件转成 JSON 广播，没有 SSE 客户端时直接返回"""
+        if not self.hub.subscribers:
+            return
+        job_id = args[0]
+        if event == "job_progress_record":
+            self.hub.publish({"type": "progress", "job": job_id, **record_to_dict(args[1])})
+        elif event == "job_removed":
+            self.hub.publish({"type": "removed", "job": job_id})
+        elif event in ("job_added", "job_updated", "job_progress"):
+            job = self.scheduler.jobs.get(job_id)
+            if job is not None:
+                self.hub.publish({"type": "job", "job": job_id, **job_to_dict(job)})
+
+
+class EventHub:
+    """把事件分发给每个 SSE 客户端各自的队列"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = []
+    
+    def subscribe(self):
+        subscriber = queue.Queue(SUBSCRIBER_QUEUE_SIZE)
+        with self.lock:
+            self.subscribers.append(subscriber)
+        return subscriber
+    
+    def unsubscribe(self, subscriber):
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+    
+    def publish(self, event):
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(event)
+            except queue.Full:
+                pass
+
+
+class _ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    
+    def do_GET(self):
+        self.handle_request("GET")
+    
+    def do_POST(self):
+        self.handle_request("POST")
+    
+    def do_DELETE(self):
+        self.handle_request("DELETE")
+    
+    def handle_request(self, method):
+        api = self.server.api
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        try:
+            authorization = self.headers.get("Authorization", "").encode("utf-8")
+            if not hmac.compare_digest(authorization, f"Bearer {api.token}".encode("utf-8")):
+                raise ApiError(401, "未授权")
+            if parts == ["events"] and method == "GET":
+                self.stream_events(parse_qs(url.query).get("job", [None])[0])
+                return
+            controller = api.controller
+            if parts == ["jobs"] and method == "GET":
+                self.send_json(200, api.call(controller.list_jobs))
+            elif parts == ["jobs"] and method == "POST":
+                body = self.read_json()
+                self.send_json(201, api.call(lambda: controller.enqueue(body)))
+            elif len(parts) == 2 and parts[0] == "jobs" and method == "GET":
+                job_id = self.parse_id(parts[1])
+                self.send_json(200, api.call(lambda: controller.get_job(job_id)))
+            elif (len(parts) == 2 and parts[0] == "jobs" and method == "DELETE") or \
+                    (len(parts) == 3 and parts[0] == "jobs" and parts[2] == "cancel" and method == "POST"):
+                job_id = self.parse_id(parts[1])
+                self.send_json(200, api.call(lambda: controller.cancel(job_id)))
+            elif len(parts) == 3 and parts[0] == "jobs" and parts[2] in ("pause", "resume") and method == "POST":
+                job_id = self.parse_id(parts[1])
+                action = getattr(controller, parts[2])
+                self.send_json(200, api.call(lambda: action(job_id)))
+            else:
+                raise ApiError(404, "接口不存在")
+        except ApiError as e:
+            self.send_json(e.status, {"error": str(e)})
+        except Exception as e:
+            self.send_json(500, {"error": str(e)})
+    
+    def parse_id(self, text):
+        try:
+            return int(text)
+        except ValueError:
+            raise ApiError(404, f"任务不存在：{text}")
+    
+    def read_json(self):
+        content_type = self.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            raise ApiError(415, "请求体必须是 application/json")
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            return json.loads(self.rfile.read(length).decode("utf-8") or "{}")
+        except ValueError as e:
+            raise ApiError(400, f"JSON 格式错误：{str(e)}")
+    
+    def send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def stream_events(self, job_filter):
+        hub = self.server.api.controller.hub
+        subscriber = hub.subscribe()
+        self.close_connection = True
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            self.wfile.write(b": connected\n\n")
+            self.wfile.flush()
+            while self.server.api.running:
+                try:
+                    event = subscriber.get(timeout=KEEPALIVE_INTERVAL)
+                except queue.Empty:
+                    self.wfile.write(b": keepalive\n\n")
+                    self.wfile.flush()
+                    continue
+                if job_filter is not None and str(event.get("job")) != job_filter:
+                    continue
+                data = json.dumps(event, ensure_ascii=False)
+                self.wfile.write(f"event: {event['type']}\ndata: {data}\n\n".encode("utf-8"))
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            hub.unsubscribe(subscriber)
+    
+    def log_message(self, format, *args):
+        pass  # 不输出访问日志
+
+
+class ControlServer:
+    """在本地端口上提供控制接口
+    
+    submit(函数) 必须把函数交给调度器线程执行，并在那里调用 run_call(函数, future)。
+    token 为空时生成随机令牌（generated_token 为真），宿主应显示给用户。
+    """
+    
+    def __init__(self, controller, submit, host="127.0.0.1", port=9465, token=""):
+        self.controller = controller
+        self.submit = submit
+        self.host = host
+        self.port = port
+        self.generated_token = not token
+        self.token = token or secrets.token_urlsafe(24)
+        self.server = None
+        self.thread = None
+    
+    @property
+    def running(self):
+        return self.server is not None
+    
+    def call(self, fn):
+        future = Future()
+        self.submit(fn, future)
+        return future.result(timeout=CALL_TIMEOUT)
+    
+    def start(self):
+        """启动HTTP服务，端口被占用等错误会抛出 OSError"""
+        if self.server is not None:
+            return
+        self.server = ThreadingHTTPServer((self.host, self.port), _ApiHandler)
+        self.server.daemon_threads = True
+        self.server.api = self
+        self.thread = threading.Thread(target=self.server.serve_forever, name="control-api", daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        if self.server is None:
+            return
+        server = self.server
+        self.server = None  # SSE 连接在下一次超时后退出
+        server.shutdown()
+        server.server_close()
+        self.thread = None
@@ -0,0 +1,125 @@
+"""批量导入地址列表（文本 / CSV / JSON / JSON Lines）"""
+import csv
+import json
+import os
+
+
+# 批量导入时列名的别名，其余与设置键名相同的列直接覆盖模板
+IMPORT_FIELD_ALIASES = {
+    "url": "m3u8_url",
+    "link": "m3u8_url",
+    "name": "title",
+    "save_name": "title",
+    "header": "headers",
+    "save_dir": "work_dir",
+    "dir": "work_dir",
+    "video": "select_video",
+    "audio": "select_audio",
+    "subtitle": "select_subtitle",
+}
+
+
+def detect_import_format(filename=None, sample=""):
+    """根据扩展名或内容判断列表格式：text / csv / json / jsonl"""
+    if filename:
+        ext = os.path.splitext(filename)[1].lower()
+        if ext == ".csv":
+            return "csv"
+        if ext in (".jsonl", ".ndjson"):
+            return "jsonl"
+        if ext == ".json":
+            return "json"
+    sample = sample.lstrip("\ufeff \t\r\n")
+    if sample.startswith("["):
+        return "json"
+    if sample.startswith("{"):
+        return "jsonl"
+    first_line = sample.split("\n", 1)[0].lower()
+    if "," in first_line and "url" in first_line:
+        return "csv"
+    return "text"
+
+
+def normalize_import_row(row):
+    """统一一行导入数据的字段名，没有URL时返回None"""
+    result = {}
+    for key, value in row.items():
+        if key is None or value is None:
+            continue
+        key = key.strip().lower()
+        key = IMPORT_FIELD_ALIASES.get(key, key)
+        if isinstance(value, dict):
+            # JSON 中的请求头可以写成对象
+            value = ";".join(f"{name}:{content}" for name, content in value.items())
+        elif isinstance(value, list):
+            value = ";".join(str(item) for item in value)
+        if isinstance(value, str):
+            value = value.strip()
+            if not value:
+                continue
+        result[key] = value
+    if not result.get("m3u8_url"):
+        return None
+    return result
+
+
+def parse_text_line(line):
+    """文本格式：每行一个地址，地址后可跟空格/Tab分隔的标题，#开头为注释"""
+    line = line.strip()
+    if not line or line.startswith("#"):
+        return None
+    parts = line.split(None, 1)
+    row = {"m3u8_url": parts[0]}
+    if len(parts) > 1:
+        row["title"] = parts[1].strip()
+    return row
+
+
+def iter_import_rows(stream, fmt):
+    """逐行解析地址列表，生成设置覆盖字典（大文件不会一次性读入）"""
+    if fmt == "csv":
+        for row in csv.DictReader(stream):
+            row = normalize_import_row(row)
+            if row:
+                yield row
+    elif fmt == "jsonl":
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            row = normalize_import_row(item if isinstance(item, dict) else {"m3u8_url": str(item)})
+            if row:
+                yield row
+    elif fmt == "json":
+        # 标准JSON数组无法流式解析，只能整体读入（在后台线程中进行）
+        data = json.load(stream)
+        if isinstance(data, dict):
+            data = data.get("jobs") or data.get("urls") or []
+        for item in data:
+            row = normalize_import_row(item if isinstance(item, dict) else {"m3u8_url": str(item)})
+            if row:
+                yield row
+    else:
+        for line in stream:
+            row = parse_text_line(line)
+            if row:
+                yield row
+
+
+def merge_import_row(template, row):
+    """以当前设置为模板，叠加导入行中的字段"""
+    settings = dict(template)
+    for key, value in row.items():
+        if key == "headers" and template.get("headers"):
+            # 行内请求头追加在模板请求头之后
+            value = f"{template['headers']};{value}"
+        elif key in template and isinstance(template[key], bool) and isinstance(value, str):
+            value = value.lower() in ("1", "true", "yes", "y")
+        elif key in template and isinstance(template[key], int) and isinstance(value, str):
+            try:
+                value = int(value)
+            except ValueError:
+                continue
+        settings[key] = value
+    return settings
@@ -0,0 +1,60 @@
+"""全局线程数与带宽预算"""
+
+
+def water_fill(total, demands):
+    """按最大最小公平原则把 total 分给各个需求，返回整数分配"""
+    alloc = {}
+    remaining = total
+    pending = sorted(demands, key=lambda key: demands[key])
+    while pending:
+        share = remaining // len(pending)
+        key = pending[0]
+        if demands[key] <= share:
+            # 需求小于平均份额的任务拿够自己要的，剩下的留给其他任务
+            alloc[key] = demands[key]
+            remaining -= demands[key]
+            pending.pop(0)
+        else:
+            extra = remaining - share * len(pending)
+            for index, key in enumerate(pending):
+                alloc[key] = share + (1 if index < extra else 0)
+            break
+    return alloc
+
+
+def apply_budget(cmd, threads, speed):
+    """用分配到的线程数和限速(kb/s, 0为不限)替换命令中的对应参数"""
+    cmd = list(cmd)
+    if "--thread-count" in cmd:
+        cmd[cmd.index("--thread-count") + 1] = str(threads)
+    else:
+        cmd.extend(["--thread-count", str(threads)])
+    if "--max-speed" in cmd:
+        index = cmd.index("--max-speed")
+        del cmd[index:index + 2]
+    if speed > 0:
+        cmd.extend(["--max-speed", f"{speed}K"])
+    return cmd
+
+
+class ResourceBudget:
+    """全局线程数/带宽预算，在所有正在运行的任务之间分配（0 表示不限制）"""
+    
+    def __init__(self, total_threads=0, total_speed=0):
+        self.total_threads = total_threads
+        self.total_speed = total_speed
+    
+    def is_enabled(self):
+        return self.total_threads > 0 or self.total_speed > 0
+    
+    def allocate(self, demands):
+        """demands: {任务ID: (线程数, 限速kb/s)} -> {任务ID: (线程数, 限速kb/s)}"""
+        threads = {key: value[0] for key, value in demands.items()}
+        speeds = {key: value[1] for key, value in demands.items()}
+        if self.total_threads > 0 and threads:
+            threads = {key: max(1, value) for key, value in water_fill(self.total_threads, threads).items()}
+        if self.total_speed > 0 and speeds:
+            # 任务自身不限速时按全局带宽计算需求
+            wanted = {key: value if value > 0 else self.total_speed for key, value in speeds.items()}
+            speeds = {key: max(1, value) for key, value in water_fill(self.total_speed, wanted).items()}
+        return {key: (threads[key], speeds[key]) for key in demands}
@@ -0,0 +1,16 @@
+"""根据设置字典构建 N_m3u8DL-RE 命令行"""
+import os
+
+from .options import build_arguments
+
+
+def build_command_from_settings(settings):
+    """根据设置字典构建命令行参数（不依赖界面控件，批量任务也使用）"""
+    cmd = [settings.get("executable", ""), settings.get("m3u8_url", "")]
+    cmd.extend(build_arguments(settings))
+    return cmd
+
+
+def resolve_work_dir(settings):
+    """子进程的工作目录：未指定保存目录时使用程序所在目录"""
+    return settings.get("work_dir") or os.path.dirname(settings.get("executable", ""))
@@ -0,0 +1,223 @@
+"""下载过程中监视临时目录和保存目录所在磁盘的剩余空间
+
+JobScheduler.tick() 调用 DiskWatchdog.poll()，每隔 POLL_INTERVAL 秒在后台线程中检查一次。阈值取自各任务的设置
+（同一磁盘上取最大值）：
+    disk_warn_mb     剩余空间低于该值加上合并所需空间时警告
+    disk_hard_mb     低于该值时按 disk_low_action 暂停或停止该磁盘上的任务，排队的任务暂不启动
+空间恢复到警告阈值以上后，自动继续被暂停的任务。
+
+合并时成品和分片同时存在，保存目录所在磁盘还需要约等于已下载分片大小的空间；未勾选合并后删除
+分片时分片会一直保留，任务最终约占两倍分片大小。
+"""
+import os
+import shutil
+import threading
+
+from .command import resolve_work_dir
+from .progress import format_size
+
+POLL_INTERVAL = 5.0
+MB = 1024 * 1024
+ACTION_PAUSE = "暂停"
+ACTION_STOP = "停止"
+
+
+def existing_parent(path):
+    """路径还不存在时（下载前）取最近的已存在的上级目录"""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def job_directories(settings):
+    """(保存目录, 临时目录)，临时目录未指定时与保存目录相同"""
+    save_dir = resolve_work_dir(settings) or os.getcwd()
+    return save_dir, settings.get("tmp_dir") or save_dir
+
+
+def merge_requirement(settings, segment_bytes):
+    """(合并时保存目录还需要的空间, 任务最终占用的空间)"""
+    if settings.get("del_after_merge", True):
+        return segment_bytes, segment_bytes
+    return segment_bytes, segment_bytes * 2
+
+
+def settings_devices(settings):
+    """{设备号: 目录}，临时目录在前"""
+    devices = {}
+    save_dir, tmp_dir = job_directories(settings)
+    for path in (tmp_dir, save_dir):
+        try:
+            devices.setdefault(os.stat(existing_parent(path)).st_dev, path)
+        except OSError:
+            continue
+    return devices
+
+
+class DiskWatchdog:
+    """按磁盘汇总运行中和排队的任务，空间偏低时警告，不足时暂停/停止任务
+    
+    查询磁盘在后台线程中进行（网络驱动器上可能很慢），poll() 下次调用时读回结果；
+    合并所需空间按进度记录中的轨道大小计算，不扫描临时目录。
+    """
+    
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.next_poll = 0
+        # 已警告和低于最低阈值的磁盘（设备号）
+        self.warned = set()
+        self.low = set()
+        # 因空间不足被暂停的任务，空间恢复后自动继续
+        self.paused = set()
+        # {设备号: (目录, 剩余字节数, 合并还需要的字节数)}，供界面显示
+        self.status = {}
+        # {任务 ID: {设备号: 目录}}，上次查询的结果
+        self.devices = {}
+        # 有排队的任务在等查询结果，结果读回后重新调度
+        self.waiting = False
+        self.worker = None
+        self.result = None
+    
+    def is_blocked(self, job):
+        """排队的任务所在磁盘空间不足时暂不启动
+        
+        有磁盘空间不足时，刚加入、还没查询过的任务所在磁盘未知，等下一次后台查询（提前进行）后再决定，
+        不在调度器线程中查询目录所在的设备。
+        """
+        if not self.low:
+            return False
+        devices = self.devices.get(job.job_id)
+        if devices is None:
+            self.request_scan()
+            return True
+        return not self.low.isdisjoint(devices)
+    
+    def free_space(self, job):
+        """上次查询得到的任务所在磁盘的剩余字节数列表，临时目录在前，同一磁盘时只有一项
+        
+        任务还没查询过或查询失败时返回 None，并提前进行下一次查询。
+        """
+        devices = self.devices.get(job.job_id)
+        if devices and all(device in self.status for device in devices):
+            return [self.status[device][1] for device in devices]
+        self.request_scan()
+        return None
+    
+    def request_scan(self):
+        self.next_poll = 0
+        self.waiting = True
+    
+    def poll(self, now):
+        if self.result is not None:
+            result, self.result = self.result, None
+            self.apply(*result)
+        if now < self.next_poll or (self.worker is not None and self.worker.is_alive()):
+            return
+        self.next_poll = now + POLL_INTERVAL
+        scheduler = self.scheduler
+        snapshot = []
+        for job in scheduler.jobs.values():
+            active = job.is_active()
+            if not active and job.job_id not in scheduler.queue:
+                continue
+            segment_bytes = sum(record.total_bytes or record.downloaded_bytes or 0 for record in job.tracks.values())
+            merge_need = merge_requirement(job.settings, segment_bytes)[0] if active else 0
+            snapshot.append((job.job_id, job.settings, active, merge_need))
+        self.worker = threading.Thread(target=self.scan, args=(snapshot,), name="disk-watchdog", daemon=True)
+        self.worker.start()
+    
+    def scan(self, snapshot):
+        """后台线程：按磁盘分组并查询剩余空间"""
+        devices_by_job = {}
+        groups = {}
+        for job_id, settings, active, merge_need in snapshot:
+            devices = settings_devices(settings)
+            devices_by_job[job_id] = devices
+            save_device = next(reversed(list(devices)), None)
+            for device, path in devices.items():
+                group = groups.setdefault(device, {"path": path, "jobs": [], "need": 0, "warn": 0, "hard": 0,
+                                                   "action": ACTION_PAUSE, "free": None})
+                group["warn"] = max(group["warn"], settings.get("disk_warn_mb", 2048) * MB)
+                group["hard"] = max(group["hard"], settings.get("disk_hard_mb", 512) * MB)
+                if settings.get("disk_low_action") == ACTION_STOP:
+                    group["action"] = ACTION_STOP
+                if active:
+                    group["jobs"].append(job_id)
+                    if device == save_device:
+                        group["need"] += merge_need
+        for group in groups.values():
+            try:
+                group["free"] = shutil.disk_usage(existing_parent(group["path"])).free
+            except OSError:
+                continue
+        self.result = (devices_by_job, groups)
+    
+    def apply(self, devices_by_job, groups):
+        """在调度器线程中处理后台查询的结果"""
+        scheduler = self.scheduler
+        self.devices = devices_by_job
+        status = {}
+        low = set()
+        for device, group in groups.items():
+            free = group["free"]
+            if free is None:
+                continue
+            # 查询期间已结束或被移除的任务不再处理
+            group["jobs"] = [scheduler.jobs[job_id] for job_id in group["jobs"]
+                             if job_id in scheduler.jobs and scheduler.jobs[job_id].is_active()]
+            status[device] = (group["path"], free, group["need"])
+            hard, warn = group["hard"], group["warn"]
+            # 进入不足状态后，恢复到警告阈值以上才算恢复，避免反复暂停/继续
+            if hard and free < (max(hard, warn) if device in self.low else hard):
+                low.add(device)
+                if device not in self.low:
+                    self.limit(group, free)
+            elif warn and free < warn + group["need"]:
+                if device not in self.warned:
+                    self.warned.add(device)
+                    for job in group["jobs"]:
+                        scheduler.emit("job_log", job.job_id,
+                                       f"磁盘空间偏低：{group['path']} 剩余 {format_size(free)}，"
+                                       f"合并约需 {format_size(group['need'])}")
+            else:
+                self.warned.discard(device)
+        self.status = status
+        recovered = self.low - low
+        self.low = low
+        if recovered:
+            self.resume_paused()
+        if recovered or self.waiting:
+            self.waiting = False
+            scheduler.schedule()
+    
+    def limit(self, group, free):
+        """空间低于最低阈值：暂停或停止该磁盘上的任务"""
+        scheduler = self.scheduler
+        for job in group["jobs"]:
+            scheduler.emit("job_log", job.job_id,
+                           f"磁盘空间不足：{group['path']} 剩余 {format_size(free)}，{group['action']}任务")
+            if group["action"] == ACTION_STOP:
+                scheduler.stop_job(job.job_id)
+            elif job.status == job.RUNNING:
+                scheduler.pause_job(job.job_id)
+                if job.status == job.PAUSED:
+                    self.paused.add(job.job_id)
+    
+    def resume_paused(self):
+        for job_id in list(self.paused):
+            job = self.scheduler.jobs.get(job_id)
+            if job is None or job.status != job.PAUSED:
+                self.paused.discard(job_id)  # 已被用户继续、停止或移除
+            elif not self.is_blocked(job):
+                self.paused.discard(job_id)
+                self.scheduler.emit("job_log", job_id, "磁盘空间已恢复，继续下载")
+                self.scheduler.resume_job(job_id)
+    
+    def summary(self):
+        """各磁盘的剩余空间说明"""
+        return [f"{path} 剩余 {format_size(free)}" + (f"（合并约需 {format_size(need)}）" if need else "")
+                for path, free, need in self.status.values()]
@@ -0,0 +1,194 @@
+"""下载前的大小、时长和耗时预估，以及磁盘空间检查
+
+大小按选中轨道的码率 × 时长估算；没有码率的轨道（如 HLS 的独立音轨）读取媒体列表，
+对均匀抽取的几个分片发 HEAD（或 Range: bytes=0-0）请求得到字节数，再按时长折算。
+耗时按该源站以往完成任务的平均速度（metrics.ThroughputHistory）估算。
+"""
+import os
+import shutil
+import urllib.request
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from .diskwatch import existing_parent, job_directories
+from .manifest import (
+    AUDIO, SUBTITLE, VIDEO, ManifestError, build_opener, load_manifest, request_headers,
+)
+from .metrics import origin_of
+from .progress import format_duration, format_size
+from .tracks import DROP_KEYS, SELECT_KEYS, best_track, match_expression, min_height_expression
+
+# 每条轨道最多探测的分片数
+PROBE_SAMPLES = 4
+PROBE_TIMEOUT = 10
+# 预估误差和封装开销的余量
+SPACE_MARGIN = 1.1
+KIND_NAMES = {VIDEO: "视频", AUDIO: "音频", SUBTITLE: "字幕"}
+
+
+@dataclass
+class TrackEstimate:
+    track: object  # manifest.Track
+    bytes: int
+    source: str  # 码率 / 探测 / 未知
+
+
+@dataclass
+class JobEstimate:
+    url: str
+    duration: float
+    live: bool
+    tracks: List[TrackEstimate] = field(default_factory=list)
+    speed: Optional[float] = None  # 字节/秒，没有历史记录时为 None
+    
+    @property
+    def total_bytes(self):
+        return sum(estimate.bytes for estimate in self.tracks)
+    
+    @property
+    def seconds(self):
+        if not self.speed or not self.total_bytes:
+            return None
+        return self.total_bytes / self.speed
+
+
+def selected_tracks(manifest, settings):
+    """按设置中的选择/丢弃表达式推算会下载的轨道；未指定时视频和音频取码率最高的一条，字幕全部下载"""
+    result = []
+    for kind in (VIDEO, AUDIO, SUBTITLE):
+        candidates = manifest.tracks_of(kind)
+        drop = settings.get(DROP_KEYS[kind], "")
+        if drop:
+            dropped = {id(track) for track in match_expression(drop, candidates, choose_all=True)}
+            candidates = [track for track in candidates if id(track) not in dropped]
+        if not candidates:
+            continue
+        expression = settings.get(SELECT_KEYS[kind], "")
+        if kind == VIDEO and not expression and settings.get("auto_video_height", 0) > 0:
+            expression = min_height_expression(settings["auto_video_height"])
+        if expression:
+            result.extend(match_expression(expression, candidates))
+        elif kind == SUBTITLE:
+            result.extend(candidates)
+        else:
+            result.append(best_track(candidates))
+    return result
+
+
+def probe_segment_size(url, settings):
+    """分片的字节数，服务器不提供时返回 None"""
+    opener = build_opener(settings)
+    headers = request_headers(settings)
+    try:
+        request = urllib.request.Request(url, headers=headers, method="HEAD")
+        with opener.open(request, timeout=PROBE_TIMEOUT) as response:
+            length = response.headers.get("Content-Length")
+            if length and int(length) > 0:
+                return int(length)
+    except (OSError, ValueError):
+        pass
+    try:
+        # 有的 CDN 不支持 HEAD，取一个字节从 Content-Range 中读出总长度
+        request = urllib.request.Request(url, headers=dict(headers, Range="bytes=0-0"))
+        with opener.open(request, timeout=PROBE_TIMEOUT) as response:
+            total = response.headers.get("Content-Range", "").rpartition('/')[2]
+            return int(total) if total.isdigit() else None
+    except (OSError, ValueError):
+        return None
+
+
+def probe_track_bytes(track, settings, duration):
+    """抽样探测分片大小，按时长折算整条轨道的大小；无法探测时返回 0"""
+    if not track.url:
+        return 0
+    try:
+        media = load_manifest(settings, track.url)
+    except ManifestError:
+        return 0
+    segments = media.segments
+    if not segments:
+        return 0
+    step = max(1, len(segments) // PROBE_SAMPLES)
+    sampled_bytes = sampled_seconds = 0
+    for segment in segments[::step][:PROBE_SAMPLES]:
+        size = segment.length or probe_segment_size(segment.url, settings)
+        if size:
+            sampled_bytes += size
+            sampled_seconds += segment.duration
+    if not sampled_seconds:
+        return 0
+    return int(sampled_bytes / sampled_seconds * (duration or media.duration))
+
+
+def estimate_job(settings, history=None, manifest=None):
+    """读取清单并估算会下载的大小和耗时，清单无法读取时抛出 ManifestError"""
+    manifest = manifest or load_manifest(settings)
+    estimate = JobEstimate(manifest.url, manifest.duration, manifest.live)
+    for track in selected_tracks(manifest, settings):
+        size = track.estimated_bytes(manifest.duration)
+        source = "码率"
+        if not size and not manifest.live:
+            size = probe_track_bytes(track, settings, manifest.duration)
+            source = "探测" if size else "未知"
+        estimate.tracks.append(TrackEstimate(track, size, source))
+    if history is not None:
+        estimate.speed = history.speed(origin_of(settings.get("m3u8_url", "")))
+    limit = settings.get("limit_speed", 0)
+    if limit > 0:
+        estimate.speed = min(estimate.speed or float("inf"), limit * 1024)
+    return estimate
+
+
+def format_estimate(estimate):
+    """预估结果的说明文字（多行）"""
+    if estimate.live:
+        return ["直播流无法预估大小"]
+    lines = []
+    for item in estimate.tracks:
+        track = item.track
+        description = " ".join(part for part in (track.resolution, track.codecs, track.lang, track.name) if part)
+        size = f"{format_size(item.bytes)}（{item.source}）" if item.bytes else "未知"
+        lines.append(f"{KIND_NAMES[track.kind]} {description or track.id or '-'}：{size}")
+    total = f"合计约 {format_size(estimate.total_bytes)}，时长 {format_duration(estimate.duration)}"
+    if estimate.seconds is not None:
+        total += f"，按该源站以往速度 {format_size(estimate.speed)}/s 预计下载 {format_duration(estimate.seconds)}"
+    else:
+        total += "，该源站没有速度记录，无法预估耗时"
+    lines.append(total)
+    return lines
+
+
+def space_requirements(settings, total_bytes, free=None):
+    """[(目录, 需要的字节数, 可用字节数)]：分片写入临时目录，合并后的文件写入保存目录
+    
+    两者在同一文件系统上时，合并期间分片和成品同时存在，需要两倍空间。
+    free 为已查询到的剩余字节数列表（临时目录在前，同一文件系统时只有一项，见 DiskWatchdog.free_space），
+    不传时当场查询。
+    """
+    save_dir, tmp_dir = job_directories(settings)
+    need = int(total_bytes * SPACE_MARGIN)
+    merged = 0 if settings.get("no_merge") else need
+    if free is None:
+        save_path, tmp_path = existing_parent(save_dir), existing_parent(tmp_dir)
+        if os.stat(save_path).st_dev == os.stat(tmp_path).st_dev:
+            free = [shutil.disk_usage(save_path).free]
+        else:
+            free = [shutil.disk_usage(tmp_path).free, shutil.disk_usage(save_path).free]
+    if len(free) == 1:
+        return [(save_dir, need + merged, free[0])]
+    return [(tmp_dir, need, free[0]), (save_dir, merged, free[1])]
+
+
+def check_disk_space(settings, total_bytes, reserved=0, free=None):
+    """空间不足时返回问题说明列表；reserved 为其他任务预计还要占用的字节数，free 同 space_requirements"""
+    problems = []
+    if not total_bytes:
+        return problems
+    try:
+        requirements = space_requirements(settings, total_bytes, free)
+    except OSError:
+        return problems  # 无法检查时不阻止任务
+    for path, need, free in requirements:
+        if need and need + reserved > free:
+            problems.append(f"{path} 需要约 {format_size(need + reserved)}，可用 {format_size(free)}")
+    return problems
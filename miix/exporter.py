@@ -0,0 +1,88 @@
+"""Prometheus 文本格式的指标导出
+
+界面线程定时生成指标文本并交给 MetricsExporter，HTTP 线程只读取最近一次的文本，
+不会访问界面对象。
+"""
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_value(value):
+    if isinstance(value, float):
+        if value != value:
+            return "NaN"
+        return repr(value)
+    return str(value)
+
+
+def render_metrics(families):
+    """families: [(名称, 类型, 说明, [(标签字典, 数值), ...]), ...]"""
+    lines = []
+    for name, kind, help_text, samples in families:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            if labels:
+                label_text = ",".join(f'{key}="{escape_label(item)}"' for key, item in labels.items())
+                lines.append(f"{name}{{{label_text}}} {format_value(value)}")
+            else:
+                lines.append(f"{name} {format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.server.exporter.text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass  # 不输出访问日志
+
+
+class MetricsExporter:
+    """在本地端口上提供 /metrics"""
+    
+    def __init__(self, host="127.0.0.1", port=9464):
+        self.host = host
+        self.port = port
+        self.text = ""
+        self.server = None
+        self.thread = None
+    
+    @property
+    def running(self):
+        return self.server is not None
+    
+    def update(self, text):
+        self.text = text
+    
+    def start(self):
+        """启动HTTP服务，端口被占用等错误会抛出 OSError"""
+        if self.server is not None:
+            return
+        self.server = ThreadingHTTPServer((self.host, self.port), _MetricsHandler)
+        self.server.daemon_threads = True
+        self.server.exporter = self
+        self.thread = threading.Thread(target=self.server.serve_forever, name="metrics-exporter", daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = None
+        self.thread = None
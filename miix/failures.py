@@ -0,0 +1,96 @@
+"""失败分类和自动重试
+
+根据 N_m3u8DL-RE 最后输出的若干行判断失败原因。网络超时、服务器繁忙等临时故障按指数退避
+（带随机抖动）自动重试，并按原因调整线程数或请求超时；403/404、密钥错误、合并失败、
+磁盘已满、找不到外部程序和下载程序无法启动等重试也不会成功的故障不再重试。
+"""
+import random
+import re
+from collections import namedtuple
+
+# 保留每个任务最后输出的行数，用于判断失败原因
+TAIL_LINES = 40
+# 退避的基础等待和最长等待（秒）
+BACKOFF_BASE = 10
+BACKOFF_MAX = 600
+# 自动调整的上下限
+MIN_THREADS = 1
+MAX_TIMEOUT = 300
+
+# transient: 是否值得重试；adjust(settings) 返回重试前修改的设置项
+FailureClass = namedtuple("FailureClass", "name label transient pattern adjust")
+
+
+def _fewer_threads(settings):
+    threads = settings.get("max_threads", 32)
+    return {"max_threads": max(MIN_THREADS, threads // 2)}
+
+
+def _longer_timeout(settings):
+    timeout = settings.get("timeout", 100)
+    return {"timeout": min(MAX_TIMEOUT, int(timeout * 1.5)), **_fewer_threads(settings)}
+
+
+def _no_adjustment(settings):
+    return {}
+
+
+# N_m3u8DL-RE 报告 HTTP 错误的写法：HttpClient 的 "status code does not indicate success: 403 (Forbidden)"、
+# "HTTP 403"、"StatusCode: 403"，只匹配这些写法，避免把大小、分片数等普通数字当成状态码
+def _status_pattern(codes):
+    return (rf"(status ?code( does not indicate success)?|\bHTTP(/[\d.]+)?)[:\s]+({codes})\b|"
+            rf"\b({codes}) \([A-Za-z ]+\)")
+
+
+# 按顺序匹配，先匹配到的优先
+FAILURE_CLASSES = (
+    FailureClass("disk_full", "磁盘空间不足", False,
+                 re.compile(r"no space left|not enough space|disk (is )?full|磁盘空间不足", re.IGNORECASE),
+                 _no_adjustment),
+    FailureClass("missing_tool", "找不到外部程序", False,
+                 re.compile(r"\b(ffmpeg|mp4decrypt|shaka-packager|mkvmerge)(\.exe)? (was )?not found|"
+                            r"找不到 ?(ffmpeg|mp4decrypt|shaka-packager|mkvmerge)", re.IGNORECASE),
+                 _no_adjustment),
+    FailureClass("http_403", "HTTP 403 拒绝访问", False,
+                 re.compile(_status_pattern("401|403"), re.IGNORECASE), _no_adjustment),
+    FailureClass("http_404", "HTTP 404 不存在", False,
+                 re.compile(_status_pattern("404|410"), re.IGNORECASE), _no_adjustment),
+    FailureClass("key_error", "密钥/解密错误", False,
+                 re.compile(r"decrypt(ion)? (error|failed)|failed to decrypt|invalid key|"
+                            r"(get|load|download)\w* key (error|failed)|解密失败|密钥(错误|无效|获取失败)",
+                            re.IGNORECASE), _no_adjustment),
+    FailureClass("mux_error", "合并失败", False,
+                 re.compile(r"mux(ing)? (error|failed)|merge failed|合并失败|混流失败", re.IGNORECASE),
+                 _no_adjustment),
+    FailureClass("rate_limited", "服务器限流/繁忙", True,
+                 re.compile(_status_pattern("429|500|502|503|504") +
+                            r"|too many requests|service unavailable|bad gateway", re.IGNORECASE), _fewer_threads),
+    FailureClass("timeout", "请求超时", True,
+                 re.compile(r"timed? ?out|timeout|TaskCanceled|operation was canceled|超时", re.IGNORECASE),
+                 _longer_timeout),
+    FailureClass("network", "网络错误", True,
+                 re.compile(r"connection (reset|refused|closed)|SocketException|HttpRequestException|"
+                            r"name (or service )?not known|no such host|network|连接", re.IGNORECASE),
+                 _fewer_threads),
+)
+# 没有匹配到已知原因时也重试，但不调整设置
+UNKNOWN = FailureClass("unknown", "未知错误", True, None, _no_adjustment)
+# DownloadProcess.run() 无法启动程序或读取输出时返回的退出代码；程序路径或参数有误，重试也不会成功
+LAUNCH_ERROR = -2
+LAUNCH_FAILED = FailureClass("launch_failed", "无法启动下载程序", False, None, _no_adjustment)
+
+
+def classify_failure(lines, exit_code=None):
+    """从最后一行往前查找，返回匹配的 FailureClass"""
+    if exit_code == LAUNCH_ERROR:
+        return LAUNCH_FAILED
+    for line in reversed(list(lines)):
+        for failure in FAILURE_CLASSES:
+            if failure.pattern.search(line):
+                return failure
+    return UNKNOWN
+
+
+def backoff_delay(attempt, base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """第 attempt 次重试（从 1 开始）前的等待时间：指数增长，乘以 0.5~1.5 的随机抖动"""
+    return min(cap, base * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
@@ -0,0 +1,210 @@
+"""命令行（无界面）模式：读取设置 JSON 和地址列表，用同一个队列调度器下载
+
+    python -m miix --settings settings.json --urls list.txt
+    python "Miix GUI M3u8 Downloader.py" --headless --settings settings.json URL [URL ...]
+
+不导入 PyQt5，适合在服务器上运行。所有任务结束后退出，有任务失败时退出代码为 1。
+指定 --api-port 时启动本地控制接口并常驻运行，直到按 Ctrl+C。
+"""
+import argparse
+import os
+import queue
+import sys
+
+from .api import ControlServer, JobController, run_call
+from .batch import detect_import_format, iter_import_rows, merge_import_row
+from .command import build_command_from_settings, resolve_work_dir
+from .diskwatch import DiskWatchdog
+from .estimate import check_disk_space, estimate_job, format_estimate
+from .jobs import DownloadJob, JobScheduler
+from .metrics import ThroughputHistory
+from .profiles import ProfileStore
+from .resume import JobJournal, restore_jobs
+from .settings import DEFAULT_SETTINGS, LAST_SETTINGS_PATH, SettingsStore, load_settings_file
+from .supervisor import Supervisor
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="miix", description="N_m3u8DL-RE GUI Miix 命令行模式")
+    parser.add_argument("urls", nargs="*", help="要下载的地址")
+    parser.add_argument("--settings", help=f"设置文件，默认使用上次的设置 {LAST_SETTINGS_PATH}")
+    parser.add_argument("--profile", help="使用的命名配置；地址列表中的 profile 列可为每行单独指定")
+    parser.add_argument("--urls", dest="url_file", help="地址列表文件（文本/CSV/JSON/JSON Lines），- 表示标准输入")
+    parser.add_argument("--resume", action="store_true",
+                        help="恢复上次未完成的任务（跳过已下载的分片），并记录本次任务以便下次恢复")
+    parser.add_argument("--preflight", action="store_true",
+                        help="加入队列前读取清单预估大小和耗时，磁盘空间不足的任务不加入（按整批累计）")
+    parser.add_argument("--concurrency", type=int, help="同时下载数，默认使用设置中的值")
+    parser.add_argument("--auto-retry", type=int, help="临时故障自动重试的次数，0 为不重试，默认使用设置中的值")
+    parser.add_argument("--thread-budget", type=int, help="全局线程预算，0 为不限")
+    parser.add_argument("--speed-budget", type=int, help="全局限速预算（kb/s），0 为不限")
+    parser.add_argument("--api-host", default="127.0.0.1", help="控制接口监听地址")
+    parser.add_argument("--api-port", type=int, help="启用控制接口并监听该端口")
+    parser.add_argument("--api-token", default="", help="控制接口的访问令牌（Authorization: Bearer），不指定时随机生成")
+    return parser
+
+
+def load_template(path):
+    if path:
+        return load_settings_file(path)
+    store = SettingsStore()
+    if store.exists():
+        return store.load()
+    return dict(DEFAULT_SETTINGS)
+
+
+def read_url_rows(url_file):
+    if url_file == "-":
+        text = sys.stdin.read()
+        yield from iter_import_rows(text.splitlines(True), detect_import_format(None, text[:4096]))
+        return
+    with open(url_file, 'r', encoding='utf-8-sig', errors='replace', newline='') as stream:
+        sample = stream.read(4096)
+        stream.seek(0)
+        yield from iter_import_rows(stream, detect_import_format(url_file, sample))
+
+
+def preflight(settings, history, reserved):
+    """预估任务大小并检查磁盘空间，返回预估的字节数；空间不足时返回 None，无法预估时返回 0"""
+    url = settings.get("m3u8_url")
+    try:
+        estimate = estimate_job(settings, history)
+    except Exception as e:
+        print(f"预估失败，不检查磁盘空间：{url}：{str(e)}", file=sys.stderr, flush=True)
+        return 0
+    for line in format_estimate(estimate):
+        print(f"[预估] {url}：{line}", flush=True)
+    problems = check_disk_space(settings, estimate.total_bytes, reserved)
+    if problems:
+        print(f"磁盘空间不足，不加入队列：{url}：{'；'.join(problems)}", file=sys.stderr, flush=True)
+        return None
+    return estimate.total_bytes
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        template = load_template(args.settings)
+    except Exception as e:
+        print(f"加载设置时出错：{str(e)}", file=sys.stderr)
+        return 2
+    if not os.path.exists(template.get("executable", "")):
+        print(f"执行程序不存在：{template.get('executable', '')}", file=sys.stderr)
+        return 2
+    
+    events = queue.Queue()
+    control = None
+    
+    def listener(event, *event_args):
+        if event == "job_log":
+            print(f"[#{event_args[0]}] {event_args[1]}", flush=True)
+        if control is not None:
+            control.controller.on_event(event, *event_args)
+    
+    supervisor = Supervisor(lambda batch: events.put(("batch", batch)))
+    scheduler = JobScheduler(
+        lambda job, cmd: supervisor.runner(job.job_id, cmd, job.work_dir),
+        listener,
+        max_concurrent=args.concurrency or template.get("max_concurrent_jobs", 2),
+    )
+    scheduler.profile_resolver = ProfileStore().resolve
+    scheduler.throughput = ThroughputHistory()
+    scheduler.disk_watchdog = DiskWatchdog(scheduler)
+    scheduler.proxy_provider = supervisor.proxy_url
+    scheduler.set_auto_retry(template.get("auto_retry_count", 3) if args.auto_retry is None else args.auto_retry)
+    scheduler.set_rebalance_restart(template.get("rebalance_restart", False))
+    thread_budget = template.get("global_thread_budget", 0) if args.thread_budget is None else args.thread_budget
+    speed_budget = template.get("global_speed_budget", 0) if args.speed_budget is None else args.speed_budget
+    scheduler.set_budget(thread_budget, speed_budget)
+    
+    rows = [{"m3u8_url": url} for url in args.urls]
+    if not rows and not args.url_file and template.get("m3u8_url"):
+        rows = [{"m3u8_url": template["m3u8_url"]}]  # 只给了设置文件时下载其中的地址
+    seen = set()
+    # 预估时本批已接受任务的总大小，依次扣除可用空间
+    reserved = 0
+    refused = 0
+    try:
+        if args.resume:
+            scheduler.journal = JobJournal()
+            for job, count, size in restore_jobs(scheduler, scheduler.journal.load(), queue_all=True):
+                seen.add(job.settings.get("m3u8_url"))
+                print(f"[#{job.job_id}] 已恢复：{job.title}，已有 {count} 个分片（{size / 1024 / 1024:.1f} MB）",
+                      flush=True)
+        for row in rows + (list(read_url_rows(args.url_file)) if args.url_file else []):
+            row = dict(row)
+            profile = row.pop("profile", None) or args.profile
+            if profile:
+                settings = scheduler.resolve_profile(profile, row)
+            else:
+                settings = merge_import_row(template, row)
+            url = settings.get("m3u8_url")
+            if not url or url in seen:
+                continue
+            seen.add(url)
+            estimated = None
+            if args.preflight:
+                estimated = preflight(settings, scheduler.throughput, reserved)
+                if estimated is None:
+                    refused += 1
+                    continue
+                reserved += estimated
+            if profile:
+                job = scheduler.add_profile_job(profile, row, estimated_bytes=estimated)
+            else:
+                job = scheduler.add_job(settings, build_command_from_settings(settings), resolve_work_dir(settings),
+                                        estimated_bytes=estimated)
+            print(f"[#{job.job_id}] 已加入队列：{job.title}", flush=True)
+    except Exception as e:
+        print(f"读取地址列表时出错：{str(e)}", file=sys.stderr)
+        scheduler.stop_all()
+        return 2
+    if args.api_port:
+        control = ControlServer(
+            JobController(scheduler, lambda: template),
+            lambda fn, future: events.put(("call", fn, future)),
+            args.api_host, args.api_port, args.api_token,
+        )
+        try:
+            control.start()
+        except OSError as e:
+            print(f"控制接口启动失败：{str(e)}", file=sys.stderr)
+            scheduler.stop_all()
+            return 2
+        print(f"控制接口已启动：http://{control.host}:{control.port}/jobs", flush=True)
+        if control.generated_token:
+            print(f"控制接口访问令牌：{control.token}", flush=True)
+    elif not seen:
+        print("没有要下载的地址", file=sys.stderr)
+        return 2
+    
+    while scheduler.has_active_jobs() or control is not None:
+        try:
+            try:
+                event = events.get(timeout=0.5)
+                if event[0] == "call":
+                    run_call(event[1], event[2])
+                else:
+                    for item in event[1]:
+                        scheduler.dispatch(item)
+            except queue.Empty:
+                pass
+            scheduler.tick()
+        except KeyboardInterrupt:
+            # 第一次 Ctrl+C 停止所有任务并等待子进程退出
+            print("正在停止下载...", file=sys.stderr, flush=True)
+            if control is not None:
+                control.stop()
+                control = None
+            scheduler.stop_all()
+    
+    if supervisor.proxy_hub is not None:
+        for line in supervisor.proxy_hub.summary() + supervisor.proxy_hub.origin_lines():
+            print(line, flush=True)
+    supervisor.shutdown()
+    if scheduler.journal is not None:
+        scheduler.journal.flush_if_due(scheduler.jobs.values(), force=True)
+    failed = [job for job in scheduler.jobs.values() if job.status != DownloadJob.DONE]
+    print(f"全部结束：完成 {len(scheduler.jobs) - len(failed)} 个，未完成 {len(failed)} 个"
+          + (f"，因磁盘空间不足未加入 {refused} 个" if refused else ""), flush=True)
+    return 1 if failed or refused else 0
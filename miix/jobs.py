@@ -0,0 +1,676 @@
+"""下载任务队列和调度
+
+JobScheduler 只在一个线程中使用（界面线程或命令行模式的主线程）。子进程由监督器
+（supervisor.Supervisor）在一个事件循环线程中统一读取，事件成批交回调度器所在的线程，
+再由 dispatch() 分发到 handle_* 方法。调度器的状态变化通过 listener(事件名, *参数) 通知出去：
+    
+    job_added / job_removed / job_updated / job_started (任务ID)
+    job_log (任务ID, 文本)
+    job_progress (任务ID, 百分比)
+    job_progress_record (任务ID, ProgressRecord)
+    job_finished (任务ID, 退出代码)
+    command_ready (任务ID, 命令)
+"""
+import asyncio
+import codecs
+import re
+import threading
+import time
+from collections import deque
+
+from .batch import merge_import_row
+from .budget import ResourceBudget, apply_budget
+from .command import build_command_from_settings, resolve_work_dir
+from .failures import LAUNCH_ERROR, TAIL_LINES, backoff_delay, classify_failure
+from .metrics import ResourceSeries, format_resource_summary, is_retry_line, origin_of
+from .procstats import read_tree_usage
+from .proctree import format_report, popen_group_options, suspend_tree, terminate_tree
+from .progress import overall_percent, parse_progress_line, strip_ansi
+from .resume import pin_save_name
+
+# 每次从管道读取的字节数
+READ_SIZE = 64 * 1024
+LINE_BREAK_RE = re.compile(r"\r\n|\r|\n")
+
+
+class ProcessHandle:
+    """asyncio 子进程的 Popen 风格包装，供 proctree 在其他线程中停止/暂停进程树"""
+    
+    def __init__(self, process, args):
+        self.process = process
+        self.args = args
+        self.pid = process.pid
+    
+    def poll(self):
+        return self.process.returncode
+    
+    def send_signal(self, sig):
+        self.process.send_signal(sig)
+
+
+class DownloadProcess:
+    """一个 N_m3u8DL-RE 子进程：在监督器的事件循环中运行 run()，按行解析输出"""
+    
+    def __init__(self, cmd, work_dir, on_log=None, on_progress=None, on_retry=None):
+        self.cmd = cmd
+        self.work_dir = work_dir
+        self.on_log = on_log
+        self.on_progress = on_progress
+        self.on_retry = on_retry
+        self.process = None
+        self.is_running = True
+        self.last_records = {}
+        # 子进程最后输出的若干行（不含进度行），用于判断失败原因
+        self.tail = deque(maxlen=TAIL_LINES)
+        # 子进程树的 CPU/内存/磁盘读写，由监督器每秒采样
+        self.resources = ResourceSeries()
+        # 停止时在后台线程中结束整个进程树
+        self.stop_lock = threading.Lock()
+        self.stopper = None
+        self.stop_report = None
+    
+    def log(self, text):
+        if self.on_log:
+            self.on_log(text)
+    
+    async def run(self):
+        """返回退出代码，用户停止为 -1，启动或读取出错为 -2"""
+        try:
+            self.log(f"执行命令：{' '.join(self.cmd)}")
+            
+            process = await asyncio.create_subprocess_exec(
+                *self.cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                cwd=self.work_dir,
+                **popen_group_options()
+            )
+            self.process = ProcessHandle(process, self.cmd)
+            if not self.is_running:
+                self.start_stopper()  # 启动前已请求停止
+            
+            # 每次读取一大块，增量解码并切分成行（进度行以 \r 结尾）
+            decoder = codecs.getincrementaldecoder("utf-8")("replace")
+            pending = ""
+            while True:
+                chunk = await process.stdout.read(READ_SIZE)
+                if not chunk:
+                    break
+                lines = LINE_BREAK_RE.split(pending + decoder.decode(chunk))
+                pending = lines.pop()
+                for line in lines:
+                    self.feed_line(line)
+            self.feed_line(pending + decoder.decode(b"", final=True))
+            
+            exit_code = await process.wait()
+            if self.is_running:
+                return exit_code
+            # 用户中断，等待整个进程树结束
+            self.start_stopper()
+            await asyncio.get_running_loop().run_in_executor(None, self.stopper.join)
+            return -1
+        except Exception as e:
+            self.log(f"下载进程错误：{str(e)}")
+            return LAUNCH_ERROR
+    
+    def feed_line(self, line):
+        if not self.is_running:
+            return  # 停止后不再处理剩余输出
+        line = strip_ansi(line).strip()
+        if not line:
+            return
+        self.log(line)
+        if "%" in line:
+            record = parse_progress_line(line)
+            self.handle_progress(record)
+            if record is None:
+                self.tail.append(line)
+        else:
+            self.tail.append(line)
+            if is_retry_line(line) and self.on_retry:
+                self.on_retry()
+    
+    def sample_resources(self, now):
+        """采样一次整个进程树的资源占用（在线程池中调用）"""
+        process = self.process
+        if process is None or process.poll() is not None:
+            return
+        usage = read_tree_usage(process.pid)
+        if usage is not None and usage.processes:
+            self.resources.add(now, usage)
+    
+    def handle_progress(self, record):
+        """同一轨道的进度有变化时才通知"""
+        if record is None or self.on_progress is None:
+            return
+        last = self.last_records.get(record.track)
+        if last is None or (last.percent, last.downloaded_bytes, last.speed) != (
+                record.percent, record.downloaded_bytes, record.speed):
+            self.last_records[record.track] = record
+            self.on_progress(record)
+    
+    def pause(self):
+        """暂停整个进程树，返回涉及的进程数"""
+        return suspend_tree(self.process)
+    
+    def resume(self):
+        return suspend_tree(self.process, suspend=False)
+    
+    def stop(self):
+        """请求停止，不阻塞调用者（界面线程）"""
+        self.is_running = False
+        self.start_stopper()
+    
+    def start_stopper(self):
+        with self.stop_lock:
+            if self.stopper is not None or self.process is None:
+                return
+            self.stopper = threading.Thread(target=self.stop_tree, name="stop-tree", daemon=True)
+            self.stopper.start()
+    
+    def stop_tree(self):
+        try:
+            self.stop_report = terminate_tree(self.process)
+            self.log(f"已停止进程树：{format_report(self.stop_report)}")
+        except Exception as e:
+            self.log(f"停止进程时出错：{str(e)}")
+
+
+class DownloadJob:
+    """下载任务（一次设置快照对应一个任务）"""
+    QUEUED = "排队中"
+    RUNNING = "下载中"
+    PAUSED = "已暂停"
+    DONE = "已完成"
+    FAILED = "失败"
+    STOPPED = "已停止"
+    RETRY_WAIT = "等待重试"
+    
+    def __init__(self, job_id, settings, cmd, work_dir):
+        self.job_id = job_id
+        self.settings = settings
+        self.cmd = cmd
+        self.work_dir = work_dir
+        self.status = DownloadJob.QUEUED
+        self.progress = 0
+        self.exit_code = None
+        self.attempts = 0
+        self.runner = None
+        # 实际使用的线程数和限速（受全局预算约束）
+        self.allocation = None
+        self.started_at = 0
+        self.restart_pending = False
+        # 各轨道最新的进度记录
+        self.tracks = {}
+        # 累计的重试次数（跨多次启动）
+        self.retries = 0
+        # 引用的命名配置和任务自己的设置覆盖，启动时按配置的最新内容重新生成设置
+        self.profile = None
+        self.overrides = None
+        # 自动重试：已重试次数、最近一次失败原因、计划重试的时间（time.monotonic）
+        self.auto_retries = 0
+        self.failure = None
+        self.retry_at = None
+        # 最近一次运行的资源占用汇总（metrics.ResourceSeries.summary()）
+        self.resource_summary = None
+        # 下载前预估的大小（字节），启动前据此检查磁盘空间
+        self.estimated_bytes = None
+    
+    @property
+    def demand(self):
+        """任务自身设置的线程数和限速"""
+        return (self.settings.get("max_threads", 32), self.settings.get("limit_speed", 0))
+    
+    @property
+    def title(self):
+        return self.settings.get("title") or self.settings.get("m3u8_url", "")
+    
+    def is_active(self):
+        """下载中或已暂停（暂停的任务仍占用同时下载名额）"""
+        return self.status in (DownloadJob.RUNNING, DownloadJob.PAUSED)
+    
+    @property
+    def speed(self):
+        speeds = [record.speed for record in self.tracks.values() if record.speed is not None]
+        return sum(speeds) if speeds else None
+    
+    @property
+    def eta(self):
+        etas = [record.eta for record in self.tracks.values() if record.eta is not None]
+        return max(etas) if etas else None
+
+
+class JobScheduler:
+    """下载队列调度器：最多同时运行 max_concurrent 个 N_m3u8DL-RE 进程
+    
+    runner_factory(job, cmd) 返回尚未启动的运行器，需提供 start()/stop()/pause()/resume()/wait()、
+    process、tail（子进程最后输出的若干行）和 resources（metrics.ResourceSeries）。
+    profile_resolver(配置名) 返回命名配置的完整设置，供引用配置的任务使用。
+    """
+    
+    # 预算变化超过该比例才重启任务，且任务至少运行这么久才会被重启
+    REBALANCE_THRESHOLD = 0.25
+    REBALANCE_MIN_RUNTIME = 15
+    # 任务集中开始/结束时合并成一次重新分配
+    REBALANCE_DELAY = 2.0
+    
+    def __init__(self, runner_factory, listener=None, max_concurrent=2):
+        self.runner_factory = runner_factory
+        self.listener = listener
+        self.max_concurrent = max_concurrent
+        self.jobs = {}
+        self.queue = []
+        self.next_job_id = 1
+        self.budget = ResourceBudget()
+        self.rebalance_restart = False
+        self.rebalance_at = None
+        self.profile_resolver = None
+        # 未完成任务的记录（resume.JobJournal），用于重新启动后恢复
+        self.journal = None
+        # 临时故障自动重试的次数，0 为不自动重试
+        self.auto_retry_limit = 0
+        # 各源站的历史下载速度（estimate.ThroughputHistory），完成的任务记入其中
+        self.throughput = None
+        # 磁盘空间监视（diskwatch.DiskWatchdog），在 tick() 中检查
+        self.disk_watchdog = None
+        # 经本机代理转发或启用分片缓存的任务使用的本地代理地址 func(设置)，见 Supervisor.proxy_url
+        self.proxy_provider = None
+    
+    def emit(self, event, *args):
+        if self.journal is not None and event in ("job_added", "job_removed", "job_updated"):
+            self.journal.mark_dirty()
+        if self.listener is not None:
+            self.listener(event, *args)
+    
+    def tick(self, now=None):
+        """由宿主定时调用，处理到期的重新分配"""
+        now = time.monotonic() if now is None else now
+        if self.journal is not None:
+            self.journal.flush_if_due(self.jobs.values())
+        if self.disk_watchdog is not None:
+            self.disk_watchdog.poll(now)
+        for job in list(self.jobs.values()):
+            if job.retry_at is not None and now >= job.retry_at:
+                self._auto_retry(job)
+        if self.rebalance_at is not None and now >= self.rebalance_at:
+            self.rebalance_at = None
+            self.rebalance()
+    
+    def request_rebalance(self, delay=None):
+        delay = self.REBALANCE_DELAY if delay is None else delay
+        self.rebalance_at = time.monotonic() + delay
+    
+    def set_max_concurrent(self, value):
+        self.max_concurrent = max(1, int(value))
+        self.schedule()
+    
+    def set_budget(self, total_threads, total_speed):
+        self.budget.total_threads = total_threads
+        self.budget.total_speed = total_speed
+        self.request_rebalance()
+    
+    def set_rebalance_restart(self, enabled):
+        self.rebalance_restart = bool(enabled)
+        self.request_rebalance()
+    
+    def running_jobs(self):
+        return [job for job in self.jobs.values() if job.is_active()]
+    
+    def has_active_jobs(self):
+        return bool(self.queue) or bool(self.running_jobs()) or \
+            any(job.status == DownloadJob.RETRY_WAIT for job in self.jobs.values())
+    
+    def active_titles(self):
+        """排队中、下载中和等待重试的任务使用的保存名称"""
+        return {job.settings.get("title") for job in self.jobs.values()
+                if job.is_active() or job.status in (DownloadJob.QUEUED, DownloadJob.RETRY_WAIT)}
+    
+    def set_auto_retry(self, limit):
+        self.auto_retry_limit = max(0, int(limit))
+    
+    def add_job(self, settings, cmd, work_dir, profile=None, overrides=None, queued=True, estimated_bytes=None):
+        """加入队列，有空闲名额时立即开始；queued 为 False 时加入为已停止"""
+        if not settings.get("title"):
+            # 固定保存名称，停止或重新启动后可以接着已下载的分片继续
+            settings = pin_save_name(settings, self.active_titles())
+            cmd = build_command_from_settings(settings)
+        job = DownloadJob(self.next_job_id, settings, cmd, work_dir)
+        job.profile = profile
+        job.overrides = overrides
+        job.estimated_bytes = estimated_bytes
+        self.next_job_id += 1
+        self.jobs[job.job_id] = job
+        if queued:
+            self.queue.append(job.job_id)
+        else:
+            job.status = DownloadJob.STOPPED
+        self.emit("job_added", job.job_id)
+        self.schedule()
+        return job
+    
+    def resolve_profile(self, profile, overrides):
+        """命名配置叠加任务自己的设置覆盖，配置不存在时抛出异常"""
+        if self.profile_resolver is None:
+            raise ValueError("没有可用的配置存储")
+        return merge_import_row(self.profile_resolver(profile), overrides)
+    
+    def add_profile_job(self, profile, overrides, estimated_bytes=None):
+        """加入引用命名配置的任务，任务只保存配置名和自己的设置覆盖"""
+        settings = self.resolve_profile(profile, overrides)
+        if not settings.get("title"):
+            settings = pin_save_name(settings, self.active_titles())
+            overrides = dict(overrides, title=settings["title"])
+        return self.add_job(settings, build_command_from_settings(settings), resolve_work_dir(settings),
+                            profile, dict(overrides), estimated_bytes=estimated_bytes)
+    
+    def start_job(self, job_id):
+        """把任务移到队首，有空闲名额时立即开始"""
+        job = self.jobs.get(job_id)
+        if job and job.status == DownloadJob.PAUSED:
+            self.resume_job(job_id)
+            return
+        if not job or job.is_active():
+            return
+        if job_id in self.queue:
+            self.queue.remove(job_id)
+        self._reset_job(job)
+        self.queue.insert(0, job_id)
+        self.emit("job_updated", job_id)
+        self.schedule()
+    
+    def stop_job(self, job_id):
+        job = self.jobs.get(job_id)
+        if not job:
+            return
+        job.restart_pending = False
+        if job_id in self.queue or job.status == DownloadJob.RETRY_WAIT:
+            if job_id in self.queue:
+                self.queue.remove(job_id)
+            job.retry_at = None
+            job.status = DownloadJob.STOPPED
+            self.emit("job_updated", job_id)
+        elif job.is_active() and job.runner:
+            job.runner.stop()
+    
+    def pause_job(self, job_id):
+        """暂停正在下载的任务（挂起整个进程树），已下载的分片保留在临时目录"""
+        job = self.jobs.get(job_id)
+        if not job or job.status != DownloadJob.RUNNING or job.runner is None or job.restart_pending:
+            return
+        try:
+            count = job.runner.pause()
+        except Exception as e:
+            self.emit("job_log", job_id, f"暂停失败：{str(e)}")
+            return
+        job.status = DownloadJob.PAUSED
+        self.emit("job_log", job_id, f"已暂停（{count} 个进程）")
+        self.emit("job_updated", job_id)
+    
+    def resume_job(self, job_id):
+        job = self.jobs.get(job_id)
+        if not job or job.status != DownloadJob.PAUSED:
+            return
+        try:
+            job.runner.resume()
+        except Exception as e:
+            self.emit("job_log", job_id, f"继续失败：{str(e)}")
+            return
+        job.status = DownloadJob.RUNNING
+        self.emit("job_log", job_id, "已继续")
+        self.emit("job_updated", job_id)
+    
+    def retry_job(self, job_id):
+        """失败或已停止的任务重新排队"""
+        job = self.jobs.get(job_id)
+        if not job or job.is_active() or job_id in self.queue:
+            return
+        self._reset_job(job)
+        self.queue.append(job_id)
+        self.emit("job_updated", job_id)
+        self.schedule()
+    
+    def remove_job(self, job_id):
+        job = self.jobs.get(job_id)
+        if not job or job.is_active():
+            return
+        if job_id in self.queue:
+            self.queue.remove(job_id)
+        del self.jobs[job_id]
+        self.emit("job_removed", job_id)
+    
+    def stop_all(self):
+        for job in list(self.jobs.values()):
+            if job.status == DownloadJob.RETRY_WAIT:
+                self.stop_job(job.job_id)
+        for job_id in list(self.queue):
+            self.stop_job(job_id)
+        for job in self.running_jobs():
+            self.stop_job(job.job_id)
+    
+    def schedule(self):
+        """按队列顺序填满空闲名额，所在磁盘空间不足的任务留在队列中
+        
+        有磁盘监视时，有预估大小的任务要等到监视器查询过所在磁盘后才启动，
+        启动前的空间检查使用查询结果，不在调度器线程中访问磁盘。
+        """
+        watchdog = self.disk_watchdog
+        for job_id in list(self.queue):
+            if len(self.running_jobs()) >= self.max_concurrent:
+                break
+            job = self.jobs[job_id]
+            free = None
+            if watchdog is not None:
+                if watchdog.is_blocked(job):
+                    continue
+                if job.estimated_bytes:
+                    free = watchdog.free_space(job)
+                    if free is None:
+                        continue
+            self.queue.remove(job_id)
+            if self._check_disk_space(job, free):
+                self._launch(job)
+    
+    def _check_disk_space(self, job, free=None):
+        """有预估大小的任务启动前检查磁盘空间，扣除其他运行中任务预计还要写入的部分"""
+        if not job.estimated_bytes:
+            return True
+        from .estimate import check_disk_space
+        reserved = 0
+        for running in self.running_jobs():
+            if running.estimated_bytes:
+                downloaded = sum(record.downloaded_bytes or 0 for record in running.tracks.values())
+                reserved += max(0, running.estimated_bytes - downloaded)
+        problems = check_disk_space(job.settings, job.estimated_bytes, reserved, free)
+        if not problems:
+            return True
+        job.status = DownloadJob.FAILED
+        job.failure = "磁盘空间不足"
+        self.emit("job_log", job.job_id, f"磁盘空间不足，未开始下载：{'；'.join(problems)}")
+        self.emit("job_updated", job.job_id)
+        return False
+    
+    def _reset_job(self, job):
+        job.retry_at = None
+        job.status = DownloadJob.QUEUED
+        job.progress = 0
+        job.exit_code = None
+        job.tracks = {}
+    
+    def _launch(self, job):
+        if job.runner is not None:
+            job.runner.wait()  # 重试前确保上一次的线程已退出
+        job.status = DownloadJob.RUNNING
+        job.attempts += 1
+        job.started_at = time.monotonic()
+        if job.profile:
+            # 排队期间配置可能被修改，按最新内容生成命令
+            try:
+                job.settings = self.resolve_profile(job.profile, job.overrides)
+                job.cmd = build_command_from_settings(job.settings)
+                job.work_dir = resolve_work_dir(job.settings)
+            except Exception as e:
+                self.emit("job_log", job.job_id, f"读取配置 {job.profile} 时出错，使用加入队列时的设置：{str(e)}")
+        cmd = job.cmd
+        if self.budget.is_enabled():
+            demands = {running.job_id: running.demand for running in self.running_jobs()}
+            job.allocation = self.budget.allocate(demands)[job.job_id]
+            cmd = apply_budget(job.cmd, *job.allocation)
+        else:
+            job.allocation = job.demand
+        if self.proxy_provider is not None and (job.settings.get("local_proxy_enabled")
+                                                or job.settings.get("segment_cache_enabled")):
+            from .proxy import set_custom_proxy
+            try:
+                cmd = set_custom_proxy(cmd, self.proxy_provider(job.settings))
+            except (OSError, ValueError) as e:
+                self.emit("job_log", job.job_id, f"无法使用本地代理，直接下载：{str(e)}")
+            else:
+                if (job.attempts == 1 and job.settings.get("segment_cache_enabled")
+                        and job.settings.get("m3u8_url", "").lower().startswith("https://")):
+                    # 代理只能转发 HTTPS 隧道，看不到其中的分片
+                    self.emit("job_log", job.job_id, "注意：HTTPS 地址的分片经隧道转发，不会被缓存")
+        job.runner = self.runner_factory(job, cmd)
+        self.emit("job_updated", job.job_id)
+        self.emit("job_started", job.job_id)
+        self.emit("command_ready", job.job_id, ' '.join(cmd))
+        job.runner.start()
+        self.request_rebalance()
+    
+    def dispatch(self, event):
+        """处理监督器交回的事件：("log"|"progress"|"retry"|"exit", 任务ID, ...)"""
+        kind, job_id = event[0], event[1]
+        if kind == "log":
+            self.handle_log(job_id, event[2])
+        elif kind == "progress":
+            self.handle_progress_record(job_id, event[2])
+        elif kind == "retry":
+            self.handle_retry(job_id)
+        elif kind == "exit":
+            self.handle_exit(job_id, event[2])
+    
+    def handle_log(self, job_id, text):
+        self.emit("job_log", job_id, text)
+    
+    def handle_retry(self, job_id):
+        job = self.jobs.get(job_id)
+        if job:
+            job.retries += 1
+    
+    def handle_progress_record(self, job_id, record):
+        job = self.jobs.get(job_id)
+        if job:
+            job.tracks[record.track] = record
+            self.emit("job_progress_record", job_id, record)
+            # 多轨道并发下载时按字节加权计算总进度
+            progress = int(overall_percent(job.tracks.values()))
+            if progress != job.progress:
+                job.progress = progress
+                self.emit("job_progress", job_id, progress)
+    
+    def handle_exit(self, job_id, exit_code):
+        job = self.jobs.get(job_id)
+        if job and job.restart_pending:
+            # 因预算调整而重启：回到队首，用新的分配重新启动
+            job.restart_pending = False
+            job.status = DownloadJob.QUEUED
+            self.queue.insert(0, job_id)
+            self.emit("job_updated", job_id)
+            self.schedule()
+            return
+        if job:
+            job.exit_code = exit_code
+            job.resource_summary = job.runner.resources.summary() if job.runner is not None else None
+            if job.resource_summary:
+                self.emit("job_log", job_id, f"资源占用：{format_resource_summary(job.resource_summary)}")
+            if exit_code == 0:
+                job.status = DownloadJob.DONE
+                job.progress = 100
+                self._record_throughput(job)
+            elif exit_code == -1:
+                job.status = DownloadJob.STOPPED
+            else:
+                job.status = DownloadJob.FAILED
+                self._plan_retry(job)
+            self.emit("job_updated", job_id)
+            self.emit("job_finished", job_id, exit_code)
+        self.schedule()
+        self.request_rebalance()
+    
+    def _record_throughput(self, job):
+        if self.throughput is None:
+            return
+        total = sum(record.total_bytes or record.downloaded_bytes or 0 for record in job.tracks.values())
+        self.throughput.record(origin_of(job.settings.get("m3u8_url", "")), total, time.monotonic() - job.started_at)
+    
+    def _plan_retry(self, job):
+        """按失败原因决定是否自动重试，需要重试时进入等待状态"""
+        failure = classify_failure(job.runner.tail if job.runner is not None else (), job.exit_code)
+        job.failure = failure.label
+        if not failure.transient:
+            self.emit("job_log", job.job_id, f"失败原因：{failure.label}，不会自动重试")
+            return
+        if job.auto_retries >= self.auto_retry_limit:
+            if self.auto_retry_limit:
+                self.emit("job_log", job.job_id, f"失败原因：{failure.label}，已自动重试 {job.auto_retries} 次，不再重试")
+            return
+        job.auto_retries += 1
+        delay = backoff_delay(job.auto_retries)
+        job.retry_at = time.monotonic() + delay
+        job.status = DownloadJob.RETRY_WAIT
+        adjust = failure.adjust(job.settings)
+        if adjust:
+            # 引用配置的任务在启动时重新生成设置，调整需要记在覆盖中
+            job.settings = dict(job.settings, **adjust)
+            if job.overrides is not None:
+                job.overrides = dict(job.overrides, **adjust)
+            job.cmd = build_command_from_settings(job.settings)
+        changes = "，".join(f"{key} → {value}" for key, value in adjust.items())
+        self.emit("job_log", job.job_id, f"失败原因：{failure.label}，{delay:.0f} 秒后第 {job.auto_retries} 次自动重试"
+                                         + (f"（{changes}）" if changes else ""))
+    
+    def _auto_retry(self, job):
+        job.retry_at = None
+        if job.status != DownloadJob.RETRY_WAIT:
+            return
+        self._reset_job(job)
+        self.queue.append(job.job_id)
+        self.emit("job_updated", job.job_id)
+        self.schedule()
+    
+    def rebalance(self):
+        """按当前运行的任务重新分配预算，变化明显的任务重启以应用新参数"""
+        running = [job for job in self.running_jobs()
+                   if not job.restart_pending and job.status == DownloadJob.RUNNING]
+        if not running or not self.rebalance_restart:
+            return
+        if self.budget.is_enabled():
+            allocation = self.budget.allocate({job.job_id: job.demand for job in running})
+        else:
+            allocation = {job.job_id: job.demand for job in running}
+        retry_after = None
+        for job in running:
+            new = allocation[job.job_id]
+            if not self._allocation_changed(job.allocation, new):
+                continue
+            remaining = self.REBALANCE_MIN_RUNTIME - (time.monotonic() - job.started_at)
+            if remaining > 0:
+                retry_after = remaining if retry_after is None else min(retry_after, remaining)
+                continue
+            self.emit("job_log", job.job_id, f"全局预算调整，重启任务：线程 {job.allocation[0]} → {new[0]}，"
+                                             f"限速 {job.allocation[1] or '不限'} → {new[1] or '不限'} kb/s")
+            job.restart_pending = True
+            job.runner.stop()
+        if retry_after is not None:
+            self.request_rebalance(retry_after + 0.5)
+    
+    def _allocation_changed(self, old, new):
+        if old is None:
+            return True
+        for before, after in zip(old, new):
+            if before == after:
+                continue
+            if before == 0 or after == 0:
+                return True  # 不限速与限速之间切换
+            if abs(after - before) / before >= self.REBALANCE_THRESHOLD:
+                return True
+        return False
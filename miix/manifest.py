@@ -0,0 +1,398 @@
+"""下载并解析 HLS (M3U8) / DASH (MPD) 清单，列出可选择的轨道
+
+只解析选择轨道和估算大小需要的信息（分辨率、码率、编码、语言、时长、分片数、加密方式），
+解密和分片下载仍由 N_m3u8DL-RE 完成。请求头和代理与下载任务使用相同的设置。
+点播清单的解析结果按地址和请求头缓存一段时间，填写轨道选择、预估大小时不再重复下载。
+"""
+import math
+import os
+import re
+import threading
+import time
+import urllib.request
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Optional
+from urllib.parse import urljoin
+
+VIDEO = "video"
+AUDIO = "audio"
+SUBTITLE = "subtitle"
+
+FETCH_TIMEOUT = 15
+# 解析结果的缓存时间（秒）和最多缓存的清单数；直播清单会变化，不缓存
+CACHE_TTL = 300
+CACHE_MAX_ENTRIES = 64
+# 清单最多读取的字节数
+MAX_MANIFEST_BYTES = 16 * 1024 * 1024
+DEFAULT_USER_AGENT = ("Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                      "(KHTML, like Gecko) Chrome/120.0 Safari/537.36")
+
+ATTRIBUTE_RE = re.compile(r'([A-Z0-9-]+)=("[^"]*"|[^,]*)')
+ISO_DURATION_RE = re.compile(
+    r"P(?:(?P<days>[\d.]+)D)?(?:T(?:(?P<hours>[\d.]+)H)?(?:(?P<minutes>[\d.]+)M)?(?:(?P<seconds>[\d.]+)S)?)?$")
+# HLS KEYFORMAT 和 DASH ContentProtection schemeIdUri 对应的 DRM 名称
+DRM_SYSTEMS = {
+    "com.apple.streamingkeydelivery": "FairPlay",
+    "com.microsoft.playready": "PlayReady",
+    "urn:uuid:edef8ba9-79d6-4ace-a3c8-27dcd51d21ed": "Widevine",
+    "urn:uuid:9a04f079-9840-4286-ab92-e65be0885f95": "PlayReady",
+    "urn:uuid:94ce86fb-07ff-4f43-adb8-93d2fa968ca2": "FairPlay",
+    "urn:uuid:e2719d58-a985-b3c9-781a-b030af78d30e": "ClearKey",
+    "urn:uuid:1077efec-c0b2-4d02-ace3-3c1e52e2fb4b": "ClearKey",
+}
+DASH_PROTECTION_SCHEME = "urn:mpeg:dash:mp4protection:2011"
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class ManifestError(Exception):
+    pass
+
+
+@dataclass
+class Track:
+    """清单中的一条轨道；bandwidth 为 bit/s（HLS 为峰值码率），未知时为 0"""
+    kind: str
+    id: str = ""
+    bandwidth: int = 0
+    average_bandwidth: int = 0
+    width: int = 0
+    height: int = 0
+    codecs: str = ""
+    frame_rate: str = ""
+    lang: str = ""
+    name: str = ""
+    url: str = ""
+    segment_count: int = 0  # 未读取媒体列表时为 0
+    encryption: str = ""  # 如 AES-128、cenc (Widevine, PlayReady)，未加密为空
+    
+    @property
+    def resolution(self):
+        return f"{self.width}x{self.height}" if self.width and self.height else ""
+    
+    def estimated_bytes(self, duration):
+        """按码率估算的大小，有平均码率时优先使用"""
+        return int((self.average_bandwidth or self.bandwidth) * duration / 8) if duration else 0
+
+
+@dataclass
+class Segment:
+    url: str
+    duration: float
+    length: Optional[int] = None  # EXT-X-BYTERANGE 给出的字节数
+
+
+@dataclass
+class Manifest:
+    url: str
+    kind: str  # hls / dash
+    tracks: List[Track] = field(default_factory=list)
+    duration: float = 0.0  # 秒，直播或未知时为 0
+    live: bool = False
+    # 媒体列表中的分片（主列表和 MPD 为空）
+    segments: List[Segment] = field(default_factory=list)
+    # 清单中出现的加密方式，多种时用 / 分隔
+    encryption: str = ""
+    
+    def tracks_of(self, kind):
+        return [track for track in self.tracks if track.kind == kind]
+
+
+def request_headers(settings):
+    """设置中的请求头（"名称: 值;名称: 值"）"""
+    headers = {"User-Agent": DEFAULT_USER_AGENT}
+    for header in settings.get("headers", "").split(';'):
+        name, sep, value = header.partition(':')
+        if sep and name.strip():
+            headers[name.strip()] = value.strip()
+    return headers
+
+
+def build_opener(settings):
+    """与下载任务相同的代理设置：自定义代理优先，其次按设置决定是否使用系统代理"""
+    proxy = settings.get("custom_proxy", "").strip()
+    if proxy:
+        handler = urllib.request.ProxyHandler({"http": proxy, "https": proxy})
+    elif settings.get("no_system_proxy", True):
+        handler = urllib.request.ProxyHandler({})
+    else:
+        handler = urllib.request.ProxyHandler()
+    return urllib.request.build_opener(handler)
+
+
+def fetch_text(url, settings, timeout=FETCH_TIMEOUT):
+    """读取清单文本，返回 (文本, 重定向后的地址)；也支持本地文件"""
+    if os.path.isfile(url):
+        with open(url, 'rb') as f:
+            return f.read(MAX_MANIFEST_BYTES).decode('utf-8-sig', errors='replace'), url
+    request = urllib.request.Request(url, headers=request_headers(settings))
+    try:
+        with build_opener(settings).open(request, timeout=timeout) as response:
+            data = response.read(MAX_MANIFEST_BYTES)
+            return data.decode('utf-8-sig', errors='replace'), response.geturl()
+    except (OSError, ValueError) as e:
+        raise ManifestError(f"读取清单失败：{str(e)}")
+
+
+def parse_attributes(text):
+    return {name: value.strip('"') for name, value in ATTRIBUTE_RE.findall(text)}
+
+
+def parse_hls(text, url):
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if not lines or not lines[0].startswith("#EXTM3U"):
+        raise ManifestError("不是 M3U8 清单")
+    manifest = Manifest(url, "hls")
+    duration = 0.0
+    variant = None
+    is_master = False
+    segment_duration = None
+    segment_length = None
+    methods = []
+    for line in lines:
+        if line.startswith(("#EXT-X-KEY:", "#EXT-X-SESSION-KEY:")):
+            method = hls_key_method(parse_attributes(line.partition(":")[2]))
+            if method and method not in methods:
+                methods.append(method)
+        elif line.startswith("#EXT-X-STREAM-INF:"):
+            variant = parse_attributes(line[len("#EXT-X-STREAM-INF:"):])
+            is_master = True
+        elif line.startswith("#EXT-X-MEDIA:"):
+            attributes = parse_attributes(line[len("#EXT-X-MEDIA:"):])
+            kind = {"AUDIO": AUDIO, "SUBTITLES": SUBTITLE}.get(attributes.get("TYPE"))
+            if kind is not None:
+                manifest.tracks.append(Track(
+                    kind, id=attributes.get("GROUP-ID", ""), lang=attributes.get("LANGUAGE", ""),
+                    name=attributes.get("NAME", ""),
+                    url=urljoin(url, attributes["URI"]) if attributes.get("URI") else ""))
+            is_master = True
+        elif line.startswith("#EXTINF:"):
+            try:
+                segment_duration = float(line[len("#EXTINF:"):].split(',')[0])
+            except ValueError:
+                segment_duration = 0.0
+            duration += segment_duration
+        elif line.startswith("#EXT-X-BYTERANGE:"):
+            segment_length = _to_int(line[len("#EXT-X-BYTERANGE:"):].split('@')[0]) or None
+        elif segment_duration is not None and not line.startswith("#"):
+            manifest.segments.append(Segment(urljoin(url, line), segment_duration, segment_length))
+            segment_duration = segment_length = None
+        elif variant is not None and not line.startswith("#"):
+            width, _, height = variant.get("RESOLUTION", "").partition("x")
+            manifest.tracks.append(Track(
+                VIDEO, bandwidth=_to_int(variant.get("BANDWIDTH")),
+                average_bandwidth=_to_int(variant.get("AVERAGE-BANDWIDTH")), width=_to_int(width), height=_to_int(height),
+                codecs=variant.get("CODECS", ""), frame_rate=variant.get("FRAME-RATE", ""),
+                url=urljoin(url, line)))
+            variant = None
+    manifest.encryption = " / ".join(methods)
+    if not is_master:
+        # 媒体列表本身就是唯一的一条轨道
+        manifest.live = "#EXT-X-ENDLIST" not in lines
+        manifest.duration = 0.0 if manifest.live else duration
+        manifest.tracks.append(Track(VIDEO, url=url, segment_count=len(manifest.segments),
+                                     encryption=manifest.encryption))
+    return manifest
+
+
+def hls_key_method(attributes):
+    """EXT-X-KEY 的加密方式，未加密返回空字符串"""
+    method = attributes.get("METHOD", "NONE")
+    if method == "NONE":
+        return ""
+    drm = DRM_SYSTEMS.get(attributes.get("KEYFORMAT", "").lower())
+    return f"{method} ({drm})" if drm else method
+
+
+def parse_dash(text, url):
+    try:
+        root = ET.fromstring(text)
+    except ET.ParseError as e:
+        raise ManifestError(f"MPD 格式错误：{str(e)}")
+    if _local_name(root.tag) != "MPD":
+        raise ManifestError("不是 MPD 清单")
+    manifest = Manifest(url, "dash", live=root.get("type") == "dynamic")
+    manifest.duration = 0.0 if manifest.live else parse_iso_duration(root.get("mediaPresentationDuration", ""))
+    seen = {}
+    methods = []
+    periods = _children(root, "Period")
+    period_duration = 0.0
+    for period in periods:
+        seconds = parse_iso_duration(period.get("duration", "")) or (manifest.duration if len(periods) == 1 else 0.0)
+        period_duration += seconds
+        for adaptation in _children(period, "AdaptationSet"):
+            label = next((child.text or "" for child in _children(adaptation, "Label")), "")
+            for representation in _children(adaptation, "Representation"):
+                def attribute(name):
+                    return representation.get(name) or adaptation.get(name) or ""
+                kind = _dash_kind(attribute("contentType"), attribute("mimeType"), attribute("codecs"))
+                if kind is None:
+                    continue
+                track_id = representation.get("id", "")
+                count = dash_segment_count((representation, adaptation, period), seconds)
+                if track_id and (kind, track_id) in seen:
+                    seen[(kind, track_id)].segment_count += count  # 多个 Period 中重复的轨道只列一次
+                    continue
+                encryption = dash_protection(_children(adaptation, "ContentProtection") +
+                                             _children(representation, "ContentProtection"))
+                if encryption and encryption not in methods:
+                    methods.append(encryption)
+                track = Track(
+                    kind, id=track_id, bandwidth=_to_int(attribute("bandwidth")),
+                    width=_to_int(attribute("width")), height=_to_int(attribute("height")),
+                    codecs=attribute("codecs"), frame_rate=attribute("frameRate"),
+                    lang=adaptation.get("lang", ""), name=adaptation.get("label", "") or label,
+                    segment_count=count, encryption=encryption)
+                manifest.tracks.append(track)
+                if track_id:
+                    seen[(kind, track_id)] = track
+    manifest.encryption = " / ".join(methods)
+    if not manifest.duration and not manifest.live:
+        manifest.duration = period_duration
+    return manifest
+
+
+def dash_protection(elements):
+    """ContentProtection 元素对应的加密方式，如 cenc (Widevine, PlayReady)"""
+    method = ""
+    systems = []
+    for element in elements:
+        scheme = element.get("schemeIdUri", "").lower()
+        if scheme == DASH_PROTECTION_SCHEME:
+            method = element.get("value", "") or "cenc"
+        elif DRM_SYSTEMS.get(scheme) and DRM_SYSTEMS[scheme] not in systems:
+            systems.append(DRM_SYSTEMS[scheme])
+    if not method and not systems:
+        return ""
+    method = method or "cenc"
+    return f"{method} ({', '.join(systems)})" if systems else method
+
+
+def dash_segment_count(levels, seconds):
+    """一个 Period 中某条轨道的分片数；levels 为 (Representation, AdaptationSet, Period)，无法确定时返回 0"""
+    for element in levels:
+        segment_list = _children(element, "SegmentList")
+        if segment_list:
+            return len(_children(segment_list[0], "SegmentURL"))
+        template = _children(element, "SegmentTemplate")
+        if template:
+            timescale = _to_int(template[0].get("timescale")) or 1
+            timeline = _children(template[0], "SegmentTimeline")
+            if timeline:
+                return _timeline_count(_children(timeline[0], "S"), seconds * timescale)
+            duration = _to_int(template[0].get("duration"))
+            return math.ceil(seconds * timescale / duration) if duration and seconds else 0
+        if _children(element, "SegmentBase"):
+            return 1
+    # 只有 BaseURL 时整条轨道是一个文件
+    return 1 if _children(levels[0], "BaseURL") else 0
+
+
+def _timeline_count(entries, end):
+    """SegmentTimeline 的分片数；r 为负数表示一直重复到 Period 结束（end 为按 timescale 计的时长）"""
+    count = 0
+    start = position = None
+    for entry in entries:
+        if entry.get("t") is not None:
+            position = _to_int(entry.get("t"))
+        position = position or 0
+        start = position if start is None else start
+        duration = _to_int(entry.get("d"))
+        repeat = _to_int(entry.get("r"))
+        if repeat < 0:
+            repeat = max(0, math.ceil((end - (position - start)) / duration) - 1) if duration and end else 0
+        count += 1 + repeat
+        position += duration * (1 + repeat)
+    return count
+
+
+def load_manifest(settings, url=None, max_age=CACHE_TTL):
+    """按设置中的地址、请求头和代理读取并解析清单，max_age 秒内解析过的点播清单直接返回缓存
+    
+    HLS 主列表不含时长，会再读取第一条视频轨道的媒体列表取得时长、分片数和加密方式。
+    返回的对象可能被多个调用方共用，不要修改。
+    """
+    url = url or settings.get("m3u8_url", "")
+    if not url:
+        raise ManifestError("没有清单地址")
+    key = (url, tuple(sorted(request_headers(settings).items())))
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None and now - cached[0] < max_age:
+            _cache.move_to_end(key)
+            return cached[1]
+    manifest = _load_manifest(settings, url)
+    if not manifest.live and not os.path.isfile(url):
+        with _cache_lock:
+            _cache[key] = (now, manifest)
+            _cache.move_to_end(key)
+            while len(_cache) > CACHE_MAX_ENTRIES:
+                _cache.popitem(last=False)
+    return manifest
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def _load_manifest(settings, url):
+    text, final_url = fetch_text(url, settings)
+    head = text.lstrip()[:2048]
+    if head.startswith("#EXTM3U"):
+        manifest = parse_hls(text, final_url)
+    elif "<MPD" in head:
+        manifest = parse_dash(text, final_url)
+    else:
+        raise ManifestError("不是 M3U8/MPD 清单")
+    if manifest.kind == "hls" and not manifest.duration:
+        playlist = next((track for track in manifest.tracks_of(VIDEO) if track.url != final_url), None)
+        if playlist is not None:
+            media = load_manifest(settings, playlist.url)
+            manifest.duration = media.duration
+            manifest.live = media.live
+            playlist.segment_count = len(media.segments)
+            playlist.encryption = media.encryption
+            if media.encryption and not manifest.encryption:
+                manifest.encryption = media.encryption
+    return manifest
+
+
+def parse_iso_duration(text):
+    """ISO 8601 时长（如 PT1H2M3.5S）转为秒"""
+    match = ISO_DURATION_RE.match(text.strip())
+    if not match or not text.strip():
+        return 0.0
+    parts = {name: float(value) for name, value in match.groupdict().items() if value}
+    return (parts.get("days", 0) * 86400 + parts.get("hours", 0) * 3600 +
+            parts.get("minutes", 0) * 60 + parts.get("seconds", 0))
+
+
+def _dash_kind(content_type, mime_type, codecs):
+    kind = content_type or mime_type.split('/')[0]
+    if kind == "video":
+        return VIDEO
+    if kind == "audio":
+        return AUDIO
+    if kind == "text" or mime_type == "application/ttml+xml" or codecs in ("stpp", "wvtt"):
+        return SUBTITLE
+    return None
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def _children(element, name):
+    return [child for child in element if _local_name(child.tag) == name]
+
+
+def _to_int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
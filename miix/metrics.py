@@ -0,0 +1,293 @@
+"""下载速度等指标的时间序列
+
+每个任务按秒采样速度、分片完成速率、重试次数和子进程树的资源占用，数据存放在定长的
+array 环形缓冲中，长时间录制也不会增长内存。按源站汇总后可以对比不同 CDN 的表现；
+各源站完成任务的平均速度保存在磁盘上，用于下载前预估耗时。
+"""
+import json
+import os
+import re
+import threading
+from array import array
+from urllib.parse import urlparse
+
+from .progress import format_duration, format_size
+from .settings import write_file_atomic
+
+THROUGHPUT_PATH = os.path.join(os.path.expanduser("~"), "m3u8_downloader_throughput.json")
+# 新记录在平均速度中的权重
+THROUGHPUT_WEIGHT = 0.3
+# 太短的任务（秒）速度不准，不记录
+THROUGHPUT_MIN_SECONDS = 10
+
+# N_m3u8DL-RE 的重试提示（中英文界面）
+RETRY_RE = re.compile(r"retry|retrying|重试", re.IGNORECASE)
+
+
+def is_retry_line(line):
+    return RETRY_RE.search(line) is not None
+
+
+def origin_of(url):
+    """URL 的源站（主机名），用于按 CDN 汇总"""
+    try:
+        return urlparse(url).hostname or ""
+    except ValueError:
+        return ""
+
+
+def percentile(sorted_values, fraction):
+    """最近秩法求百分位数，输入需已排序"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def summarize(values):
+    """返回 (最小值, 平均值, P95)，没有数据时返回 None"""
+    values = sorted(values)
+    if not values:
+        return None
+    return values[0], sum(values) / len(values), percentile(values, 0.95)
+
+
+class TimeSeries:
+    """定长环形时间序列，时间和数值各用一个 array('d') 保存"""
+    
+    def __init__(self, capacity=600):
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.data = array('d', bytes(8 * capacity))
+        self.start = 0
+        self.count = 0
+    
+    def __len__(self):
+        return self.count
+    
+    def append(self, timestamp, value):
+        if self.count < self.capacity:
+            index = (self.start + self.count) % self.capacity
+            self.count += 1
+        else:
+            # 已满时覆盖最旧的数据
+            index = self.start
+            self.start = (self.start + 1) % self.capacity
+        self.times[index] = timestamp
+        self.data[index] = value
+    
+    def _ordered(self, source):
+        end = self.start + self.count
+        if end <= self.capacity:
+            return source[self.start:end]
+        return source[self.start:] + source[:end - self.capacity]
+    
+    def values(self):
+        return self._ordered(self.data)
+    
+    def timestamps(self):
+        return self._ordered(self.times)
+    
+    def last(self):
+        if not self.count:
+            return None
+        return self.data[(self.start + self.count - 1) % self.capacity]
+    
+    def summary(self):
+        return summarize(self.values())
+
+
+class JobMetrics:
+    """单个任务的速度、分片速率和重试次数"""
+    
+    def __init__(self, origin="", capacity=600):
+        self.origin = origin
+        self.speed = TimeSeries(capacity)  # 字节/秒
+        self.segment_rate = TimeSeries(capacity)  # 分片/秒
+        self.retries = 0
+        self.bytes_downloaded = 0
+        # 单调递增的下载字节数，任务重启后进度归零也不会减少
+        self.bytes_total = 0
+        self.last_segments = None
+        self.last_time = None
+    
+    def sample(self, now, records, retries=0):
+        """用各轨道最新的进度记录采样一次"""
+        records = list(records)
+        self.retries = retries
+        if not records:
+            return
+        downloaded = sum(record.downloaded_bytes or 0 for record in records)
+        self.bytes_total += max(0, downloaded - self.bytes_downloaded)
+        self.bytes_downloaded = downloaded
+        speeds = [record.speed for record in records if record.speed is not None]
+        if speeds:
+            self.speed.append(now, sum(speeds))
+        segments = sum(record.segments_done or 0 for record in records)
+        if self.last_time is not None and now > self.last_time:
+            rate = max(0, segments - self.last_segments) / (now - self.last_time)
+            self.segment_rate.append(now, rate)
+        self.last_segments = segments
+        self.last_time = now
+
+
+class ResourceSeries:
+    """子进程树的 CPU、内存和磁盘读写采样（由采样线程写入，界面线程读取）"""
+    
+    def __init__(self, capacity=600):
+        self.lock = threading.Lock()
+        self.cpu = TimeSeries(capacity)  # CPU 占用率（%，多核时可超过 100）
+        self.rss = TimeSeries(capacity)  # 常驻内存（字节）
+        self.read_rate = TimeSeries(capacity)  # 磁盘读取（字节/秒）
+        self.write_rate = TimeSeries(capacity)  # 磁盘写入（字节/秒）
+        self.last = None  # (时间, TreeUsage)
+        self.started = None
+        self.cpu_total = 0.0
+        # 子进程退出后计数会变小，只累计增量
+        self.read_total = 0
+        self.write_total = 0
+        self.peak_rss = 0
+        self.peak_processes = 0
+    
+    def add(self, now, usage):
+        with self.lock:
+            if self.last is None:
+                self.started = now
+            else:
+                last_time, last = self.last
+                elapsed = now - last_time
+                if elapsed > 0:
+                    cpu = max(0.0, usage.cpu_seconds - last.cpu_seconds)
+                    read_bytes = max(0, usage.read_bytes - last.read_bytes)
+                    write_bytes = max(0, usage.write_bytes - last.write_bytes)
+                    self.cpu_total += cpu
+                    self.read_total += read_bytes
+                    self.write_total += write_bytes
+                    self.cpu.append(now, cpu / elapsed * 100)
+                    self.read_rate.append(now, read_bytes / elapsed)
+                    self.write_rate.append(now, write_bytes / elapsed)
+            self.rss.append(now, usage.rss_bytes)
+            self.peak_rss = max(self.peak_rss, usage.rss_bytes)
+            self.peak_processes = max(self.peak_processes, usage.processes)
+            self.last = (now, usage)
+    
+    def current(self):
+        """最近一次采样：(CPU%, 内存, 读取速度, 写入速度, 进程数)，没有数据时返回 None"""
+        with self.lock:
+            if self.last is None:
+                return None
+            return (self.cpu.last() or 0.0, self.last[1].rss_bytes, self.read_rate.last() or 0.0,
+                    self.write_rate.last() or 0.0, self.last[1].processes)
+    
+    def cpu_values(self):
+        with self.lock:
+            return self.cpu.values()
+    
+    def summary(self):
+        """整个运行期间的汇总，没有采样时返回 None"""
+        with self.lock:
+            if self.last is None:
+                return None
+            duration = self.last[0] - self.started
+            cpu = self.cpu.values()
+            return {
+                "duration": duration,
+                "cpu_seconds": self.cpu_total,
+                "cpu_avg": self.cpu_total / duration * 100 if duration > 0 else 0.0,
+                "cpu_peak": max(cpu) if cpu else 0.0,
+                "rss_peak": self.peak_rss,
+                "read_bytes": self.read_total,
+                "write_bytes": self.write_total,
+                "processes": self.peak_processes,
+            }
+
+
+def format_resource_summary(summary):
+    return (f"运行 {format_duration(summary['duration'])}，CPU 平均 {summary['cpu_avg']:.0f}% "
+            f"峰值 {summary['cpu_peak']:.0f}%（共 {summary['cpu_seconds']:.1f} 秒），"
+            f"内存峰值 {format_size(summary['rss_peak'])}，磁盘读 {format_size(summary['read_bytes'])} "
+            f"写 {format_size(summary['write_bytes'])}，最多 {summary['processes']} 个进程")
+
+
+class MetricsStore:
+    """所有任务的指标，按任务ID保存"""
+    
+    def __init__(self, capacity=600):
+        self.capacity = capacity
+        self.jobs = {}
+        # 已移除任务的下载量，保证总量单调递增
+        self.removed_bytes = 0
+    
+    def get(self, job_id, url=""):
+        metrics = self.jobs.get(job_id)
+        if metrics is None:
+            metrics = self.jobs[job_id] = JobMetrics(origin_of(url), self.capacity)
+        return metrics
+    
+    def remove(self, job_id):
+        metrics = self.jobs.pop(job_id, None)
+        if metrics is not None:
+            self.removed_bytes += metrics.bytes_total
+    
+    def reset_job(self, job_id):
+        """任务重新开始时，下载进度从零计算"""
+        metrics = self.jobs.get(job_id)
+        if metrics is not None:
+            metrics.bytes_downloaded = 0
+            metrics.last_segments = None
+            metrics.last_time = None
+    
+    def bytes_total(self):
+        return self.removed_bytes + sum(metrics.bytes_total for metrics in self.jobs.values())
+    
+    def origin_summary(self):
+        """按源站汇总：{源站: {"jobs", "min", "avg", "p95", "retries"}}"""
+        grouped = {}
+        for metrics in self.jobs.values():
+            entry = grouped.setdefault(metrics.origin, {"jobs": 0, "speeds": [], "retries": 0})
+            entry["jobs"] += 1
+            entry["speeds"].extend(metrics.speed.values())
+            entry["retries"] += metrics.retries
+        result = {}
+        for origin, entry in grouped.items():
+            stats = summarize(entry["speeds"]) or (None, None, None)
+            result[origin] = {
+                "jobs": entry["jobs"],
+                "min": stats[0],
+                "avg": stats[1],
+                "p95": stats[2],
+                "retries": entry["retries"],
+            }
+        return result
+
+
+class ThroughputHistory:
+    """各源站以往任务的平均下载速度（字节/秒，指数加权）"""
+    
+    def __init__(self, path=THROUGHPUT_PATH):
+        self.path = path
+        self.origins = {}
+        self.load()
+    
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.origins = {origin: float(speed) for origin, speed in data.items()}
+        except (OSError, ValueError, AttributeError):
+            self.origins = {}
+    
+    def record(self, origin, total_bytes, seconds):
+        if not origin or total_bytes <= 0 or seconds < THROUGHPUT_MIN_SECONDS:
+            return
+        speed = total_bytes / seconds
+        previous = self.origins.get(origin)
+        self.origins[origin] = speed if previous is None else (
+            previous * (1 - THROUGHPUT_WEIGHT) + speed * THROUGHPUT_WEIGHT)
+        try:
+            write_file_atomic(self.path, json.dumps(self.origins, ensure_ascii=False, indent=2))
+        except OSError:
+            pass
+    
+    def speed(self, origin):
+        return self.origins.get(origin)
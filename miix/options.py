@@ -0,0 +1,344 @@
+"""设置项声明表：设置键、命令行参数、类型、默认值、控件和分组集中在一处
+
+界面按表生成控件并读写设置，命令行参数按表的顺序生成，设置文件的默认值也取自这里。
+批量任务和命令行模式只需要设置字典，不需要创建控件。
+
+控件类型：
+    text / password  单行文本
+    int              整数（minimum, maximum）
+    bool             标签 + 勾选框
+    check            带文字的勾选框（不单独显示标签）
+    choice           下拉框（choices）
+    file / dir       单行文本 + “选择”按钮（file_filter）
+
+position 为 (行, 列, 跨列数)：标签放在该列，控件从下一列开始；check 直接占用该列。
+位置相同的几个设置项放在同一个单元格内，标签取第一个。
+"""
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, Tuple, Union
+
+EXECUTABLE_FILTER = "可执行文件 (*.exe);;所有文件 (*.*)"
+
+
+@dataclass(frozen=True)
+class Option:
+    """一个设置项
+
+    emit 决定生成命令行参数的方式：
+        value       值非空（非 0）时输出 flag 值
+        always      总是输出 flag 值
+        changed     与默认值不同时输出 flag 值
+        switch      勾选时输出 flag（flag 可以是多个参数）
+        off_switch  未勾选时输出 flag=false
+        函数        func(设置字典) 返回参数列表
+    没有 flag 且 emit 不是函数的设置项只用于界面或调度，不出现在命令行中。
+    """
+    key: str
+    default: Any
+    flag: Union[str, Tuple[str, ...], None] = None
+    emit: Union[str, Callable, None] = "value"
+    widget: Optional[str] = None
+    group: Optional[str] = None
+    label: str = ""
+    position: Tuple[int, ...] = (0, 0)
+    placeholder: str = ""
+    tooltip: str = ""
+    choices: Tuple[str, ...] = ()
+    minimum: int = 0
+    maximum: int = 0
+    width: int = 0
+    file_filter: str = ""
+
+    def arguments(self, settings):
+        """该设置项对应的命令行参数"""
+        value = settings.get(self.key, self.default)
+        if callable(self.emit):
+            return self.emit(settings)
+        if self.flag is None:
+            return []
+        flags = [self.flag] if isinstance(self.flag, str) else list(self.flag)
+        if self.emit == "switch":
+            return flags if value else []
+        if self.emit == "off_switch":
+            return [] if value else [f"{self.flag}=false"]
+        if self.emit == "value" and not value:
+            return []
+        if self.emit == "changed" and value == self.default:
+            return []
+        return flags + [str(value)]
+
+
+def _headers_arguments(settings):
+    arguments = []
+    for header in settings.get("headers", "").strip().split(';'):
+        header = header.strip()
+        if header:
+            arguments.extend(["-H", header])
+    return arguments
+
+
+def _range_arguments(settings):
+    start = settings.get("start_time", "00:00:00")
+    end = settings.get("end_time", "00:00:00")
+    if start == "00:00:00" and end == "00:00:00":
+        return []
+    return ["--custom-range", f"{start}-{end}"]
+
+
+def _speed_arguments(settings):
+    limit = settings.get("limit_speed", 0)
+    return ["--max-speed", f"{limit}K"] if limit > 0 else []
+
+
+def _live_take_count_arguments(settings):
+    count = settings.get("live_take_count", 16)
+    if settings.get("live_take_count_enabled", True) and count != 16:
+        return ["--live-take-count", str(count)]
+    return []
+
+
+def _select_video_arguments(settings):
+    expression = settings.get("select_video", "")
+    if not expression and settings.get("auto_video_height", 0) > 0:
+        # 批量任务不逐个解析清单，用分辨率条件选择最便宜的视频流
+        from .tracks import min_height_expression
+        expression = min_height_expression(settings["auto_video_height"])
+    return ["--select-video", expression] if expression else []
+
+
+def _custom_arguments(settings):
+    return settings.get("args", "").split()
+
+
+# 顺序即命令行参数的顺序（执行程序和地址固定在最前）
+OPTIONS = (
+    # 路径和下载设置
+    Option("title", "", "--save-name", widget="text", group="下载设置", label="视频标题", position=(1, 0),
+           placeholder="输入视频标题，将作为文件名"),
+    Option("work_dir", "", "--save-dir", widget="dir", group="路径设置", label="工作目录", position=(1, 0)),
+    Option("tmp_dir", "", "--tmp-dir", widget="dir", group="输出设置", label="临时目录", position=(0, 0, 2),
+           placeholder="设置临时文件存储目录"),
+    Option("save_pattern", "", "--save-pattern", widget="text", group="输出设置", label="文件命名模板",
+           position=(1, 0, 3), placeholder="如: <SaveName>_<Resolution>_<Bandwidth>"),
+    Option("log_file_path", "", "--log-file-path", widget="file", group="输出设置", label="日志文件路径",
+           position=(2, 0, 2), placeholder="如: C:\\Logs\\log.txt", file_filter="日志文件 (*.txt)"),
+    Option("ffmpeg_path", "", "--ffmpeg-binary-path", widget="file", group="路径设置", label="FFmpeg路径",
+           position=(2, 0), placeholder="选择FFmpeg可执行文件路径", file_filter=EXECUTABLE_FILTER),
+    Option("headers", "", emit=_headers_arguments, widget="text", group="下载设置", label="请求头",
+           position=(1, 2), placeholder="格式: Header1:Value1"),
+    Option("baseurl", "", "--base-url", widget="text", group="下载设置", label="BASEURL", position=(2, 0),
+           placeholder="设置基础URL，用于相对路径解析"),
+    Option("mux_file", "", "--mux-import", widget="file", group="下载设置", label="混流文件", position=(2, 2),
+           placeholder="选择要混流的本地文件", file_filter="所有文件 (*.*)"),
+    Option("start_time", "00:00:00", emit=_range_arguments, widget="text", group="范围选择", label="开始时间",
+           position=(0, 0), width=90),
+    Option("end_time", "00:00:00", emit=None, widget="text", group="范围选择", label="结束时间",
+           position=(0, 2), width=90),
+    # 基础选项
+    Option("del_after_merge", True, "--del-after-done", "switch", widget="check", group="基础选项",
+           label="合并后删除分片", position=(0, 0)),
+    Option("no_date_in_name", True, "--no-date-info", "switch", widget="bool", group="高级选项",
+           label="合并时不写入日期", position=(4, 2)),
+    Option("no_system_proxy", True, "--use-system-proxy=false", "switch", widget="bool", group="代理设置",
+           label="不使用系统代理", position=(1, 0)),
+    Option("only_parse_m3u8", False, "--skip-download", "switch", widget="check", group="基础选项",
+           label="仅解析m3u8", position=(0, 1)),
+    Option("mux_while_download", False, ("--live-real-time-merge", "--live-pipe-mux"), "switch",
+           widget="check", group="基础选项", label="混流MP4边下边看", position=(0, 2)),
+    Option("no_merge", False, "--skip-merge", "switch", widget="bool", group="高级选项",
+           label="下载完成后不合并", position=(4, 0)),
+    Option("binary_merge", False, "--binary-merge", "switch", widget="check", group="基础选项",
+           label="使用二进制合并", position=(0, 3)),
+    Option("auto_select", True, "--auto-select", "switch", widget="check", group="基础选项",
+           label="自动选择最佳轨道", position=(1, 0)),
+    Option("no_log", False, "--no-log", "switch", widget="bool", group="高级选项",
+           label="关闭日志文件输出", position=(5, 0)),
+    Option("check_segments_count", True, "--check-segments-count", "switch", widget="check", group="基础选项",
+           label="检测分片数量", position=(1, 1)),
+    Option("concurrent_download", True, "--concurrent-download", "switch", widget="check", group="基础选项",
+           label="并发下载音视频", position=(1, 2)),
+    Option("merge_to_mp4", True, ("-M", "format=mp4"), "switch", widget="check", group="基础选项",
+           label="合并为mp4", position=(1, 3), tooltip="如果勾选，将在命令中添加 -M format=mp4 参数"),
+    Option("preflight_check", False, emit=None, widget="check", group="基础选项", label="开始前预估并检查空间",
+           position=(2, 0), tooltip="加入队列前读取清单预估大小和耗时，保存/临时目录空间不足时不加入"),
+    # 性能设置
+    Option("max_threads", 32, "--thread-count", "always", widget="int", group="性能设置", label="线程数",
+           position=(0, 0), minimum=1, maximum=100, width=70),
+    Option("retry_count", 15, "--download-retry-count", "always", widget="int", group="性能设置", label="重试",
+           position=(0, 2), minimum=1, maximum=100, width=70),
+    Option("timeout", 100, "--http-request-timeout", "always", widget="int", group="性能设置", label="超时",
+           position=(0, 4), minimum=1, maximum=300, width=70),
+    Option("limit_speed", 0, emit=_speed_arguments, widget="int", group="性能设置", label="限速(kb/s)",
+           position=(0, 6), minimum=0, maximum=10000, width=90),
+    # 字幕设置
+    Option("sub_only", False, "--sub-only", "switch", widget="bool", group="字幕设置", label="仅下载字幕",
+           position=(0, 0)),
+    Option("sub_format", "SRT", "--sub-format", "always", widget="choice", group="字幕设置", label="字幕格式",
+           position=(0, 2), choices=("SRT", "VTT")),
+    Option("auto_subtitle_fix", True, "--auto-subtitle-fix", "off_switch", widget="bool", group="字幕设置",
+           label="自动修复字幕", position=(0, 4)),
+    Option("live_fix_vtt_by_audio", False, "--live-fix-vtt-by-audio", "switch", widget="bool", group="字幕设置",
+           label="音频修正VTT", position=(1, 0)),
+    # 代理设置
+    Option("custom_proxy", "", "--custom-proxy", widget="text", group="代理设置", label="自定义代理",
+           position=(0, 0, 2), placeholder="如 http://127.0.0.1:8888"),
+    # 高级选项
+    Option("log_level", "INFO", "--log-level", "always", widget="choice", group="高级选项", label="日志级别",
+           position=(0, 0), choices=("DEBUG", "INFO", "WARN", "ERROR", "OFF")),
+    Option("ui_language", "zh-CN", "--ui-language", "always", widget="choice", group="高级选项", label="UI语言",
+           position=(0, 2), choices=("en-US", "zh-CN", "zh-TW")),
+    Option("force_ansi_console", False, "--force-ansi-console", "switch", widget="bool", group="高级选项",
+           label="强制ANSI控制台", position=(1, 0)),
+    Option("no_ansi_color", False, "--no-ansi-color", "switch", widget="bool", group="高级选项",
+           label="去除ANSI颜色", position=(1, 2)),
+    Option("use_ffmpeg_concat_demuxer", False, "--use-ffmpeg-concat-demuxer", "switch", widget="bool",
+           group="高级选项", label="使用ffmpeg concat分离器", position=(2, 0)),
+    Option("write_meta_json", True, "--write-meta-json", "off_switch", widget="bool", group="高级选项",
+           label="写入元数据json", position=(2, 2)),
+    Option("append_url_params", False, "--append-url-params", "switch", widget="bool", group="高级选项",
+           label="追加URL参数", position=(3, 0)),
+    Option("allow_hls_multi_ext_map", False, "--allow-hls-multi-ext-map", "switch", widget="bool",
+           group="高级选项", label="允许HLS多EXT-MAP", position=(3, 2)),
+    Option("disable_update_check", False, "--disable-update-check", "switch", widget="bool", group="高级选项",
+           label="禁用更新检查", position=(5, 2)),
+    # 解密/加密设置
+    Option("key", "", "--key", widget="text", group="高级参数", label="解密密钥", position=(0, 2),
+           placeholder="格式: KID1:KEY1 或直接输入KEY"),
+    Option("key_text_file", "", "--key-text-file", widget="file", group="输出设置", label="密钥文本文件",
+           position=(3, 0, 2), placeholder="设置密钥文件", file_filter="文本文件 (*.txt)"),
+    Option("decryption_engine", "MP4DECRYPT", "--decryption-engine", "always", widget="choice",
+           group="解密/加密设置", label="解密引擎", position=(0, 0),
+           choices=("MP4DECRYPT", "FFMPEG", "SHAKA_PACKAGER")),
+    Option("decryption_binary_path", "", "--decryption-binary-path", widget="file", group="解密/加密设置",
+           label="解密工具路径", position=(0, 2), placeholder="选择解密工具路径", file_filter=EXECUTABLE_FILTER),
+    Option("mp4_real_time_decryption", False, "--mp4-real-time-decryption", "switch", widget="check",
+           group="解密/加密设置", label="MP4实时解密", position=(1, 0)),
+    Option("custom_hls_method", "AES_128", "--custom-hls-method", "changed", widget="choice",
+           group="解密/加密设置", label="HLS加密方法", position=(1, 1),
+           choices=("AES_128", "AES_128_ECB", "CENC", "CHACHA20", "NONE", "SAMPLE_AES", "SAMPLE_AES_CTR",
+                    "UNKNOWN")),
+    Option("custom_hls_key", "", "--custom-hls-key", widget="text", group="解密/加密设置", label="HLS密钥",
+           position=(2, 0, 2), placeholder="文件、HEX或Base64"),
+    Option("custom_hls_iv", "", "--custom-hls-iv", widget="text", group="解密/加密设置", label="HLS IV",
+           position=(2, 3), placeholder="文件、HEX或Base64"),
+    # 直播设置
+    Option("live_record_limit", "HH:mm:ss", "--live-record-limit", "changed", widget="text", group="直播设置",
+           label="录制时长限制", position=(0, 0), placeholder="如: 01:00:00"),
+    Option("live_wait_time", 3, "--live-wait-time", "changed", widget="int", group="直播设置",
+           label="刷新间隔(秒)", position=(0, 2), minimum=1, maximum=3600, width=80),
+    Option("live_take_count_enabled", True, emit=None, widget="bool", group="直播设置", label="首次分片数量",
+           position=(1, 0)),
+    Option("live_take_count", 16, emit=_live_take_count_arguments, widget="int", group="直播设置",
+           position=(1, 0), minimum=1, maximum=100, width=70),
+    Option("live_perform_as_vod", False, "--live-perform-as-vod", "switch", widget="check", group="直播设置",
+           label="按点播方式下载直播流", position=(1, 2)),
+    Option("live_keep_segments", True, "--live-keep-segments", "off_switch", widget="check", group="直播设置",
+           label="实时合并时保留分片", position=(1, 3)),
+    Option("task_start_at", "yyyyMMddHHmmss", "--task-start-at", "changed", widget="text", group="直播设置",
+           label="任务开始时间", position=(2, 0, 2), placeholder="如: 20231225120000"),
+    # 轨道选择设置
+    Option("select_video", "", emit=_select_video_arguments, widget="text", group="轨道选择设置", label="选择视频轨道",
+           position=(0, 0, 2), placeholder="正则表达式选择视频流"),
+    Option("select_audio", "", "--select-audio", widget="text", group="轨道选择设置", label="选择音频轨道",
+           position=(1, 0, 2), placeholder="正则表达式选择音频流"),
+    Option("select_subtitle", "", "--select-subtitle", widget="text", group="轨道选择设置", label="选择字幕轨道",
+           position=(2, 0, 2), placeholder="正则表达式选择字幕流"),
+    Option("drop_video", "", "--drop-video", widget="text", group="轨道选择设置", label="丢弃视频轨道",
+           position=(3, 0, 2), placeholder="正则表达式丢弃视频流"),
+    Option("drop_audio", "", "--drop-audio", widget="text", group="轨道选择设置", label="丢弃音频轨道",
+           position=(0, 3, 2), placeholder="正则表达式丢弃音频流"),
+    Option("drop_subtitle", "", "--drop-subtitle", widget="text", group="轨道选择设置", label="丢弃字幕轨道",
+           position=(1, 3, 2), placeholder="正则表达式丢弃字幕流"),
+    Option("ad_keyword", "", "--ad-keyword", widget="text", group="轨道选择设置", label="广告关键字",
+           position=(2, 3, 2), placeholder="设置广告分片的URL关键字"),
+    Option("urlprocessor_args", "", "--urlprocessor-args", widget="text", group="轨道选择设置",
+           label="URL处理器参数", position=(3, 3, 2), placeholder="直接传递给URL Processor"),
+    Option("auto_video_height", 0, emit=None, widget="int", group="轨道选择设置", label="自动最低分辨率",
+           position=(4, 0), minimum=0, maximum=4320, width=90,
+           tooltip="未指定视频轨道时，选择高度不低于该值的视频中码率最低的一条，0 为不启用"),
+    # 自定义参数放在最后
+    Option("args", "", emit=_custom_arguments, widget="text", group="高级参数", label="自定义参数",
+           position=(0, 0), placeholder="输入其他自定义命令行参数，用空格分隔"),
+    # 以下不出现在命令行中
+    Option("executable", "N_m3u8DL-RE.exe", emit=None, widget="file", group="路径设置", label="执行程序",
+           position=(0, 0), file_filter=EXECUTABLE_FILTER),
+    Option("m3u8_url", "", emit=None, widget="text", group="下载设置", label="M3U8地址", position=(0, 0, 3),
+           placeholder="输入M3U8地址，支持HTTP/HTTPS协议"),
+    Option("max_concurrent_jobs", 2, emit=None, widget="int", minimum=1, maximum=32, width=70),
+    Option("global_thread_budget", 0, emit=None, widget="int", minimum=0, maximum=1000, width=90,
+           tooltip="所有正在运行的任务共享的线程数，0 为不限制"),
+    Option("global_speed_budget", 0, emit=None, widget="int", minimum=0, maximum=10000000, width=110,
+           tooltip="所有正在运行的任务共享的带宽，0 为不限制"),
+    Option("auto_retry_count", 3, emit=None, widget="int", minimum=0, maximum=20, width=70,
+           tooltip="超时、限流等临时故障按指数退避自动重试的次数，0 为不自动重试"),
+    Option("rebalance_restart", False, emit=None, widget="check", label="重新分配时重启任务",
+           tooltip="任务开始或结束后，重启分配变化明显的任务以应用新的线程数/限速"),
+    Option("disk_warn_mb", 2048, emit=None, widget="int", group="磁盘监控", label="剩余空间警告(MB)",
+           position=(0, 0), minimum=0, maximum=10000000, width=110,
+           tooltip="下载中临时/保存目录所在磁盘的剩余空间低于该值加上合并所需空间时警告，0 为不警告"),
+    Option("disk_hard_mb", 512, emit=None, widget="int", group="磁盘监控", label="最低剩余空间(MB)",
+           position=(0, 2), minimum=0, maximum=10000000, width=110,
+           tooltip="剩余空间低于该值时暂停或停止该磁盘上的任务，排队的任务暂不启动，0 为不处理"),
+    Option("disk_low_action", "暂停", emit=None, widget="choice", group="磁盘监控", label="空间不足时",
+           position=(0, 4), choices=("暂停", "停止"), width=90,
+           tooltip="暂停的任务在空间恢复到警告阈值以上后自动继续"),
+    Option("local_proxy_enabled", False, emit=None, widget="check", group="代理设置", label="经本机代理转发",
+           position=(2, 0),
+           tooltip="所有任务经本机代理下载（自动设置 --custom-proxy），复用与源站的连接并限制每个源站的并发数"),
+    Option("proxy_origin_connections", 8, emit=None, widget="int", group="代理设置", label="每源站并发",
+           position=(2, 1), minimum=0, maximum=1000, width=90,
+           tooltip="经本机代理时每个源站同时进行的请求/HTTPS 隧道数（空闲的隧道不计），超出的排队等待，0 为不限制"),
+    Option("segment_cache_enabled", False, emit=None, widget="check", group="代理设置", label="启用分片缓存（仅 HTTP）",
+           position=(3, 0),
+           tooltip="经本机代理下载，HTTP 分片缓存到 ~/m3u8_downloader_cache，重复下载时直接读取；HTTPS 只转发不缓存"),
+    Option("segment_cache_size_mb", 10240, emit=None, widget="int", group="代理设置", label="缓存上限(MB)",
+           position=(3, 1), minimum=100, maximum=10000000, width=110, tooltip="超过后删除最久未使用的分片"),
+    Option("segment_cache_ignore_params", "token,expires,signature,policy,key-pair-id,hdnts,auth_key", emit=None,
+           widget="text", group="代理设置", label="缓存忽略参数", position=(4, 0, 2),
+           tooltip="计算缓存键时去掉的URL查询参数（逗号分隔），用于每次请求都不同的签名/令牌"),
+    Option("log_max_lines", 5000, emit=None, widget="int", minimum=100, maximum=100000, width=90,
+           tooltip="界面最多保留的日志行数，完整日志写入磁盘"),
+    Option("metrics_export_enabled", False, emit=None, widget="check", group="监控导出",
+           label="启用 Prometheus 指标接口", position=(0, 0), tooltip="在本机提供 http://地址:端口/metrics"),
+    Option("metrics_export_host", "127.0.0.1", emit=None, widget="text", group="监控导出", label="监听地址",
+           position=(0, 1), width=140),
+    Option("metrics_export_port", 9464, emit=None, widget="int", group="监控导出", label="端口",
+           position=(0, 3), minimum=1, maximum=65535, width=90),
+    Option("control_api_enabled", False, emit=None, widget="check", group="监控导出", label="启用控制接口",
+           position=(1, 0), tooltip="在本机提供 http://地址:端口/jobs，可提交、查询、停止任务，/events 推送进度"),
+    Option("control_api_host", "127.0.0.1", emit=None, widget="text", group="监控导出", label="监听地址",
+           position=(1, 1), width=140),
+    Option("control_api_port", 9465, emit=None, widget="int", group="监控导出", label="端口",
+           position=(1, 3), minimum=1, maximum=65535, width=90),
+    Option("control_api_token", "", emit=None, widget="password", group="监控导出", label="访问令牌",
+           position=(1, 5), placeholder="留空则自动生成"),
+    Option("always_on_top", False, emit=None),
+)
+
+OPTION_MAP = {option.key: option for option in OPTIONS}
+
+# 各标签页上的分组（按显示顺序）
+BASIC_GROUPS = ("路径设置", "下载设置", "范围选择", "性能设置", "基础选项", "高级参数")
+ADVANCED_GROUPS = ("输出设置", "磁盘监控", "直播设置", "轨道选择设置", "解密/加密设置", "字幕设置", "代理设置", "高级选项", "监控导出")
+
+
+def group_options(group):
+    return [option for option in OPTIONS if option.group == group]
+
+
+def default_settings():
+    return {option.key: option.default for option in OPTIONS}
+
+
+def build_arguments(settings):
+    """按声明表生成执行程序和地址之后的全部命令行参数"""
+    arguments = []
+    for option in OPTIONS:
+        arguments.extend(option.arguments(settings))
+    return arguments
+
+
+def diff_settings(old, new):
+    """返回两份设置中值不同的设置键（缺少的键按默认值比较）"""
+    return [option.key for option in OPTIONS
+            if old.get(option.key, option.default) != new.get(option.key, option.default)]
@@ -0,0 +1,168 @@
+"""子进程资源占用（CPU 时间、内存、磁盘读写）和进程树
+
+优先使用 psutil（可选依赖），没有安装时在 Linux 上读取 /proc，其他平台返回 None。
+"""
+import os
+from collections import namedtuple
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# 整个进程树的累计占用；CPU 时间包含已退出并被回收的子进程
+TreeUsage = namedtuple("TreeUsage", "cpu_seconds rss_bytes read_bytes write_bytes processes")
+
+try:
+    CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+    PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    CLOCK_TICKS = 100
+    PAGE_SIZE = 4096
+
+
+def _read_proc_stat(pid):
+    """返回 (进程名, /proc/PID/stat 中进程名之后的字段)"""
+    with open(f"/proc/{pid}/stat", "rb") as f:
+        stat = f.read().decode("utf-8", "replace")
+    # 进程名可能包含空格和括号，从最后一个右括号之后开始切分
+    return stat[stat.find("(") + 1:stat.rfind(")")], stat[stat.rfind(")") + 2:].split()
+
+
+def _proc_descendants(pid):
+    children = {}
+    names = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            name, fields = _read_proc_stat(entry)
+            parent = int(fields[1])
+        except (OSError, ValueError, IndexError):
+            continue  # 读取期间进程已退出
+        children.setdefault(parent, []).append(int(entry))
+        names[int(entry)] = name
+    result = []
+    stack = [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            result.append((child, names[child]))
+            stack.append(child)
+    return result
+
+
+def list_descendants(pid):
+    """返回所有后代进程 [(PID, 进程名)]，无法获取时返回空列表"""
+    if not pid:
+        return []
+    try:
+        if psutil is not None:
+            return [(child.pid, child.name()) for child in psutil.Process(pid).children(recursive=True)]
+        if os.path.isdir("/proc"):
+            return _proc_descendants(pid)
+    except Exception:
+        return []
+    return []
+
+
+def is_process_alive(pid):
+    """进程存在且不是僵尸进程"""
+    try:
+        if psutil is not None:
+            return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+        if os.path.isdir("/proc"):
+            return _read_proc_stat(pid)[1][0] != "Z"
+        os.kill(pid, 0)
+        return True
+    except Exception:
+        return False
+
+
+def _proc_children(pid):
+    """直接子进程；子进程可能由任一线程创建，需要读取每个线程的 children 文件"""
+    children = []
+    for task in os.listdir(f"/proc/{pid}/task"):
+        with open(f"/proc/{pid}/task/{task}/children", "rb") as f:
+            children.extend(int(child) for child in f.read().split())
+    return children
+
+
+def _proc_tree_pids(pid):
+    try:
+        pids = [pid]
+        index = 0
+        while index < len(pids):
+            pids.extend(_proc_children(pids[index]))
+            index += 1
+        return pids
+    except FileNotFoundError:
+        if not os.path.exists(f"/proc/{pid}"):
+            raise
+        # 内核不提供 children 文件时扫描整个 /proc
+        return [pid] + [child for child, _ in _proc_descendants(pid)]
+
+
+def _read_proc_io(pid):
+    read_bytes = write_bytes = 0
+    try:
+        with open(f"/proc/{pid}/io", "rb") as f:
+            for line in f:
+                name, _, value = line.partition(b":")
+                if name == b"read_bytes":
+                    read_bytes = int(value)
+                elif name == b"write_bytes":
+                    write_bytes = int(value)
+    except OSError:
+        pass  # 没有权限读取时按 0 计算
+    return read_bytes, write_bytes
+
+
+def _psutil_tree_usage(pid):
+    root = psutil.Process(pid)
+    cpu = rss = read_bytes = write_bytes = count = 0
+    for process in [root] + root.children(recursive=True):
+        try:
+            with process.oneshot():
+                times = process.cpu_times()
+                cpu += times.user + times.system + times.children_user + times.children_system
+                rss += process.memory_info().rss
+                if hasattr(process, "io_counters"):
+                    counters = process.io_counters()
+                    read_bytes += counters.read_bytes
+                    write_bytes += counters.write_bytes
+            count += 1
+        except psutil.Error:
+            continue  # 采样期间退出
+    return TreeUsage(cpu, rss, read_bytes, write_bytes, count)
+
+
+def _proc_tree_usage(pid):
+    cpu = rss = read_bytes = write_bytes = count = 0
+    for member in _proc_tree_pids(pid):
+        try:
+            fields = _read_proc_stat(member)[1]
+            with open(f"/proc/{member}/statm", "rb") as f:
+                rss += int(f.read().split()[1]) * PAGE_SIZE
+        except (OSError, ValueError, IndexError):
+            continue
+        # utime stime cutime cstime
+        cpu += sum(int(value) for value in fields[11:15]) / CLOCK_TICKS
+        io = _read_proc_io(member)
+        read_bytes += io[0]
+        write_bytes += io[1]
+        count += 1
+    return TreeUsage(cpu, rss, read_bytes, write_bytes, count)
+
+
+def read_tree_usage(pid):
+    """返回整个进程树的 TreeUsage，进程不存在或无法读取时返回 None"""
+    if not pid:
+        return None
+    try:
+        if psutil is not None:
+            return _psutil_tree_usage(pid)
+        if os.path.isdir("/proc"):
+            return _proc_tree_usage(pid)
+    except Exception:
+        return None
+    return None
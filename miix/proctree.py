@@ -0,0 +1,127 @@
+"""停止、暂停整个子进程树：停止时先请求正常退出，超时后强制结束
+
+N_m3u8DL-RE 会启动 ffmpeg、mp4decrypt/shaka-packager 等子进程，只结束直接子进程时它们会
+继续运行。子进程以新进程组（Windows 为新进程组，其他系统为新会话）启动，停止时向整个组
+发信号，另外逐个通知启动时已记录的后代进程（它们可能已脱离进程组）。
+"""
+import os
+import signal
+import subprocess
+import time
+
+from .procstats import is_process_alive, list_descendants, psutil
+
+# 正常退出的等待时间（秒），超时后强制结束
+STOP_TIMEOUT = 5
+# 强制结束后再等待的时间
+KILL_TIMEOUT = 2
+
+EXITED = "正常退出"
+KILLED = "强制结束"
+SURVIVED = "仍在运行"
+
+
+def popen_group_options():
+    """Popen 参数：让子进程成为新进程组的组长"""
+    if os.name == "nt":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+def _signal_group(process, pids, sig):
+    try:
+        os.killpg(process.pid, sig)
+    except OSError:
+        pass
+    for pid in pids:  # 可能已脱离进程组的后代
+        try:
+            os.kill(pid, sig)
+        except OSError:
+            pass
+
+
+def _signal_tree(process, pids, force):
+    if os.name != "nt":
+        _signal_group(process, pids, signal.SIGKILL if force else signal.SIGTERM)
+        if not force:
+            # 已暂停的进程收到 SIGCONT 后才会处理 SIGTERM
+            _signal_group(process, pids, signal.SIGCONT)
+        return
+    try:
+        if force:
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            process.send_signal(signal.CTRL_BREAK_EVENT)
+    except OSError:
+        pass
+    if force:
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)  # Windows 上等同于 TerminateProcess
+            except OSError:
+                pass
+
+
+def _wait_tree(process, pids, timeout):
+    """等待进程树退出，返回超时后仍在运行的 PID"""
+    deadline = time.monotonic() + timeout
+    while True:
+        alive = {pid for pid in pids if is_process_alive(pid)}
+        if process.poll() is None:
+            alive.add(process.pid)
+        if not alive or time.monotonic() >= deadline:
+            return alive
+        time.sleep(0.1)
+
+
+def terminate_tree(process, timeout=STOP_TIMEOUT):
+    """分阶段结束进程树（会阻塞，需在后台线程调用），返回 [(PID, 进程名, 结果)]"""
+    name = os.path.basename(process.args[0] if isinstance(process.args, (list, tuple)) else str(process.args))
+    members = [(process.pid, name)] + list_descendants(process.pid)
+    pids = [pid for pid, _ in members[1:]]
+    
+    _signal_tree(process, pids, force=False)
+    alive = _wait_tree(process, pids, timeout)
+    forced = set(alive)
+    if alive:
+        # 等待期间新启动的后代也一并结束
+        for pid, child_name in list_descendants(process.pid):
+            if pid not in pids:
+                members.append((pid, child_name))
+                pids.append(pid)
+                forced.add(pid)
+        _signal_tree(process, pids, force=True)
+        alive = _wait_tree(process, pids, KILL_TIMEOUT)
+    
+    report = []
+    for pid, member_name in members:
+        if pid in alive:
+            result = SURVIVED
+        elif pid in forced:
+            result = KILLED
+        else:
+            result = EXITED
+        report.append((pid, member_name, result))
+    return report
+
+
+def format_report(report):
+    return "，".join(f"{name}({pid}) {result}" for pid, name, result in report)
+
+
+def suspend_tree(process, suspend=True):
+    """暂停（suspend=False 时继续）整个进程树，返回涉及的进程数，不支持时抛出 OSError"""
+    pids = [pid for pid, _ in list_descendants(process.pid)]
+    if os.name == "nt":
+        if psutil is None:
+            raise OSError("Windows 上暂停任务需要安装 psutil")
+        for pid in [process.pid] + pids:
+            try:
+                target = psutil.Process(pid)
+                target.suspend() if suspend else target.resume()
+            except psutil.Error:
+                pass
+    else:
+        _signal_group(process, pids, signal.SIGSTOP if suspend else signal.SIGCONT)
+    return len(pids) + 1
@@ -0,0 +1,93 @@
+"""命名设置配置（profile）的存储
+
+所有配置保存在一个 SQLite 文件中。每个配置只保存与基础配置（未指定时为默认设置）不同的
+设置项，读取时沿继承链逐层叠加，因此修改基础配置会影响所有继承它的配置。
+"""
+import json
+import os
+import sqlite3
+
+from .settings import DEFAULT_SETTINGS
+
+PROFILES_PATH = os.path.join(os.path.expanduser("~"), "m3u8_downloader_profiles.db")
+
+# 与单个任务有关、不保存到配置中的设置项
+PROFILE_EXCLUDED_KEYS = ("m3u8_url", "always_on_top")
+
+
+class ProfileError(Exception):
+    pass
+
+
+class ProfileStore:
+    def __init__(self, path=PROFILES_PATH):
+        self.path = path
+        self.connection = None
+    
+    def connect(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(self.path)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS profiles ("
+                "name TEXT PRIMARY KEY, base TEXT, settings TEXT NOT NULL)"
+            )
+        return self.connection
+    
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+    
+    def names(self):
+        rows = self.connect().execute("SELECT name FROM profiles ORDER BY name COLLATE NOCASE")
+        return [row[0] for row in rows]
+    
+    def get(self, name):
+        """返回 (基础配置名, 该配置自身保存的设置项)"""
+        row = self.connect().execute("SELECT base, settings FROM profiles WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            raise ProfileError(f"配置不存在：{name}")
+        return row[0], json.loads(row[1])
+    
+    def chain(self, name):
+        """返回从该配置到最顶层基础配置的名称列表"""
+        chain = []
+        while name:
+            if name in chain:
+                raise ProfileError(f"配置继承出现循环：{' → '.join(chain + [name])}")
+            chain.append(name)
+            name = self.get(name)[0]
+        return chain
+    
+    def resolve(self, name):
+        """沿继承链叠加，返回配置的完整设置"""
+        settings = dict(DEFAULT_SETTINGS)
+        for name in reversed(self.chain(name)):
+            settings.update(self.get(name)[1])
+        return settings
+    
+    def save(self, name, settings, base=None):
+        """保存配置，只记录与基础配置不同的设置项"""
+        name = name.strip()
+        if not name:
+            raise ProfileError("配置名称不能为空")
+        if base and name in self.chain(base):
+            raise ProfileError(f"配置不能继承自身：{name}")
+        parent = self.resolve(base) if base else DEFAULT_SETTINGS
+        overrides = {key: value for key, value in settings.items()
+                     if key not in PROFILE_EXCLUDED_KEYS and parent.get(key) != value}
+        connection = self.connect()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO profiles (name, base, settings) VALUES (?, ?, ?)",
+                (name, base or None, json.dumps(overrides, ensure_ascii=False)),
+            )
+        return overrides
+    
+    def delete(self, name):
+        connection = self.connect()
+        children = [row[0] for row in connection.execute("SELECT name FROM profiles WHERE base = ?", (name,))]
+        if children:
+            raise ProfileError(f"以下配置继承自 {name}，不能删除：{'、'.join(children)}")
+        with connection:
+            connection.execute("DELETE FROM profiles WHERE name = ?", (name,))
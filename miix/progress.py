@@ -0,0 +1,172 @@
+"""N_m3u8DL-RE 输出的进度解析
+
+进度行形如::
+
+    Vid 1920x1080 | 4000 Kbps | 25 ━━━━━━━━━━━━ 105/296 35.47% 58.21MB/164.17MB 8.34MBps 00:00:12
+
+解析结果为 ProgressRecord，包括轨道、百分比、分片数、已下载/总大小、速度和剩余时间。
+以时间戳或日志级别开头的普通日志行（如 "10:01:02.345 INFO : ..."）即使含有百分号和分数也不算进度行；
+进度行必须有进度条，或者有大小/速度字段。
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+
+ANSI_RE = re.compile(r"\x1b\[[0-?]*[ -/]*[@-~]|\x1b[@-Z\\-_]")
+BAR_RE = re.compile(r"[━─╸╺]+")
+SEGMENTS_RE = re.compile(r"(?<![\d.])(\d+)/(\d+)(?![\d.])")
+PERCENT_RE = re.compile(r"(\d+(?:\.\d+)?)%")
+SIZE_RE = re.compile(r"([\d.]+)\s*([KMGT]?i?B)\s*/\s*~?([\d.]+)\s*([KMGT]?i?B)", re.IGNORECASE)
+SPEED_RE = re.compile(r"([\d.]+)\s*([KMGT]?i?B)ps", re.IGNORECASE)
+ETA_RE = re.compile(r"(?<![\d:])(\d{1,3}):(\d{2}):(\d{2})(?![\d:])")
+LOG_PREFIX_RE = re.compile(r"(\d{1,2}:\d{2}:\d{2}(\.\d+)?\s+)?(INFO|WARN|WARNING|ERROR|DEBUG|EXTRA|VERBOSE)\b",
+                           re.IGNORECASE)
+
+TRACK_TYPES = {
+    "vid": "video",
+    "aud": "audio",
+    "sub": "subtitle",
+}
+
+UNIT_FACTORS = {
+    "B": 1,
+    "KB": 1024,
+    "MB": 1024 ** 2,
+    "GB": 1024 ** 3,
+    "TB": 1024 ** 4,
+}
+
+
+@dataclass
+class ProgressRecord:
+    """一条进度行的解析结果，无法得到的字段为 None"""
+    track: str
+    track_type: str
+    percent: float
+    segments_done: Optional[int] = None
+    segments_total: Optional[int] = None
+    downloaded_bytes: Optional[int] = None
+    total_bytes: Optional[int] = None
+    speed: Optional[float] = None  # 字节/秒
+    eta: Optional[int] = None  # 秒
+    raw: str = field(default="", repr=False)
+
+
+def strip_ansi(text):
+    """去除 ANSI 颜色和光标控制序列"""
+    return ANSI_RE.sub("", text)
+
+
+def to_bytes(value, unit):
+    unit = unit.upper().replace("IB", "B")
+    return int(float(value) * UNIT_FACTORS.get(unit, 1))
+
+
+def track_description(line):
+    """进度条之前的轨道描述，没有进度条时取分片数之前的部分"""
+    match = BAR_RE.search(line)
+    if match is None:
+        match = SEGMENTS_RE.search(line) or PERCENT_RE.search(line)
+    if match is None:
+        return ""
+    return line[:match.start()].strip()
+
+
+def track_type_of(track):
+    return TRACK_TYPES.get(track[:3].lower(), "")
+
+
+def is_progress_line(line):
+    return parse_progress_line(line) is not None
+
+
+def parse_progress_line(line):
+    """解析一行输出，不是进度行时返回 None"""
+    line = strip_ansi(line).strip()
+    percent_match = PERCENT_RE.search(line)
+    if percent_match is None or LOG_PREFIX_RE.match(line):
+        return None
+    bar_match = BAR_RE.search(line)
+    tail = line[percent_match.end():]
+    size_match = SIZE_RE.search(tail)
+    speed_match = SPEED_RE.search(tail)
+    if bar_match is None and size_match is None and speed_match is None:
+        # 没有进度条也没有大小和速度，只是普通日志里出现了百分号
+        return None
+    segments_match = SEGMENTS_RE.search(line, bar_match.end() if bar_match else 0)
+    track = track_description(line)
+    record = ProgressRecord(
+        track=track,
+        track_type=track_type_of(track),
+        percent=min(float(percent_match.group(1)), 100.0),
+        raw=line,
+    )
+    if segments_match:
+        record.segments_done = int(segments_match.group(1))
+        record.segments_total = int(segments_match.group(2))
+    if size_match:
+        record.downloaded_bytes = to_bytes(size_match.group(1), size_match.group(2))
+        record.total_bytes = to_bytes(size_match.group(3), size_match.group(4))
+    if speed_match:
+        record.speed = float(to_bytes(speed_match.group(1), speed_match.group(2)))
+    eta_match = ETA_RE.search(tail)
+    if eta_match:
+        hours, minutes, seconds = (int(part) for part in eta_match.groups())
+        record.eta = hours * 3600 + minutes * 60 + seconds
+    return record
+
+
+def iter_progress(lines):
+    """从一组输出行中依次取出进度记录，便于对录制的输出做回放测试"""
+    for line in lines:
+        record = parse_progress_line(line)
+        if record is not None:
+            yield record
+
+
+def overall_percent(records):
+    """多个轨道的总体进度：优先按字节加权，其次按分片数加权，最后取平均"""
+    records = list(records)
+    if not records:
+        return 0.0
+    sized = [record for record in records if record.total_bytes]
+    if len(sized) == len(records):
+        total = sum(record.total_bytes for record in sized)
+        # 已下载字节数只精确到两位小数，以百分比为准换算
+        done = sum(record.total_bytes * record.percent / 100 for record in sized)
+        return min(done / total * 100, 100.0)
+    counted = [record for record in records if record.segments_total]
+    if len(counted) == len(records):
+        total = sum(record.segments_total for record in counted)
+        done = sum(record.segments_total * record.percent / 100 for record in counted)
+        return min(done / total * 100, 100.0)
+    return sum(record.percent for record in records) / len(records)
+
+
+def bottleneck_track(records):
+    """剩余时间最长（没有剩余时间时进度最低）的未完成轨道"""
+    pending = [record for record in records if record.percent < 100]
+    if len(pending) < 2:
+        return None
+    timed = [record for record in pending if record.eta is not None]
+    if len(timed) == len(pending):
+        return max(timed, key=lambda record: record.eta).track
+    return min(pending, key=lambda record: record.percent).track
+
+
+def format_size(size):
+    """字节数格式化为易读的大小"""
+    if size is None:
+        return "-"
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024:
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.2f}{unit}"
+        size /= 1024
+    return f"{size:.2f}TB"
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "-"
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
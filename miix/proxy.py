@@ -0,0 +1,695 @@
+"""本地转发/缓存代理：通过 --custom-proxy 让 N_m3u8DL-RE 经由本机下载
+
+代理运行在监督器的事件循环中（asyncio）。按上游代理设置（自定义代理、是否使用系统代理）和
+缓存设置分组，每组监听一个本机端口；访问源站时仍按任务原来的代理设置转发。
+
+所有本地代理共用各源站的连接池（OriginPools）：HTTP 请求复用与源站的 keep-alive 连接，
+每个源站同时进行的请求/隧道数不超过设置的上限，超出的请求排队等待（空闲的隧道不占名额）；
+并按源站统计请求数、收发字节数、新建/复用的连接数和延迟。
+
+N_m3u8DL-RE 访问 HTTPS 地址时通过 CONNECT 建立隧道，代理看不到内容，只转发不缓存，
+隧道内的连接复用由 N_m3u8DL-RE 自己完成；HTTP 分片按规范化后的地址和 Range 缓存，见 segcache。
+"""
+import asyncio
+import socket
+import time
+import urllib.request
+from collections import deque
+from urllib.parse import urlsplit
+
+from .metrics import summarize
+from .progress import format_size
+from .segcache import (
+    MB, WRITE_BACKLOG, SegmentCache, cache_key, is_cacheable_type, is_cacheable_url, parse_param_list,
+)
+
+READ_SIZE = 64 * 1024
+HEAD_LIMIT = 64 * 1024
+CONNECT_TIMEOUT = 30
+# 等待上游响应头、读取消息体时两次收到数据之间最长的秒数（N_m3u8DL-RE 默认的请求超时为 100 秒）
+READ_TIMEOUT = 120
+# 隧道没有数据往来这么多秒后归还并发名额（连接保持），再有数据时重新占用，名额用完时暂停转发等待；
+# 超过 TUNNEL_IDLE_TIMEOUT 秒关闭隧道
+TUNNEL_IDLE_RELEASE = 5
+TUNNEL_IDLE_TIMEOUT = 300
+TUNNEL_CHECK_INTERVAL = 1
+# 响应体长度：按分块编码读取 / 读到连接关闭
+CHUNKED = -1
+UNTIL_CLOSE = None
+# 逐跳头部，不转发
+HOP_HEADERS = {"connection", "proxy-connection", "keep-alive", "proxy-authorization", "proxy-authenticate",
+               "te", "trailer", "upgrade"}
+# 缓存命中时回放的响应头
+REPLAY_HEADERS = {"content-type", "content-range", "accept-ranges", "last-modified", "etag"}
+# 空闲连接保留的秒数和每个源站最多保留的空闲连接数
+POOL_IDLE_TIMEOUT = 30
+POOL_MAX_IDLE = 16
+# 每个源站保留的延迟样本数
+LATENCY_SAMPLES = 500
+DEFAULT_IGNORE_PARAMS = "token,expires,signature,policy,key-pair-id,hdnts,auth_key"
+# 代理连接中断、上游无法访问等，都只结束当前连接
+CONNECTION_ERRORS = (OSError, EOFError, ValueError, asyncio.LimitOverrunError, asyncio.TimeoutError)
+
+
+class ProxyError(Exception):
+    pass
+
+
+def header(headers, name):
+    """[(名称, 值)] 中的头部，不区分大小写，没有时返回空字符串"""
+    name = name.lower()
+    return next((value for key, value in headers if key.lower() == name), "")
+
+
+def set_custom_proxy(cmd, proxy_url):
+    """把命令中的 --custom-proxy 替换为 proxy_url"""
+    cmd = list(cmd)
+    if "--custom-proxy" in cmd:
+        cmd[cmd.index("--custom-proxy") + 1] = proxy_url
+    else:
+        cmd.extend(["--custom-proxy", proxy_url])
+    return cmd
+
+
+def parse_proxy(proxy):
+    """"http://主机:端口" -> (主机, 端口)，只支持 HTTP 代理"""
+    if "://" not in proxy:
+        proxy = "http://" + proxy
+    parts = urlsplit(proxy)
+    if parts.scheme.lower() != "http" or not parts.hostname:
+        raise ValueError(f"本地代理只能转发到 HTTP 代理：{proxy}")
+    return parts.hostname, parts.port or 80
+
+
+def response_length(method, status, headers):
+    """响应体的字节数、CHUNKED 或 UNTIL_CLOSE"""
+    if method == "HEAD" or 100 <= status < 200 or status in (204, 304):
+        return 0
+    if "chunked" in header(headers, "Transfer-Encoding").lower():
+        return CHUNKED
+    length = header(headers, "Content-Length")
+    return int(length) if length.isdigit() else UNTIL_CLOSE
+
+
+async def read_head(reader, timeout=None):
+    """读取请求/响应的首行和头部，连接在两次请求之间关闭时返回 None；超时抛出 asyncio.TimeoutError"""
+    try:
+        data = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial.strip():
+            return None
+        raise ProxyError("头部不完整")
+    lines = data.decode('latin-1').split("\r\n")
+    headers = []
+    for line in lines[1:]:
+        name, sep, value = line.partition(':')
+        if sep:
+            headers.append((name.strip(), value.strip()))
+    return lines[0], headers
+
+
+def encode_head(first_line, headers):
+    lines = [first_line] + [f"{name}: {value}" for name, value in headers]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1')
+
+
+async def relay_body(reader, writer, length, sink=None):
+    """按长度/分块编码/直到关闭转发消息体，返回是否完整收到；READ_TIMEOUT 秒收不到数据时抛出 asyncio.TimeoutError"""
+    if length == CHUNKED:
+        while True:
+            line = await asyncio.wait_for(reader.readline(), READ_TIMEOUT)
+            writer.write(line)
+            size = int(line.split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                # 结尾的 trailer 直到空行
+                while line not in (b"\r\n", b"\n", b""):
+                    line = await asyncio.wait_for(reader.readline(), READ_TIMEOUT)
+                    writer.write(line)
+                await writer.drain()
+                return True
+            data = await asyncio.wait_for(reader.readexactly(size + 2), READ_TIMEOUT)
+            if sink is not None:
+                sink(data[:-2])
+            writer.write(data)
+            await writer.drain()
+    remaining = length
+    while remaining is UNTIL_CLOSE or remaining > 0:
+        data = await asyncio.wait_for(
+            reader.read(READ_SIZE if remaining is UNTIL_CLOSE else min(READ_SIZE, remaining)), READ_TIMEOUT)
+        if not data:
+            return remaining is UNTIL_CLOSE
+        if remaining is not UNTIL_CLOSE:
+            remaining -= len(data)
+        if sink is not None:
+            sink(data)
+        writer.write(data)
+        await writer.drain()
+    return True
+
+
+async def pipe(reader, writer, count, hold=None):
+    """隧道的一个方向，读到结束后关闭对端的写入；count(字节数) 用于统计，hold() 在转发每块数据前等待并发名额"""
+    try:
+        while True:
+            data = await reader.read(READ_SIZE)
+            if not data:
+                break
+            if hold is not None:
+                await hold()
+            writer.write(data)
+            await writer.drain()
+            count(len(data))
+        if writer.can_write_eof():
+            writer.write_eof()
+    except CONNECTION_ERRORS:
+        writer.close()
+
+
+async def send_error(writer, status, message):
+    body = message.encode('utf-8')
+    writer.write(encode_head(f"HTTP/1.1 {status}", [
+        ("Content-Type", "text/plain; charset=utf-8"), ("Content-Length", str(len(body))),
+        ("Connection", "close")]) + body)
+    await writer.drain()
+
+
+async def open_connection(address):
+    return await asyncio.wait_for(asyncio.open_connection(*address, limit=HEAD_LIMIT), CONNECT_TIMEOUT)
+
+
+class OriginStats:
+    """一个源站经由本地代理的流量和延迟；事件循环线程写入，界面线程只读"""
+    
+    def __init__(self):
+        self.requests = 0
+        self.tunnels = 0
+        self.cache_hits = 0
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.connections = 0
+        self.reused = 0
+        self.active = 0
+        self.waiting = 0
+        self.open_tunnels = 0
+        # 秒：HTTP 请求为收到响应头的时间，隧道为建立连接的时间
+        self.latency = deque(maxlen=LATENCY_SAMPLES)
+    
+    def add_received(self, size):
+        self.bytes_received += size
+    
+    def add_sent(self, size):
+        self.bytes_sent += size
+    
+    def latency_summary(self):
+        """(最小值, 平均值, P95)，没有数据时返回 None"""
+        return summarize(list(self.latency))
+    
+    def describe(self):
+        text = (f"请求 {self.requests} 次，隧道 {self.tunnels} 个，缓存命中 {self.cache_hits} 次，"
+                f"收 {format_size(self.bytes_received)} 发 {format_size(self.bytes_sent)}，"
+                f"连接 新建 {self.connections} 复用 {self.reused}，进行中 {self.active} 等待 {self.waiting}，"
+                f"打开的隧道 {self.open_tunnels}")
+        latency = self.latency_summary()
+        if latency:
+            text += f"，延迟 平均 {latency[1] * 1000:.0f}ms P95 {latency[2] * 1000:.0f}ms"
+        return text
+
+
+class PooledConnection:
+    def __init__(self, reader, writer, reused=False):
+        self.reader = reader
+        self.writer = writer
+        self.reused = reused
+        self.idle_since = 0.0
+    
+    def close(self):
+        self.writer.close()
+
+
+class OriginPool:
+    """经由同一地址（源站或上游代理）访问一个源站的空闲连接和并发名额，只在事件循环线程中使用"""
+    
+    def __init__(self, address, stats):
+        self.address = address
+        self.stats = stats
+        self.limit = 0  # 0 为不限制
+        self.active = 0
+        self.idle = []
+        self.condition = asyncio.Condition()
+    
+    async def acquire(self):
+        """占用一个并发名额，达到上限时等待"""
+        self.stats.waiting += 1
+        try:
+            async with self.condition:
+                await self.condition.wait_for(lambda: not self.limit or self.active < self.limit)
+                self.active += 1
+        finally:
+            self.stats.waiting -= 1
+        self.stats.active += 1
+    
+    async def release(self):
+        self.active -= 1
+        self.stats.active -= 1
+        async with self.condition:
+            self.condition.notify()
+    
+    async def connect(self, reuse=True):
+        """取一个空闲连接，没有可用的时新建"""
+        now = time.monotonic()
+        while reuse and self.idle:
+            connection = self.idle.pop()
+            if now - connection.idle_since < POOL_IDLE_TIMEOUT and not connection.reader.at_eof():
+                connection.reused = True
+                self.stats.reused += 1
+                return connection
+            connection.close()
+        reader, writer = await open_connection(self.address)
+        self.stats.connections += 1
+        return PooledConnection(reader, writer)
+    
+    def check_in(self, connection):
+        """响应已完整读完的连接放回空闲列表"""
+        if len(self.idle) >= POOL_MAX_IDLE:
+            connection.close()
+            return
+        connection.idle_since = time.monotonic()
+        self.idle.append(connection)
+    
+    def close(self):
+        for connection in self.idle:
+            connection.close()
+        self.idle.clear()
+
+
+class TunnelSlot:
+    """隧道占用的并发名额：空闲 TUNNEL_IDLE_RELEASE 秒后归还，再有数据时重新占用，名额用完时暂停转发等待"""
+    
+    def __init__(self, pool):
+        self.pool = pool
+        self.holding = False
+        self.last_activity = time.monotonic()
+        self.lock = asyncio.Lock()
+    
+    async def hold(self):
+        self.last_activity = time.monotonic()
+        if self.holding:
+            return
+        async with self.lock:  # 两个方向同时恢复时只占用一个名额
+            if not self.holding:
+                await self.pool.acquire()
+                self.holding = True
+                self.last_activity = time.monotonic()
+    
+    def touch(self):
+        self.last_activity = time.monotonic()
+    
+    def idle(self):
+        return time.monotonic() - self.last_activity
+    
+    async def release(self):
+        if self.holding:
+            self.holding = False
+            await self.pool.release()
+
+
+class OriginPools:
+    """所有本地代理共用的连接池和按源站的统计"""
+    
+    def __init__(self):
+        self.pools = {}
+        # {源站(主机:端口): OriginStats}
+        self.stats = {}
+        self.limit = 0
+    
+    def stats_of(self, origin):
+        stats = self.stats.get(origin)
+        if stats is None:
+            stats = self.stats[origin] = OriginStats()
+        return stats
+    
+    def pool(self, origin, address):
+        """只能在事件循环线程中调用"""
+        pool = self.pools.get((origin, address))
+        if pool is None:
+            pool = self.pools[(origin, address)] = OriginPool(address, self.stats_of(origin))
+        pool.limit = self.limit
+        return pool
+    
+    def close(self):
+        for pool in self.pools.values():
+            pool.close()
+
+
+class LocalProxy:
+    """监听本机端口的 HTTP 代理；cache 为 None 时只转发不缓存"""
+    
+    def __init__(self, settings, pools, cache=None, host="127.0.0.1"):
+        custom = settings.get("custom_proxy", "").strip()
+        self.custom_proxy = parse_proxy(custom) if custom else None
+        # 系统代理在创建时读取一次，是否绕过按主机缓存，避免每个请求都在事件循环中查询
+        self.system_proxies = {} if custom or settings.get("no_system_proxy", True) else urllib.request.getproxies()
+        self.bypass = {}
+        self.ignore_params = parse_param_list(settings.get("segment_cache_ignore_params", DEFAULT_IGNORE_PARAMS))
+        self.pools = pools
+        self.cache = cache
+        self.host = host
+        self.port = 0
+        self.socket = None
+        self.server = None
+    
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+    
+    def bind(self):
+        """在调用线程中绑定端口并开始监听，地址立即可用；start() 之前到达的连接在系统的等待队列中"""
+        self.socket = socket.create_server((self.host, 0), backlog=128)
+        self.port = self.socket.getsockname()[1]
+    
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_client, sock=self.socket, limit=HEAD_LIMIT)
+    
+    def close(self):
+        """停止监听（只能在事件循环线程中调用）"""
+        if self.server is not None:
+            self.server.close()
+        elif self.socket is not None:
+            self.socket.close()
+    
+    def upstream(self, url):
+        """访问 url 时使用的上游代理 (主机, 端口)，直连时返回 None；与下载任务的代理设置一致"""
+        if self.custom_proxy is not None:
+            return self.custom_proxy
+        parts = urlsplit(url)
+        proxy = self.system_proxies.get(parts.scheme)
+        if not proxy:
+            return None
+        host = parts.hostname or ""
+        if host not in self.bypass:
+            self.bypass[host] = bool(urllib.request.proxy_bypass(host))
+        return None if self.bypass[host] else parse_proxy(proxy)
+    
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                head = await read_head(reader)
+                if head is None:
+                    break
+                request_line, headers = head
+                method, _, rest = request_line.partition(" ")
+                target = rest.rpartition(" ")[0]
+                if method == "CONNECT":
+                    await self.tunnel(target, reader, writer)
+                    break
+                if not await self.forward(method, target, headers, reader, writer):
+                    break
+        except (ProxyError,) + CONNECTION_ERRORS:
+            pass
+        finally:
+            writer.close()
+    
+    async def tunnel(self, target, reader, writer):
+        host, _, port = target.rpartition(":")
+        try:
+            upstream = self.upstream(f"https://{target}")
+            pool = self.pools.pool(target.lower(), upstream or (host.strip("[]"), int(port)))
+        except ValueError as e:
+            await send_error(writer, "400 Bad Request", str(e))
+            return
+        slot = TunnelSlot(pool)
+        await slot.hold()
+        stats = pool.stats
+        stats.tunnels += 1
+        stats.open_tunnels += 1
+        try:
+            started = time.monotonic()
+            connection = None
+            try:
+                connection = await pool.connect(reuse=False)
+                if upstream is not None:
+                    connection.writer.write(encode_head(f"CONNECT {target} HTTP/1.1", [("Host", target)]))
+                    head = await read_head(connection.reader, READ_TIMEOUT)
+                    if head is None or head[0].split(" ")[1:2] != ["200"]:
+                        raise ProxyError(f"上游代理拒绝连接：{head[0] if head else '连接已关闭'}")
+            except (ProxyError,) + CONNECTION_ERRORS as e:
+                if connection is not None:
+                    connection.close()
+                await send_error(writer, "502 Bad Gateway", str(e))
+                return
+            stats.latency.append(time.monotonic() - started)
+            writer.write(b"HTTP/1.1 200 Connection Established\r\n\r\n")
+            
+            def count(add):
+                def counter(size):
+                    slot.touch()
+                    add(size)
+                return counter
+            
+            pipes = asyncio.ensure_future(asyncio.gather(
+                pipe(reader, connection.writer, count(stats.add_sent), slot.hold),
+                pipe(connection.reader, writer, count(stats.add_received), slot.hold)))
+            try:
+                # N_m3u8DL-RE 会保持空闲的隧道以便复用，空闲时归还名额，让其他请求使用
+                while not pipes.done():
+                    await asyncio.wait([pipes], timeout=TUNNEL_CHECK_INTERVAL)
+                    idle = slot.idle()
+                    if idle >= TUNNEL_IDLE_RELEASE:
+                        await slot.release()
+                    if idle >= TUNNEL_IDLE_TIMEOUT:
+                        connection.close()
+                        writer.close()
+            finally:
+                pipes.cancel()
+                connection.close()
+        finally:
+            stats.open_tunnels -= 1
+            await slot.release()
+    
+    async def forward(self, method, url, headers, reader, writer):
+        """转发一个请求，返回客户端连接能否继续使用"""
+        if not url.lower().startswith("http://"):
+            await send_error(writer, "400 Bad Request", "只支持 http:// 地址，HTTPS 请使用 CONNECT")
+            return False
+        keep_alive = "close" not in (header(headers, "Connection") + header(headers, "Proxy-Connection")).lower()
+        request_length = 0
+        if "chunked" in header(headers, "Transfer-Encoding").lower():
+            request_length = CHUNKED
+        elif header(headers, "Content-Length").isdigit():
+            request_length = int(header(headers, "Content-Length"))
+        parts = urlsplit(url)
+        origin = f"{(parts.hostname or '').lower()}:{parts.port or 80}"
+        key = None
+        if self.cache is not None and method == "GET" and request_length == 0 and is_cacheable_url(url):
+            key = cache_key(url, header(headers, "Range"), self.ignore_params)
+            entry = await asyncio.get_running_loop().run_in_executor(None, self.cache.open, key)
+            if entry is not None:
+                self.pools.stats_of(origin).cache_hits += 1
+                await self.serve_cached(*entry, writer)
+                return keep_alive
+        
+        upstream = self.upstream(url)
+        pool = self.pools.pool(origin, upstream or (parts.hostname, parts.port or 80))
+        target = url if upstream else (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        request_head = encode_head(f"{method} {target} HTTP/1.1",
+                                   [(name, value) for name, value in headers if name.lower() not in HOP_HEADERS])
+        await pool.acquire()
+        try:
+            return await self.exchange(pool, method, request_head, request_length, keep_alive, key, reader, writer)
+        finally:
+            await pool.release()
+    
+    async def exchange(self, pool, method, request_head, request_length, keep_alive, key, reader, writer):
+        """经连接池发送请求并转发响应，返回客户端连接能否继续使用"""
+        stats = pool.stats
+        stats.requests += 1
+        connection = store = None
+        try:
+            for reuse in (True, False):
+                started = time.monotonic()
+                connection = await pool.connect(reuse)
+                try:
+                    connection.writer.write(request_head)
+                    stats.add_sent(len(request_head))
+                    if request_length:
+                        await relay_body(reader, connection.writer, request_length, stats.add_sent)
+                    await connection.writer.drain()
+                    head = await read_head(connection.reader, READ_TIMEOUT)
+                    if head is None:
+                        raise ProxyError("上游关闭了连接")
+                    break
+                except (ProxyError,) + CONNECTION_ERRORS:
+                    connection.close()
+                    # 空闲的连接可能已被源站关闭，换新连接重试一次（请求体已转发时无法重发）
+                    if not connection.reused or request_length:
+                        raise
+            stats.latency.append(time.monotonic() - started)
+            status_line, response_headers = head
+            status_text = status_line.partition(" ")[2]
+            status = int(status_text.split(" ")[0])
+            length = response_length(method, status, response_headers)
+            if (key is not None and status in (200, 206) and length is not UNTIL_CLOSE and length > 0
+                    and is_cacheable_type(header(response_headers, "Content-Type"))):
+                meta = {"status": status_text, "headers": [
+                    [name, value] for name, value in response_headers if name.lower() in REPLAY_HEADERS]}
+                store = await asyncio.get_running_loop().run_in_executor(
+                    self.cache.executor, self.cache.begin, key, meta, length)
+        except (ProxyError,) + CONNECTION_ERRORS as e:
+            if connection is not None:
+                connection.close()
+            await send_error(writer, "502 Bad Gateway", str(e))
+            return False
+        
+        def sink(data):
+            nonlocal store
+            stats.add_received(len(data))
+            if store is not None:
+                store.write(data)
+                if store.backlog() > WRITE_BACKLOG:
+                    store.abort()  # 磁盘跟不上，不缓存这个响应
+                    store = None
+        
+        # 源站要求关闭、HTTP/1.0 或读到关闭才结束的响应，连接不能复用
+        reusable = (length is not UNTIL_CLOSE and status_line.startswith("HTTP/1.1")
+                    and "close" not in header(response_headers, "Connection").lower())
+        keep_alive = keep_alive and length is not UNTIL_CLOSE
+        try:
+            writer.write(encode_head(f"HTTP/1.1 {status_text}", [
+                (name, value) for name, value in response_headers if name.lower() not in HOP_HEADERS
+            ] + [("Connection", "keep-alive" if keep_alive else "close")]))
+            complete = await relay_body(connection.reader, writer, length, sink)
+        except BaseException:
+            if store is not None:
+                store.abort()
+            connection.close()
+            raise
+        if reusable and complete:
+            pool.check_in(connection)
+        else:
+            connection.close()
+        if store is not None:
+            if complete:
+                store.commit()  # 在写入线程中完成，不等待
+            else:
+                store.abort()
+        return keep_alive and complete
+    
+    async def serve_cached(self, meta, file, size, writer):
+        loop = asyncio.get_running_loop()
+        with file:
+            writer.write(encode_head(f"HTTP/1.1 {meta['status']}", [
+                (name, value) for name, value in meta["headers"]
+            ] + [("Content-Length", str(size)), ("X-Cache", "HIT")]))
+            while True:
+                data = await loop.run_in_executor(None, file.read, READ_SIZE * 4)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        self.cache.hit_bytes += size
+
+
+class ProxyHub:
+    """按设置分组共用本地代理，代理运行在 loop（监督器的事件循环）中"""
+    
+    def __init__(self, loop, cache=None):
+        self.loop = loop
+        self.cache = cache or SegmentCache()
+        self.pools = OriginPools()
+        self.proxies = {}
+        # 缓存目录的扫描（只在事件循环线程中创建和等待）
+        self.cache_loading = None
+    
+    def proxy_url(self, settings):
+        """任务应使用的本地代理地址，需要时启动；上游代理不是 HTTP 代理时抛出 ValueError，无法监听时抛出 OSError
+        
+        端口在调用线程中绑定，不等待事件循环；缓存目录扫描完之前到达的连接在系统的等待队列中排队。
+        """
+        upstream = settings.get("custom_proxy", "").strip()
+        if upstream:
+            parse_proxy(upstream)
+        caching = bool(settings.get("segment_cache_enabled"))
+        if caching:
+            self.cache.max_bytes = settings.get("segment_cache_size_mb", 10240) * MB
+        self.pools.limit = settings.get("proxy_origin_connections", 8)
+        key = (upstream, settings.get("no_system_proxy", True), caching,
+               settings.get("segment_cache_ignore_params", DEFAULT_IGNORE_PARAMS) if caching else "")
+        proxy = self.proxies.get(key)
+        if proxy is None:
+            proxy = LocalProxy(settings, self.pools, self.cache if caching else None)
+            proxy.bind()
+            self.proxies[key] = proxy
+            asyncio.run_coroutine_threadsafe(self._start(key, proxy), self.loop)
+        return proxy.url
+    
+    async def _start(self, key, proxy):
+        try:
+            if proxy.cache is not None:
+                if self.cache_loading is None:
+                    self.cache_loading = self.loop.run_in_executor(None, self.cache.load)
+                await self.cache_loading
+            await proxy.start()
+        except Exception:
+            # 启动失败时丢弃，下一个任务重新创建；已在等待的连接随监听端口关闭而失败
+            proxy.close()
+            if self.proxies.get(key) is proxy:
+                del self.proxies[key]
+    
+    def close(self):
+        for proxy in self.proxies.values():
+            self.loop.call_soon_threadsafe(proxy.close)
+        self.loop.call_soon_threadsafe(self.pools.close)
+        self.proxies.clear()
+        self.cache.close()
+    
+    def origin_stats(self):
+        """[(源站, OriginStats)]，可在其他线程读取"""
+        return sorted(list(self.pools.stats.items()))
+    
+    def summary(self):
+        """缓存和本地代理的总体说明"""
+        lines = [self.cache.summary()] if self.cache.loaded else []
+        origins = self.origin_stats()
+        if origins:
+            requests = sum(stats.requests + stats.tunnels for _, stats in origins)
+            received = sum(stats.bytes_received for _, stats in origins)
+            lines.append(f"本地代理 {len(origins)} 个源站，请求 {requests} 次，收 {format_size(received)}")
+        return lines
+    
+    def origin_lines(self):
+        return [f"{origin}：{stats.describe()}" for origin, stats in self.origin_stats()]
+    
+    def metric_families(self):
+        """Prometheus 指标，格式同 exporter.render_metrics"""
+        origins = self.origin_stats()
+        
+        def samples(value):
+            return [({"origin": origin}, value(stats)) for origin, stats in origins]
+        
+        latency = [(origin, stats.latency_summary()) for origin, stats in origins]
+        return [
+            ("miix_proxy_requests_total", "counter", "HTTP requests forwarded by the local proxy per origin.",
+             samples(lambda stats: stats.requests)),
+            ("miix_proxy_tunnels_total", "counter", "CONNECT tunnels opened by the local proxy per origin.",
+             samples(lambda stats: stats.tunnels)),
+            ("miix_proxy_cache_hits_total", "counter", "Requests served from the segment cache per origin.",
+             samples(lambda stats: stats.cache_hits)),
+            ("miix_proxy_received_bytes_total", "counter", "Bytes received from each origin.",
+             samples(lambda stats: stats.bytes_received)),
+            ("miix_proxy_sent_bytes_total", "counter", "Bytes sent to each origin.",
+             samples(lambda stats: stats.bytes_sent)),
+            ("miix_proxy_connections_opened_total", "counter", "Upstream connections opened per origin.",
+             samples(lambda stats: stats.connections)),
+            ("miix_proxy_connections_reused_total", "counter", "Requests that reused a pooled connection.",
+             samples(lambda stats: stats.reused)),
+            ("miix_proxy_active_requests", "gauge", "Requests and tunnels in progress per origin.",
+             samples(lambda stats: stats.active)),
+            ("miix_proxy_waiting_requests", "gauge", "Requests waiting for the per-origin concurrency limit.",
+             samples(lambda stats: stats.waiting)),
+            ("miix_proxy_open_tunnels", "gauge", "CONNECT tunnels currently open per origin, including idle ones.",
+             samples(lambda stats: stats.open_tunnels)),
+            ("miix_proxy_latency_avg_seconds", "gauge", "Average time to response headers or tunnel setup.",
+             [({"origin": origin}, summary[1]) for origin, summary in latency if summary]),
+            ("miix_proxy_latency_p95_seconds", "gauge", "95th percentile time to response headers or tunnel setup.",
+             [({"origin": origin}, summary[2]) for origin, summary in latency if summary]),
+        ]
@@ -0,0 +1,140 @@
+"""未完成任务的记录和断点续传
+
+排队中、下载中、已暂停和已停止的任务记录在 JOBS_PATH 中，程序重新启动后可以恢复。
+N_m3u8DL-RE 把分片保存在 临时目录/保存名称/ 下，以相同的保存名称和临时目录重新下载时
+会跳过已下载的分片，因此任务加入队列时为没有标题的任务固定保存名称。
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+from .command import build_command_from_settings, resolve_work_dir
+from .settings import write_file_atomic
+
+JOBS_PATH = os.path.join(os.path.expanduser("~"), "m3u8_downloader_jobs.json")
+
+# 两次写入任务记录的最短间隔（秒）
+JOURNAL_INTERVAL = 2.0
+# 重新启动后可以恢复的任务状态（与 DownloadJob 的状态名相同）
+RESUMABLE_STATUSES = ("排队中", "下载中", "已暂停", "已停止", "等待重试")
+# 影响下载内容的设置，参与生成保存名称
+SAVE_NAME_KEYS = ("headers", "select_video", "select_audio", "select_subtitle", "drop_video", "drop_audio",
+                  "drop_subtitle", "auto_video_height", "start_time", "end_time")
+# 文件名中不能出现的字符
+UNSAFE_NAME_RE = re.compile(r'[\\/:*?"<>|]')
+
+
+def pin_save_name(settings, taken=()):
+    """没有指定保存名称时固定一个，重新下载时分片目录不变
+    
+    名称为地址的文件名加上地址、请求头、轨道选择和范围的短哈希：不同地址的 index.m3u8
+    不会共用分片目录和输出文件，同一个任务重新加入队列时仍得到相同的名称。
+    taken 为正在使用的名称（未结束的任务），重复时再加序号。
+    """
+    if settings.get("title"):
+        return settings
+    url = settings.get("m3u8_url", "")
+    stem = UNSAFE_NAME_RE.sub("_", os.path.splitext(os.path.basename(urlsplit(url).path))[0]) or "download"
+    identity = "\n".join([url] + [str(settings.get(key, "")) for key in SAVE_NAME_KEYS])
+    stem = f"{stem}_{hashlib.sha1(identity.encode('utf-8')).hexdigest()[:8]}"
+    title = stem
+    index = 2
+    while title in taken:
+        title = f"{stem}_{index}"
+        index += 1
+    return dict(settings, title=title)
+
+
+def segment_dir(settings):
+    return os.path.join(settings.get("tmp_dir") or resolve_work_dir(settings), settings.get("title", ""))
+
+
+def count_segments(settings):
+    """统计临时目录中已下载的分片，返回 (文件数, 字节数)"""
+    if not settings.get("title"):
+        return 0, 0
+    count = total = 0
+    for root, _, files in os.walk(segment_dir(settings)):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+            count += 1
+    return count, total
+
+
+class JobJournal:
+    """把未完成的任务写入 JSON 文件
+    
+    调度器在任务增删和状态变化时调用 mark_dirty()，在 tick() 中调用 flush_if_due()；
+    写入在后台线程中进行，批量导入大量任务时也只会合并成少数几次写入。
+    """
+    
+    def __init__(self, path=JOBS_PATH):
+        self.path = path
+        self.dirty = False
+        self.last_write = 0
+        self.writer = None
+    
+    def load(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return [entry for entry in json.load(f) if entry.get("status") in RESUMABLE_STATUSES]
+    
+    def mark_dirty(self):
+        self.dirty = True
+    
+    def flush_if_due(self, jobs, force=False):
+        """force 为 True 时（退出前）同步写入，并等待尚未完成的后台写入"""
+        if force and self.writer is not None:
+            self.writer.join()
+        if not self.dirty:
+            return
+        if not force and (time.monotonic() - self.last_write < JOURNAL_INTERVAL or
+                          (self.writer is not None and self.writer.is_alive())):
+            return
+        entries = [{
+            "settings": job.settings,
+            "profile": job.profile,
+            "overrides": job.overrides,
+            "status": job.status,
+        } for job in jobs if job.status in RESUMABLE_STATUSES]
+        text = json.dumps(entries, ensure_ascii=False)
+        self.dirty = False
+        self.last_write = time.monotonic()
+        if force:
+            self.write(text)
+            return
+        self.writer = threading.Thread(target=self.write, args=(text,), name="job-journal", daemon=True)
+        self.writer.start()
+    
+    def write(self, text):
+        try:
+            write_file_atomic(self.path, text)
+        except OSError:
+            self.dirty = True  # 下次再试
+
+
+def restore_jobs(scheduler, entries, queue_all=False):
+    """把上次未完成的任务加回队列，返回 [(任务, 已有分片数, 字节数)]
+    
+    上次下载中或排队中的任务重新排队，已暂停和已停止的任务恢复为已停止，由用户手动开始
+    （queue_all 为 True 时全部重新排队）。
+    """
+    restored = []
+    for entry in entries:
+        settings = entry.get("settings") or {}
+        if not settings.get("m3u8_url"):
+            continue
+        queued = queue_all or entry.get("status") in ("排队中", "下载中", "等待重试")
+        job = scheduler.add_job(settings, build_command_from_settings(settings), resolve_work_dir(settings),
+                                entry.get("profile"), entry.get("overrides"), queued=queued)
+        count, size = count_segments(settings)
+        restored.append((job, count, size))
+    return restored
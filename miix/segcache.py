@@ -0,0 +1,275 @@
+"""按内容寻址的分片缓存，多个任务和重复下载共用
+
+缓存键为规范化后的分片地址（协议和主机名转小写、去掉默认端口、查询参数排序并去掉每次都会变化的
+签名/令牌参数）加上 Range 请求头，取 SHA-256 作为文件名。缓存的是服务器返回的原始字节，
+解密仍由 N_m3u8DL-RE 完成，因此密钥和 IV 不影响缓存内容（密钥文件本身也按地址缓存）。
+
+文件第一行是 JSON 格式的响应状态和需要回放的响应头，之后是响应体。总大小超过上限时按最近
+使用时间删除最久未用的文件（LRU），使用时间记录在文件的修改时间上，重新启动后仍然有效。
+
+这里的方法都会读写磁盘，代理在事件循环之外调用：load()/open() 放到线程池，begin() 和写入
+放到缓存自己的写入线程（按提交顺序执行），索引由锁保护。
+"""
+import concurrent.futures
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict, deque
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from .progress import format_size
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), "m3u8_downloader_cache")
+MB = 1024 * 1024
+DEFAULT_PORTS = {"http": 80, "https": 443}
+# 清单可能变化（直播），不缓存
+PLAYLIST_SUFFIXES = (".m3u8", ".m3u", ".mpd")
+PLAYLIST_TYPES = ("mpegurl", "dash+xml")
+# 单个文件最多占缓存上限的几分之一，更大的响应（如整个视频文件）不缓存
+ENTRY_LIMIT_RATIO = 8
+PART_SUFFIX = ".part"
+# 攒够这么多字节再交给写入线程；写入积压超过上限时调用方放弃缓存该响应，避免占用过多内存
+WRITE_CHUNK = 1 * MB
+WRITE_BACKLOG = 32 * MB
+
+
+def parse_param_list(text):
+    """逗号分隔的参数名列表"""
+    return tuple(name.strip() for name in text.replace(';', ',').split(',') if name.strip())
+
+
+def normalize_url(url, ignore_params=()):
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    netloc = host if parts.port in (None, DEFAULT_PORTS.get(scheme)) else f"{host}:{parts.port}"
+    ignored = {name.lower() for name in ignore_params}
+    query = sorted((name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if name.lower() not in ignored)
+    return urlunsplit((scheme, netloc, parts.path or "/", urlencode(query), ""))
+
+
+def cache_key(url, byte_range="", ignore_params=()):
+    text = normalize_url(url, ignore_params) + "\n" + byte_range.strip()
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def is_cacheable_url(url):
+    return not urlsplit(url).path.lower().endswith(PLAYLIST_SUFFIXES)
+
+
+def is_cacheable_type(content_type):
+    return not any(name in content_type.lower() for name in PLAYLIST_TYPES)
+
+
+class CacheWriter:
+    """边下载边写入临时文件，完整收到后 commit() 才加入缓存
+    
+    write()/commit()/abort() 在事件循环中调用，实际的文件操作在缓存的写入线程中按顺序执行。
+    """
+    
+    def __init__(self, cache, key, path, file):
+        self.cache = cache
+        self.key = key
+        self.path = path
+        self.file = file
+        self.buffer = []
+        self.buffered = 0
+        # 已提交、可能还没写完的 (Future, 字节数)
+        self.pending = deque()
+        self.failed = False
+    
+    def write(self, data):
+        self.buffer.append(data)
+        self.buffered += len(data)
+        if self.buffered >= WRITE_CHUNK:
+            self._submit()
+    
+    def backlog(self):
+        """还没写入磁盘的字节数"""
+        while self.pending and self.pending[0][0].done():
+            self.pending.popleft()
+        return sum(size for _, size in self.pending) + self.buffered
+    
+    def commit(self):
+        """返回 concurrent.futures.Future，写完并加入缓存后完成"""
+        if self.buffer:
+            self._submit()
+        return self.cache.executor.submit(self._finish)
+    
+    def abort(self):
+        self.buffer.clear()
+        self.buffered = 0
+        self.cache.executor.submit(self._discard)
+    
+    def _submit(self):
+        data = b"".join(self.buffer)
+        self.buffer.clear()
+        self.buffered = 0
+        self.pending.append((self.cache.executor.submit(self._write, data), len(data)))
+    
+    def _write(self, data):
+        if self.failed:
+            return
+        try:
+            self.file.write(data)
+        except OSError:
+            self.failed = True
+    
+    def _finish(self):
+        if self.failed:
+            self._discard()
+            return
+        try:
+            self.file.close()
+        except OSError:
+            self._discard()
+            return
+        self.cache._add(self.key, self.path)
+    
+    def _discard(self):
+        try:
+            self.file.close()
+        except OSError:
+            pass
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class SegmentCache:
+    """磁盘上的分片缓存；方法会读写磁盘，不要在事件循环线程中直接调用"""
+    
+    def __init__(self, root=CACHE_DIR, max_bytes=10240 * MB):
+        self.root = root
+        self.max_bytes = max_bytes
+        # {键: 字节数}，按最近使用时间排序，最久未用的在前
+        self.entries = OrderedDict()
+        self.total = 0
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.hit_bytes = 0
+        # 写入缓存文件的线程，只有一个，按提交顺序执行
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="segment-cache")
+    
+    def load(self):
+        """扫描缓存目录，按修改时间恢复使用顺序；清理上次未完成的临时文件"""
+        found = []
+        try:
+            directories = [entry for entry in os.scandir(self.root) if entry.is_dir()]
+        except OSError:
+            self.loaded = True
+            return
+        for directory in directories:
+            try:
+                files = list(os.scandir(directory.path))
+            except OSError:
+                continue
+            for entry in files:
+                try:
+                    if entry.name.endswith(PART_SUFFIX):
+                        os.remove(entry.path)
+                    else:
+                        stat = entry.stat()
+                        found.append((stat.st_mtime, entry.name, stat.st_size))
+                except OSError:
+                    continue
+        with self.lock:
+            for _, key, size in sorted(found):
+                self.entries[key] = size
+                self.total += size
+        self.evict()
+        self.loaded = True
+    
+    def path_of(self, key):
+        return os.path.join(self.root, key[:2], key)
+    
+    def open(self, key):
+        """命中时返回 (元数据, 位于响应体开头的文件对象, 响应体字节数)，否则返回 None"""
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+        try:
+            os.utime(self.path_of(key))  # 记录使用时间
+            file = open(self.path_of(key), 'rb')
+        except OSError:
+            self._forget(key)
+            self.misses += 1
+            return None
+        try:
+            meta = json.loads(file.readline())
+            body_start = file.tell()
+            size = os.fstat(file.fileno()).st_size - body_start
+        except (OSError, ValueError):
+            file.close()
+            self._forget(key)
+            self.misses += 1
+            return None
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+            self.hits += 1
+        return meta, file, size
+    
+    def begin(self, key, meta, length):
+        """开始写入一个响应，过大或无法写入时返回 None"""
+        if length > self.max_bytes // ENTRY_LIMIT_RATIO:
+            return None
+        directory = os.path.dirname(self.path_of(key))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, path = tempfile.mkstemp(suffix=PART_SUFFIX, dir=directory)
+            file = os.fdopen(fd, 'wb')
+            file.write(json.dumps(meta, ensure_ascii=False).encode('utf-8') + b"\n")
+        except OSError:
+            return None
+        return CacheWriter(self, key, path, file)
+    
+    def _add(self, key, part_path):
+        path = self.path_of(key)
+        try:
+            os.replace(part_path, path)
+            size = os.path.getsize(path)
+        except OSError:
+            return
+        with self.lock:
+            self.total -= self.entries.pop(key, 0)
+            self.entries[key] = size
+            self.total += size
+        self.evict()
+    
+    def _forget(self, key):
+        with self.lock:
+            self.total -= self.entries.pop(key, 0)
+        try:
+            os.remove(self.path_of(key))
+        except OSError:
+            pass
+    
+    def evict(self):
+        """删除最久未用的文件直到不超过上限"""
+        removed = []
+        with self.lock:
+            while self.total > self.max_bytes and self.entries:
+                key, size = self.entries.popitem(last=False)
+                self.total -= size
+                removed.append(key)
+        for key in removed:
+            try:
+                os.remove(self.path_of(key))
+            except OSError:
+                pass
+    
+    def close(self):
+        """不再接受新的写入；已提交的写入在后台线程中完成"""
+        self.executor.shutdown(wait=False)
+    
+    def summary(self):
+        return (f"分片缓存 {format_size(self.total)}/{format_size(self.max_bytes)}，"
+                f"命中 {self.hits} 次（{format_size(self.hit_bytes)}），未命中 {self.misses} 次")
@@ -0,0 +1,154 @@
+"""设置的默认值和 JSON 文件读写"""
+import json
+import os
+import tempfile
+import threading
+
+from .options import default_settings
+
+# 每次下载结束和保存设置时都会写入，启动时自动加载
+LAST_SETTINGS_PATH = os.path.join(os.path.expanduser("~"), "m3u8_downloader_last_settings.json")
+
+# 默认值来自设置项声明表
+DEFAULT_SETTINGS = default_settings()
+
+# 连续保存时合并写入的等待时间（秒）
+SAVE_DELAY = 1.0
+# 变更日志累计多少条后合并回设置文件
+COMPACT_EVERY = 50
+
+
+def load_settings_file(path):
+    """读取设置文件，缺少的键使用默认值"""
+    with open(path, 'r', encoding='utf-8') as f:
+        settings = json.load(f)
+    merged = dict(DEFAULT_SETTINGS)
+    merged.update(settings)
+    return merged
+
+
+def write_file_atomic(path, text):
+    """先写入同目录的临时文件再替换，断电或崩溃时不会留下写了一半的文件"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def save_settings_file(path, settings):
+    write_file_atomic(path, json.dumps(settings, ensure_ascii=False, indent=4))
+
+
+class SettingsStore:
+    """上次设置的持久化：延迟合并写入，只把变化的键追加到变更日志
+    
+    save() 只记录待写入的变化并（重新）开始计时，写入在计时器线程中进行，不阻塞界面。
+    变更日志（设置文件名加 .journal）每行是一次写入中变化的键；日志累计 COMPACT_EVERY
+    条后把完整设置原子地写回设置文件并清空日志。读取时先读设置文件再按顺序重放日志，
+    最后一行因断电写了一半时忽略。
+    """
+    
+    def __init__(self, path=LAST_SETTINGS_PATH, delay=SAVE_DELAY, compact_every=COMPACT_EVERY):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.delay = delay
+        self.compact_every = compact_every
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.saved = None  # 已写入磁盘的设置
+        self.pending = {}
+        self.timer = None
+        self.journal_entries = 0
+        self.on_error = None  # on_error(异常)，在计时器线程中调用
+    
+    def exists(self):
+        return os.path.exists(self.path) or os.path.exists(self.journal_path)
+    
+    def load(self):
+        """读取设置文件并重放变更日志，设置文件损坏时抛出 ValueError"""
+        settings = load_settings_file(self.path) if os.path.exists(self.path) else dict(DEFAULT_SETTINGS)
+        entries = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        changes = json.loads(line)
+                    except ValueError:
+                        # 写了一半的最后一行：丢弃，下次写入时直接合并回设置文件
+                        entries = self.compact_every
+                        break
+                    settings.update(changes)
+                    entries += 1
+        with self.lock:
+            self.saved = dict(settings)
+            self.journal_entries = entries
+        return settings
+    
+    def save(self, settings):
+        """记录变化的设置，等待 delay 秒内没有新的保存后再写入"""
+        with self.lock:
+            base = dict(self.saved or {})
+            base.update(self.pending)
+            changes = {key: value for key, value in settings.items() if base.get(key, object()) != value}
+            if not changes:
+                return
+            self.pending.update(changes)
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.delay, self.flush_quietly)
+            self.timer.daemon = True
+            self.timer.start()
+    
+    def flush_quietly(self):
+        try:
+            self.flush()
+        except Exception as e:
+            if self.on_error is not None:
+                self.on_error(e)
+    
+    def flush(self):
+        """立即写入待保存的变化（退出程序时调用）"""
+        with self.write_lock:
+            with self.lock:
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+                changes, self.pending = self.pending, {}
+                if not changes:
+                    return
+                settings = dict(self.saved if self.saved is not None else DEFAULT_SETTINGS)
+                settings.update(changes)
+                compact = self.saved is None or self.journal_entries + 1 >= self.compact_every
+            try:
+                if compact:
+                    self.compact(settings)
+                else:
+                    with open(self.journal_path, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(changes, ensure_ascii=False) + "\n")
+                        f.flush()
+                        os.fsync(f.fileno())
+            except Exception:
+                with self.lock:
+                    # 写入失败时放回去，下次保存再试
+                    changes.update(self.pending)
+                    self.pending = changes
+                raise
+            with self.lock:
+                self.saved = settings
+                self.journal_entries = 0 if compact else self.journal_entries + 1
+    
+    def compact(self, settings):
+        """把完整设置写回设置文件并清空变更日志"""
+        save_settings_file(self.path, settings)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
@@ -0,0 +1,153 @@
+"""单线程的子进程监督器
+
+所有下载子进程都由一个 asyncio 事件循环线程管理：每次从管道读取一大块，增量切分成行，
+不再为每个任务占用一个阻塞在 readline() 上的线程。产生的事件先在监督器中累积，每隔
+BATCH_INTERVAL 秒通过 post(事件列表) 一次性交给宿主（界面用一个 Qt 信号，命令行模式
+放入 queue.Queue），宿主再在调度器所在的线程中逐个 dispatch()。
+
+Windows 上使用 ProactorEventLoop 以支持子进程管道。
+"""
+import asyncio
+import sys
+import threading
+import time
+
+from .jobs import DownloadProcess
+
+# 事件累积多久后交给宿主（秒）
+BATCH_INTERVAL = 0.05
+# 子进程树资源占用的采样间隔（秒）
+SAMPLE_INTERVAL = 1.0
+
+
+class Supervisor:
+    """在后台事件循环线程中运行所有下载子进程"""
+    
+    def __init__(self, post):
+        self.post = post
+        self.lock = threading.Lock()
+        self.pending = []
+        self.flush_scheduled = False
+        self.runners = set()
+        self.sampler = None
+        # 本地转发/缓存代理（proxy.ProxyHub），第一次使用时创建
+        self.proxy_hub = None
+        if sys.platform == "win32":
+            self.loop = asyncio.ProactorEventLoop()
+        else:
+            self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, name="supervisor", daemon=True)
+        self.thread.start()
+    
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.sampler = self.loop.create_task(self._sample_loop())
+        self.loop.run_forever()
+        self.loop.close()
+    
+    def runner(self, job_id, cmd, work_dir):
+        """调度器的 runner_factory 使用"""
+        return SupervisedRunner(self, job_id, cmd, work_dir)
+    
+    def proxy_url(self, settings):
+        """调度器的 proxy_provider 使用：任务应使用的本地代理地址"""
+        if self.proxy_hub is None:
+            from .proxy import ProxyHub
+            self.proxy_hub = ProxyHub(self.loop)
+        return self.proxy_hub.proxy_url(settings)
+    
+    def emit(self, event):
+        """可在任意线程调用；事件按到达顺序成批交给宿主"""
+        with self.lock:
+            self.pending.append(event)
+            if self.flush_scheduled:
+                return
+            self.flush_scheduled = True
+        self.loop.call_soon_threadsafe(self.loop.call_later, BATCH_INTERVAL, self.flush)
+    
+    def flush(self):
+        with self.lock:
+            batch, self.pending = self.pending, []
+            self.flush_scheduled = False
+        if batch:
+            self.post(batch)
+    
+    async def _sample_loop(self):
+        while True:
+            await asyncio.sleep(SAMPLE_INTERVAL)
+            runners = list(self.runners)
+            if runners:
+                # 读取 /proc 或 psutil 可能较慢，放到线程池中
+                await self.loop.run_in_executor(None, self._sample, runners)
+    
+    def _sample(self, runners):
+        now = time.monotonic()
+        for runner in runners:
+            try:
+                runner.download.sample_resources(now)
+            except Exception:
+                pass
+    
+    async def _supervise(self, runner):
+        self.runners.add(runner)
+        try:
+            exit_code = await runner.download.run()
+        finally:
+            self.runners.discard(runner)
+        self.emit(("exit", runner.job_id, exit_code))
+    
+    def shutdown(self):
+        """停止事件循环；调用前应已停止所有任务"""
+        if self.proxy_hub is not None:
+            self.proxy_hub.close()
+        self.loop.call_soon_threadsafe(self._stop_loop)
+        self.thread.join(timeout=5)
+    
+    def _stop_loop(self):
+        self.sampler.cancel()
+        # 等取消生效后再停止，避免关闭时提示任务未结束
+        self.loop.call_soon(self.loop.stop)
+
+
+class SupervisedRunner:
+    """一个任务的运行器，接口与调度器的 runner 约定一致"""
+    
+    def __init__(self, supervisor, job_id, cmd, work_dir):
+        self.supervisor = supervisor
+        self.job_id = job_id
+        self.future = None
+        self.download = DownloadProcess(
+            cmd, work_dir,
+            on_log=lambda text: supervisor.emit(("log", job_id, text)),
+            on_progress=lambda record: supervisor.emit(("progress", job_id, record)),
+            on_retry=lambda: supervisor.emit(("retry", job_id)),
+        )
+    
+    @property
+    def process(self):
+        return self.download.process
+    
+    @property
+    def tail(self):
+        return self.download.tail
+    
+    @property
+    def resources(self):
+        return self.download.resources
+    
+    def start(self):
+        self.future = asyncio.run_coroutine_threadsafe(
+            self.supervisor._supervise(self), self.supervisor.loop)
+    
+    def pause(self):
+        return self.download.pause()
+    
+    def resume(self):
+        return self.download.resume()
+    
+    def stop(self):
+        self.download.stop()
+    
+    def wait(self, timeout=None):
+        if self.future is not None:
+            self.future.result(timeout)
@@ -0,0 +1,128 @@
+"""轨道选择表达式：把选中的轨道写成 N_m3u8DL-RE 的 --select-*/--drop-* 参数
+
+表达式由 字段="正则" 或 字段=值 组成，用冒号连接，需同时满足，例如
+    res="^1920x1080$":codecs="^avc1\\.640028$":for=best
+for=best/worst/all 决定匹配到多条时选哪些（按码率排序）。
+"""
+import math
+import re
+
+from .manifest import AUDIO, SUBTITLE, VIDEO
+
+# 每种轨道对应的选择/丢弃设置项
+SELECT_KEYS = {VIDEO: "select_video", AUDIO: "select_audio", SUBTITLE: "select_subtitle"}
+DROP_KEYS = {VIDEO: "drop_video", AUDIO: "drop_audio", SUBTITLE: "drop_subtitle"}
+
+EXPRESSION_PART_RE = re.compile(r'(\w+)=("[^"]*"|[^:]*)')
+# 多条轨道时依次尝试用这些字段区分
+_FIELDS = (("id", "id"), ("lang", "lang"), ("name", "name"), ("res", "resolution"), ("codecs", "codecs"))
+
+
+def _exact(value):
+    return "^" + re.escape(value).replace('"', '.') + "$"
+
+
+def _any_of(values):
+    return "^(?:" + "|".join(re.escape(value).replace('"', '.') for value in sorted(values)) + ")$"
+
+
+def track_expression(track, candidates=()):
+    """只匹配这一条轨道的表达式（HLS 同一组的音频/字幕轨道 id 相同，再加上语言等条件）"""
+    if track.id and not any(other is not track and other.id == track.id for other in candidates):
+        return f'id="{_exact(track.id)}":for=best'
+    parts = []
+    for name, attribute in _FIELDS:
+        value = getattr(track, attribute)
+        if value:
+            parts.append(f'{name}="{_exact(value)}"')
+    if track.bandwidth:
+        kbps = track.bandwidth / 1000
+        parts.append(f"bwMin={math.floor(kbps)}:bwMax={math.ceil(kbps)}")
+    return ":".join(parts + ["for=best"])
+
+
+def selection_expression(selected, candidates):
+    """恰好匹配 selected 中所有轨道（candidates 为同类型的全部轨道）的表达式
+    
+    无法用一个表达式区分时抛出 ValueError。
+    """
+    if not selected:
+        return ""
+    if len(selected) == 1:
+        return track_expression(selected[0], candidates)
+    selected_ids = {id(track) for track in selected}
+    for name, attribute in _FIELDS:
+        values = {getattr(track, attribute) for track in selected}
+        if "" in values:
+            continue
+        matched = {id(track) for track in candidates if getattr(track, attribute) in values}
+        if matched == selected_ids:
+            return f'{name}="{_any_of(values)}":for=all'
+    # 按码率连续的几条轨道可以用码率范围选择
+    bandwidths = [track.bandwidth for track in selected]
+    if all(bandwidths):
+        low, high = min(bandwidths) / 1000, max(bandwidths) / 1000
+        matched = {id(track) for track in candidates if low <= track.bandwidth / 1000 <= high}
+        if matched == selected_ids:
+            return f"bwMin={math.floor(low)}:bwMax={math.ceil(high)}:for=all"
+    raise ValueError("无法用一个表达式同时选中这些轨道，请减少选择")
+
+
+def match_expression(expression, candidates, choose_all=False):
+    """按 N_m3u8DL-RE 的规则筛选轨道，用于估算（只实现常用字段，其余字段忽略）
+    
+    choose_all 为真时忽略 for=，返回全部匹配的轨道（丢弃表达式）。表达式有误时抛出 ValueError。
+    """
+    conditions = {name: value.strip('"') for name, value in EXPRESSION_PART_RE.findall(expression)}
+    matched = list(candidates)
+    try:
+        for name, attribute in _FIELDS:
+            if name in conditions:
+                pattern = re.compile(conditions[name])
+                matched = [track for track in matched
+                           if getattr(track, attribute) and pattern.search(getattr(track, attribute))]
+        if "bwMin" in conditions:
+            matched = [track for track in matched if track.bandwidth >= int(conditions["bwMin"]) * 1000]
+        if "bwMax" in conditions:
+            matched = [track for track in matched if track.bandwidth <= int(conditions["bwMax"]) * 1000]
+    except (re.error, ValueError) as e:
+        raise ValueError(f"无法解析表达式 {expression}：{str(e)}")
+    matched.sort(key=lambda track: track.bandwidth, reverse=True)
+    choose = conditions.get("for", "best")
+    if choose_all or choose == "all":
+        return matched
+    match = re.match(r"(best|worst)(\d*)$", choose)
+    count = int(match.group(2) or 1) if match else 1
+    if match and match.group(1) == "worst":
+        matched.reverse()
+    return matched[:count]
+
+
+def best_track(candidates):
+    """不指定选择时 N_m3u8DL-RE 自动选择的轨道（码率最高）"""
+    return max(candidates, key=lambda track: track.bandwidth, default=None)
+
+
+def cheapest_track(candidates, min_height):
+    """分辨率不低于 min_height 的视频中码率最低的一条；都达不到时取分辨率最高的"""
+    eligible = [track for track in candidates if track.height >= min_height]
+    if eligible:
+        return min(eligible, key=lambda track: track.bandwidth)
+    return max(candidates, key=lambda track: (track.height, track.bandwidth), default=None)
+
+
+def _at_least_pattern(number):
+    """匹配不小于 number 的十进制整数（不含前导零）的正则"""
+    digits = str(number)
+    options = [rf"[1-9]\d{{{len(digits)},}}"]
+    for index, digit in enumerate(digits):
+        if digit != "9":
+            rest = len(digits) - index - 1
+            options.append(digits[:index] + f"[{int(digit) + 1}-9]" + (rf"\d{{{rest}}}" if rest else ""))
+    options.append(digits)
+    return "(?:" + "|".join(options) + ")"
+
+
+def min_height_expression(min_height):
+    """不解析清单也能使用的自动选择：分辨率高度不低于 min_height 的视频中码率最低的一条"""
+    return f'res="x{_at_least_pattern(int(min_height))}$":for=worst'
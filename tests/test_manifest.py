@@ -0,0 +1,124 @@
+import http.server
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from miix import manifest
+
+MASTER = """#EXTM3U
+#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360,CODECS="avc1.4d401e"
+v.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=2500000,RESOLUTION=1280x720,CODECS="avc1.4d401f"
+v.m3u8
+"""
+
+MEDIA = """#EXTM3U
+#EXT-X-TARGETDURATION:10
+#EXT-X-KEY:METHOD=AES-128,URI="key.bin"
+#EXTINF:10,
+a.ts
+#EXTINF:10,
+b.ts
+#EXTINF:5,
+c.ts
+#EXT-X-ENDLIST
+"""
+
+MPD = """<?xml version="1.0"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT60S">
+ <Period>
+  <AdaptationSet contentType="video" mimeType="video/mp4">
+   <ContentProtection schemeIdUri="urn:mpeg:dash:mp4protection:2011" value="cenc"/>
+   <ContentProtection schemeIdUri="urn:uuid:EDEF8BA9-79D6-4ACE-A3C8-27DCD51D21ED"/>
+   <SegmentTemplate timescale="1000" duration="4000" media="v_$Number$.m4s"/>
+   <Representation id="v1" bandwidth="1000000" width="1280" height="720" codecs="avc1.64001f"/>
+  </AdaptationSet>
+  <AdaptationSet mimeType="audio/mp4" lang="en">
+   <SegmentTemplate timescale="48000"><SegmentTimeline><S t="0" d="96000" r="-1"/></SegmentTimeline></SegmentTemplate>
+   <Representation id="a1" bandwidth="128000" codecs="mp4a.40.2"/>
+  </AdaptationSet>
+ </Period>
+</MPD>
+"""
+
+
+class RecordingHandler(http.server.SimpleHTTPRequestHandler):
+    requests = []
+    
+    def do_GET(self):
+        self.requests.append(self.path)
+        super().do_GET()
+    
+    def log_message(self, *args):
+        pass
+
+
+class LoadManifestTest(unittest.TestCase):
+    """用本地 HTTP 服务代替真实站点，检查解析结果和缓存"""
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.root = tempfile.mkdtemp()
+        for name, text in (("master.m3u8", MASTER), ("v.m3u8", MEDIA), ("d.mpd", MPD)):
+            with open(os.path.join(cls.root, name), 'w', encoding='utf-8') as f:
+                f.write(text)
+        handler = lambda *args, **kwargs: RecordingHandler(*args, directory=cls.root, **kwargs)
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}/"
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        shutil.rmtree(cls.root)
+    
+    def setUp(self):
+        manifest.clear_cache()
+        RecordingHandler.requests.clear()
+    
+    def test_hls_master_reads_first_media_playlist(self):
+        result = manifest.load_manifest({"m3u8_url": self.base + "master.m3u8"})
+        self.assertEqual(result.kind, "hls")
+        self.assertEqual([track.resolution for track in result.tracks_of(manifest.VIDEO)],
+                         ["640x360", "1280x720"])
+        self.assertEqual(result.duration, 25)
+        self.assertFalse(result.live)
+        self.assertEqual(result.encryption, "AES-128")
+        self.assertEqual(result.tracks[0].segment_count, 3)
+        self.assertEqual(RecordingHandler.requests, ["/master.m3u8", "/v.m3u8"])
+    
+    def test_dash_protection_and_segment_counts(self):
+        result = manifest.load_manifest({"m3u8_url": self.base + "d.mpd"})
+        self.assertEqual(result.kind, "dash")
+        self.assertEqual(result.duration, 60)
+        self.assertIn("Widevine", result.encryption)
+        video, = result.tracks_of(manifest.VIDEO)
+        audio, = result.tracks_of(manifest.AUDIO)
+        self.assertEqual(video.segment_count, 15)
+        self.assertEqual(audio.segment_count, 30)
+    
+    def test_cached_until_headers_change(self):
+        settings = {"m3u8_url": self.base + "d.mpd"}
+        first = manifest.load_manifest(settings)
+        self.assertIs(manifest.load_manifest(settings), first)
+        self.assertEqual(RecordingHandler.requests, ["/d.mpd"])
+        other = manifest.load_manifest(dict(settings, headers="Referer: https://example.com/"))
+        self.assertIsNot(other, first)
+        self.assertEqual(RecordingHandler.requests, ["/d.mpd", "/d.mpd"])
+    
+    def test_expired_entry_is_fetched_again(self):
+        settings = {"m3u8_url": self.base + "d.mpd"}
+        manifest.load_manifest(settings)
+        manifest.load_manifest(settings, max_age=0)
+        self.assertEqual(RecordingHandler.requests, ["/d.mpd", "/d.mpd"])
+    
+    def test_missing_manifest(self):
+        with self.assertRaises(manifest.ManifestError):
+            manifest.load_manifest({"m3u8_url": self.base + "missing.m3u8"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import unittest
+
+from miix.progress import is_progress_line, iter_progress, parse_progress_line
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "n_m3u8dl_re_output.txt")
+
+
+class ParseProgressLineTest(unittest.TestCase):
+    def setUp(self):
+        with open(FIXTURE, encoding="utf-8") as file:
+            self.lines = file.read().splitlines()
+    
+    def test_recorded_output(self):
+        records = list(iter_progress(self.lines))
+        self.assertEqual(len(records), 7)
+        self.assertEqual([record.track_type for record in records[:3]], ["video", "audio", "subtitle"])
+        video = records[3]
+        self.assertEqual(video.track, "Vid 1920x1080 | 4000 Kbps | 25")
+        self.assertEqual((video.segments_done, video.segments_total), (105, 296))
+        self.assertAlmostEqual(video.percent, 35.47)
+        self.assertEqual(video.downloaded_bytes, int(58.21 * 1024 ** 2))
+        self.assertEqual(video.total_bytes, int(164.17 * 1024 ** 2))
+        self.assertEqual(video.speed, float(int(8.34 * 1024 ** 2)))
+        self.assertEqual(video.eta, 12)
+        self.assertEqual(records[4].speed, float(int(320.15 * 1024)))
+        self.assertEqual(records[-1].percent, 100.0)
+    
+    def test_waiting_line_has_no_sizes(self):
+        record = parse_progress_line(self.lines[11])
+        self.assertEqual(record.percent, 0.0)
+        self.assertEqual((record.segments_done, record.segments_total), (0, 296))
+        self.assertIsNone(record.downloaded_bytes)
+        self.assertIsNone(record.eta)
+    
+    def test_log_lines_are_not_progress(self):
+        for line in self.lines:
+            if line[:1].isdigit():
+                self.assertIsNone(parse_progress_line(line), line)
+                self.assertFalse(is_progress_line(line), line)
+    
+    def test_percent_and_fraction_without_bar_or_sizes(self):
+        self.assertIsNone(parse_progress_line("03:04:05.123 INFO : 50% done, 2/3"))
+        self.assertIsNone(parse_progress_line("50% done, 2/3"))
+        self.assertIsNone(parse_progress_line("WARN : retry 2/3, 50% of segments failed"))
+    
+    def test_ansi_colored_line(self):
+        line = "\x1b[36mAud aac\x1b[0m \x1b[32m━━━━━━\x1b[0m 1/4 25.00% 1.00MB/4.00MB 1.00MBps 00:00:03"
+        record = parse_progress_line(line)
+        self.assertEqual(record.track, "Aud aac")
+        self.assertEqual(record.eta, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()